@@ -0,0 +1,225 @@
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+import _metrics as metrics
+
+# Admission control for the shared Gemini key pool, with two lanes:
+#   interactive  analyze_one (an admin is waiting on the screen); never waits
+#   bulk         cron_analyze; yields while interactive work is running and
+#                pauses after 429s until the cooldown has passed
+# State is kept per process and, when a Supabase client is bound, mirrored in
+# one row of the llm_admission table so that separate functions (cron vs
+# analyze_one) see each other. Table errors fall back to local state only.
+
+LANES = ('interactive', 'bulk')
+TABLE = 'llm_admission'
+_ROW_ID = 'global'
+
+_lock = threading.Lock()
+_lane = os.getenv('LLM_LANE') or 'bulk'
+_sb = None
+_inflight = { lane: 0 for lane in LANES }
+_state = {
+    'interactive_until': 0.0,   # epoch seconds; interactive work seen recently
+    'cooldown_until': 0.0,      # epoch seconds; a 429 was seen, bulk should pause
+    'checked_at': 0.0,
+    'published': { 'interactive_until': 0.0, 'cooldown_until': 0.0 },
+    'strikes': 0,
+    'last_429': 0.0,
+}
+
+
+def _env_float(name: str, default: str) -> float:
+    return float(os.getenv(name) or default)
+
+
+def enabled() -> bool:
+    # ADMISSION=0: bulk never waits (lanes are still tracked)
+    return (os.getenv('ADMISSION') or '1').strip().lower() not in ('0', 'false', 'no')
+
+
+def max_wait() -> float:
+    # longest a bulk call queues before going ahead anyway
+    return _env_float('ADMISSION_MAX_WAIT_SEC', '60')
+
+
+def use(lane: str, sb=None) -> None:
+    # called by each entry point: which lane this process's calls belong to
+    global _lane, _sb
+    if lane not in LANES:
+        raise ValueError(f'unknown lane: {lane}')
+    _lane = lane
+    if sb is not None:
+        _sb = sb
+
+
+def lane() -> str:
+    return _lane
+
+
+# --- shared row ----------------------------------------------------------------
+
+def _refresh() -> None:
+    global _sb
+    sb = _sb
+    now = time.time()
+    if sb is None or now - _state['checked_at'] < _env_float('ADMISSION_POLL_SEC', '2'):
+        return
+    _state['checked_at'] = now
+    try:
+        res = sb.table(TABLE).select('interactive_until,cooldown_until').eq('id', _ROW_ID).limit(1).execute()
+        rows = getattr(res, 'data', []) or []
+    except Exception as e:
+        # 테이블이 없으면 로컬 상태만 사용
+        metrics.log('admission_table_unavailable', error=str(e)[:200])
+        _sb = None
+        return
+    if rows:
+        with _lock:
+            for field in ('interactive_until', 'cooldown_until'):
+                shared = float(rows[0].get(field) or 0) / 1000
+                _state[field] = max(_state[field], shared)
+
+
+def _publish(field: str, until: float) -> None:
+    # 상태가 의미 있게 늘어났을 때만 기록 (호출마다 쓰지 않는다)
+    sb = _sb
+    if sb is None:
+        return
+    with _lock:
+        if until - _state['published'][field] < 1.0:
+            return
+        _state['published'][field] = until
+        row = { 'id': _ROW_ID, field: int(until * 1000), 'updated_at': datetime.now(timezone.utc).isoformat() }
+
+    def write():
+        try:
+            sb.table(TABLE).upsert(row).execute()
+        except Exception as e:
+            metrics.log('admission_write_failed', error=str(e)[:200])
+
+    threading.Thread(target=write, daemon=True).start()
+
+
+# --- signals from the Gemini client ------------------------------------------------
+
+def report(status: int) -> None:
+    # every HTTP attempt: 429 starts/extends the cooldown, success resets it
+    now = time.time()
+    if status == 429:
+        with _lock:
+            window = _env_float('ADMISSION_STRIKE_WINDOW_SEC', '30')
+            _state['strikes'] = _state['strikes'] + 1 if now - _state['last_429'] < window else 1
+            _state['last_429'] = now
+            base = _env_float('ADMISSION_COOLDOWN_SEC', '2')
+            cooldown = min(_env_float('ADMISSION_COOLDOWN_MAX_SEC', '30'), base * 2 ** (_state['strikes'] - 1))
+            until = _state['cooldown_until'] = max(_state['cooldown_until'], now + cooldown)
+        _publish('cooldown_until', until)
+    elif 200 <= status < 300:
+        with _lock:
+            _state['strikes'] = 0
+
+
+def _touch_interactive() -> None:
+    hold = _env_float('ADMISSION_INTERACTIVE_HOLD_SEC', '20')
+    until = time.time() + hold
+    with _lock:
+        _state['interactive_until'] = until
+        stale = until - _state['published']['interactive_until'] > hold / 2
+    if stale:
+        _publish('interactive_until', until)
+
+
+def _bulk_delay(cap: int) -> float:
+    # seconds a bulk call should wait before asking again (0 = go)
+    _refresh()
+    now = time.time()
+    with _lock:
+        if _state['cooldown_until'] > now:
+            return min(1.0, _state['cooldown_until'] - now)
+        if _state['interactive_until'] > now:
+            share = _env_float('ADMISSION_BULK_SHARE', '0.5')
+            if _inflight['bulk'] >= max(1, int(cap * share)):
+                return 0.2
+    return 0.0
+
+
+def _enter(lane_: str) -> None:
+    with _lock:
+        _inflight[lane_] += 1
+
+
+def _leave(lane_: str) -> None:
+    with _lock:
+        _inflight[lane_] -= 1
+
+
+def _waited(t0: float, yields: int) -> None:
+    if yields:
+        metrics.observe('admission_wait', (time.time() - t0) * 1000)
+        metrics.count('bulk_yields', yields)
+
+
+@contextmanager
+def admit(cap: int):
+    # wraps one Gemini HTTP attempt; cap is the process in-flight cap
+    lane_ = _lane
+    if lane_ == 'interactive':
+        _touch_interactive()
+    elif enabled():
+        t0 = time.time()
+        deadline = t0 + max_wait()
+        yields = 0
+        while time.time() < deadline:
+            delay = _bulk_delay(cap)
+            if not delay:
+                break
+            yields += 1
+            time.sleep(delay)
+        _waited(t0, yields)
+    _enter(lane_)
+    try:
+        yield
+    finally:
+        _leave(lane_)
+
+
+@asynccontextmanager
+async def admit_async(cap: int):
+    import asyncio  # only once an event loop runs; keeps cold starts light
+    lane_ = _lane
+    if lane_ == 'interactive':
+        _touch_interactive()
+    elif enabled():
+        t0 = time.time()
+        deadline = t0 + max_wait()
+        yields = 0
+        while time.time() < deadline:
+            # 공유 행 조회는 동기 호출이라 이벤트 루프 밖에서
+            delay = await asyncio.to_thread(_bulk_delay, cap)
+            if not delay:
+                break
+            yields += 1
+            await asyncio.sleep(delay)
+        _waited(t0, yields)
+    _enter(lane_)
+    try:
+        yield
+    finally:
+        _leave(lane_)
+
+
+def snapshot() -> Dict[str, Any]:
+    now = time.time()
+    with _lock:
+        return {
+            'lane': _lane,
+            'inflight': dict(_inflight),
+            'interactive_active': _state['interactive_until'] > now,
+            'cooldown_sec': round(max(0.0, _state['cooldown_until'] - now), 1),
+            'shared': _sb is not None,
+        }
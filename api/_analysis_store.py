@@ -0,0 +1,169 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import _core as core
+import _dedup as dedup
+import _graph_codec as graph_codec
+import _metrics as metrics
+import _search_index as search_index
+
+# Heavy analysis output lives in video_analysis (one row per video), not on
+# the videos row that listings and ranking jobs read. videos keeps the listing
+# fields plus a small summary (status, transcript fingerprint, schema version,
+# peak dopamine). video_analysis.data holds the moved fields by name and
+# schema_version says how to read it, so the layout can change without
+# rewriting old rows. Until the migration is applied (or with
+# ANALYSIS_SIDE_TABLE=0) everything stays on videos as before.
+# Schema 2 stores dopamine_graph packed under 'dopamine' (_graph_codec);
+# readers still get the list form back from merge().
+
+TABLE = 'video_analysis'
+SCHEMA_VERSION = 2
+PACKED = 'dopamine'
+
+# videos columns moved into video_analysis.data
+FIELDS = (
+    'analysis_full', 'dopamine_graph', 'analysis_sentence_hashes',
+    'material_main_idea', 'material_core_materials', 'material_lang_patterns',
+    'material_emotion_points', 'material_info_delivery',
+    'keywords_ko', 'keywords_en', 'keywords_zh',
+)
+
+SUMMARY_FIELDS = ('analysis_status', 'analysis_fingerprint', 'analysis_version', 'dopamine_peak', 'analysis_updated_at')
+
+_probe = core.table_probe(TABLE, 'video_id', 'ANALYSIS_SIDE_TABLE')
+
+
+def enabled() -> bool:
+    return _probe.enabled()
+
+
+def available(sb=None) -> bool:
+    # a missing table keeps the old single-row layout
+    return _probe(sb)
+
+
+def unpack(row: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    # video_analysis row -> { field: value }, whatever schema_version wrote it
+    if not row:
+        return {}
+    data = row.get('data') or {}
+    version = int(row.get('schema_version') or 1)
+    if version > SCHEMA_VERSION:
+        metrics.log('analysis_schema_newer', version=version, video=row.get('video_id'))
+    out = { k: data[k] for k in FIELDS if k in data }
+    if graph_codec.is_packed(data.get(PACKED)):
+        out[PACKED] = data[PACKED]
+        out.pop('dopamine_graph', None)
+    return out
+
+
+def merge(doc: Dict[str, Any], row: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    # videos row + its video_analysis row, as one document (side values win).
+    # The packed graph is kept next to the decoded list so split() can carry it
+    # over unchanged when a run does not touch the graph.
+    out = dict(doc)
+    out.update(unpack(row))
+    if PACKED in out:
+        out['dopamine_graph'] = graph_codec.decode(out.get('transcript_text') or '', out[PACKED],
+                                                   out.get('analysis_sentence_hashes'))
+    return out
+
+
+def fingerprint(transcript: str) -> str:
+    return graph_codec.fingerprint(transcript)
+
+
+def peak(graph: Any) -> Optional[int]:
+    levels = []
+    for e in graph if isinstance(graph, list) else []:
+        try:
+            levels.append(int(round(float((e or {}).get('level')))))
+        except Exception:
+            continue
+    return max(levels) if levels else None
+
+
+def summary(doc: Dict[str, Any], updated: Dict[str, Any]) -> Dict[str, Any]:
+    graph = updated['dopamine_graph'] if 'dopamine_graph' in updated else doc.get('dopamine_graph')
+    return {
+        'analysis_status': 'done',
+        'analysis_fingerprint': fingerprint(updated.get('transcript_text') or doc.get('transcript_text') or ''),
+        'analysis_version': SCHEMA_VERSION,
+        'dopamine_peak': peak(graph),
+        'analysis_updated_at': datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def split(doc: Dict[str, Any], updated: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    # analysis patch -> (videos patch, video_analysis row).
+    # doc is the merged document the analysis ran on: fields a partial run did
+    # not touch are carried over so the side row stays complete.
+    data = { k: doc[k] for k in FIELDS if doc.get(k) is not None }
+    data.update({ k: v for k, v in updated.items() if k in FIELDS })
+    graph = data.pop('dopamine_graph', None)
+    if 'dopamine_graph' in updated or not graph_codec.is_packed(doc.get(PACKED)):
+        if graph is not None:
+            transcript = updated.get('transcript_text') or doc.get('transcript_text') or ''
+            data[PACKED] = graph_codec.encode(transcript, graph)
+    else:
+        data[PACKED] = doc[PACKED]
+    patch = { k: v for k, v in updated.items() if k not in FIELDS }
+    patch.update(summary(doc, updated))
+    # 예전 행에 남아 있던 본문은 비운다 (목록 조회가 가벼워지도록)
+    patch.update({ k: None for k in FIELDS })
+    row = { 'video_id': doc['id'], 'schema_version': SCHEMA_VERSION, 'data': data,
+            'updated_at': datetime.now(timezone.utc).isoformat() }
+    return patch, row
+
+
+def load(sb, doc: Dict[str, Any]) -> Dict[str, Any]:
+    if not available(sb):
+        return doc
+    res = sb.table(TABLE).select('*').eq('video_id', doc['id']).limit(1).execute()
+    rows = getattr(res, 'data', []) or []
+    return merge(doc, rows[0] if rows else None)
+
+
+def load_many(sb, docs: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    docs = list(docs)
+    if not docs or not available(sb):
+        return docs
+    res = sb.table(TABLE).select('*').in_('video_id', [d['id'] for d in docs]).execute()
+    by_id = { str(r.get('video_id')): r for r in (getattr(res, 'data', []) or []) }
+    return [merge(d, by_id.get(str(d['id']))) for d in docs]
+
+
+def videos_patch(sb, doc: Dict[str, Any], updated: Dict[str, Any], allowed: Iterable[str]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    # (videos patch limited to allowed columns, video_analysis row or None in the old layout)
+    patch, row = split(doc, updated) if available(sb) else (dict(updated), None)
+    allowed = set(allowed)
+    return { k: v for k, v in patch.items() if k in allowed }, row
+
+
+def write(sb, doc: Dict[str, Any], updated: Dict[str, Any], allowed: Iterable[str]) -> Dict[str, Any]:
+    # stores an analysis patch; returns the videos patch actually written.
+    # allowed: columns of the videos row as read, before merge() added side fields
+    payload, row = videos_patch(sb, doc, updated, allowed)
+    if row is not None:
+        # 본문을 먼저 저장: 실패하면 videos 요약도 바뀌지 않는다
+        with metrics.timed('sb_write', table=TABLE):
+            sb.table(TABLE).upsert(row).execute()
+    if payload:
+        with metrics.timed('sb_write'):
+            sb.table('videos').update(payload).eq('id', doc['id']).execute()
+    after_write(sb, doc, updated)
+    return payload
+
+
+def after_write(sb, doc: Dict[str, Any], updated: Dict[str, Any]) -> None:
+    # 검색 색인 / 중복 대본 지문 갱신 (실패해도 분석 저장은 유지)
+    try:
+        search_index.refresh(sb, doc, updated)
+    except Exception as e:
+        metrics.log('search_index_failed', video=doc.get('id'), error=str(e)[:200])
+    if updated.get('transcript_text'):
+        try:
+            dedup.record(sb, doc['id'], updated['transcript_text'])
+        except Exception as e:
+            metrics.log('dedup_record_failed', video=doc.get('id'), error=str(e)[:200])
@@ -0,0 +1,152 @@
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+import _gemini as gemini
+import _metrics as metrics
+
+# Gemini Batch API client for nightly bulk analysis.
+# All prompts of a job chunk go into one JSONL file (one GenerateContentRequest
+# per line, keyed "<video id>:<stage>"), uploaded through the Files API and
+# submitted with batchGenerateContent. Later cron ticks poll the batch and
+# download the results file. A batch belongs to the key that created it, so
+# the job stores the key's pool index (never the key itself).
+
+DONE_STATES = ('BATCH_STATE_SUCCEEDED', 'JOB_STATE_SUCCEEDED')
+FAILED_STATES = (
+    'BATCH_STATE_FAILED', 'BATCH_STATE_CANCELLED', 'BATCH_STATE_EXPIRED',
+    'JOB_STATE_FAILED', 'JOB_STATE_CANCELLED', 'JOB_STATE_EXPIRED',
+)
+
+
+def enabled(job: Dict[str, Any]) -> bool:
+    # job.mode='batch', or ANALYSIS_BATCH_MODE=1 for scope=all jobs
+    mode = (job.get('mode') or '').strip().lower()
+    if mode:
+        return mode == 'batch'
+    flag = (os.getenv('ANALYSIS_BATCH_MODE') or '0').strip().lower() in ('1', 'true', 'yes')
+    return flag and job.get('scope') == 'all'
+
+
+def max_videos() -> int:
+    return max(1, int(os.getenv('BATCH_MAX_VIDEOS') or '300'))
+
+
+def model() -> str:
+    name = os.getenv('GEMINI_BATCH_MODEL') or os.getenv('GEMINI_MODEL') or gemini.MODELS[0]
+    return name if name.startswith('models/') else f'models/{name}'
+
+
+def line(key: str, prompt: str, content: str) -> str:
+    return json.dumps({ 'key': key, 'request': gemini._payload(prompt, content) }, ensure_ascii=False)
+
+
+def split_key(key: str) -> Tuple[str, str]:
+    vid, _, stage = str(key).rpartition(':')
+    return vid, stage
+
+
+def _key(index: int) -> str:
+    pool = gemini.keys()
+    if not pool:
+        raise RuntimeError('GEMINI_API_KEY not set')
+    return pool[index % len(pool)]
+
+
+def upload(lines: Iterable[str], display_name: str, key: str) -> str:
+    # Files API resumable upload (start + upload/finalize in one chunk); returns "files/..."
+    data = ('\n'.join(lines) + '\n').encode('utf-8')
+    start = requests.post(
+        f"{gemini.BASE}/upload/v1beta/files?key={key}",
+        headers={
+            'X-Goog-Upload-Protocol': 'resumable',
+            'X-Goog-Upload-Command': 'start',
+            'X-Goog-Upload-Header-Content-Length': str(len(data)),
+            'X-Goog-Upload-Header-Content-Type': 'application/jsonl',
+        },
+        json={ 'file': { 'display_name': display_name } },
+        timeout=60,
+    )
+    start.raise_for_status()
+    url = start.headers.get('X-Goog-Upload-URL') or start.headers.get('x-goog-upload-url')
+    if not url:
+        raise RuntimeError('upload url missing')
+    res = requests.post(
+        url,
+        headers={ 'X-Goog-Upload-Command': 'upload, finalize', 'X-Goog-Upload-Offset': '0' },
+        data=data,
+        timeout=300,
+    )
+    res.raise_for_status()
+    return ((res.json() or {}).get('file') or {}).get('name') or ''
+
+
+def submit(lines: List[str], display_name: str) -> Dict[str, Any]:
+    # returns the job's batch state: { name, key (pool index), requests, submitted_at }
+    key = gemini.next_key()
+    index = gemini.keys().index(key)
+    with metrics.timed('batch_upload', requests=len(lines)):
+        file_name = upload(lines, display_name, key)
+    if not file_name:
+        raise RuntimeError('batch upload returned no file name')
+    body = { 'batch': { 'display_name': display_name, 'input_config': { 'file_name': file_name } } }
+    res = requests.post(f"{gemini.BASE}/v1beta/{model()}:batchGenerateContent?key={key}", json=body, timeout=60)
+    res.raise_for_status()
+    name = (res.json() or {}).get('name')
+    if not name:
+        raise RuntimeError('batch submit returned no name')
+    metrics.count('batch_submitted')
+    metrics.count('batch_requests', len(lines))
+    return { 'name': name, 'key': index, 'requests': len(lines), 'submitted_at': int(time.time() * 1000) }
+
+
+def _state(op: Dict[str, Any]) -> str:
+    meta = op.get('metadata') or {}
+    return str(meta.get('state') or op.get('state') or ('BATCH_STATE_SUCCEEDED' if op.get('done') else 'BATCH_STATE_PENDING'))
+
+
+def _responses_file(op: Dict[str, Any]) -> Optional[str]:
+    meta = op.get('metadata') or {}
+    return (
+        (op.get('response') or {}).get('responsesFile')
+        or (meta.get('output') or {}).get('responsesFile')
+        or (op.get('dest') or {}).get('fileName')
+    )
+
+
+def poll(batch: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+    # (state, results file name once succeeded)
+    key = _key(int(batch.get('key') or 0))
+    res = requests.get(f"{gemini.BASE}/v1beta/{batch['name']}?key={key}", timeout=30)
+    res.raise_for_status()
+    op = res.json() or {}
+    state = _state(op)
+    return state, _responses_file(op) if state in DONE_STATES else None
+
+
+def results(batch: Dict[str, Any], file_name: str) -> Dict[str, Dict[str, Any]]:
+    # key -> { text, error, usage } from the JSONL results file
+    key = _key(int(batch.get('key') or 0))
+    with metrics.timed('batch_download'):
+        res = requests.get(f"{gemini.BASE}/download/v1beta/{file_name}:download?alt=media&key={key}", timeout=300)
+        res.raise_for_status()
+    out: Dict[str, Dict[str, Any]] = {}
+    run = metrics.current()
+    for raw in (res.text or '').splitlines():
+        if not raw.strip():
+            continue
+        try:
+            item = json.loads(raw)
+        except Exception:
+            continue
+        resp = item.get('response') or {}
+        usage = metrics.usage_of(resp)
+        if run is not None:
+            run.add_usage(usage['prompt'], usage['response'], usage['cached'])
+        text = gemini.response_text(resp) if resp else ''
+        out[str(item.get('key'))] = { 'text': text, 'error': item.get('error'), 'usage': usage }
+        metrics.count('batch_results' if text else 'batch_errors')
+    return out
@@ -0,0 +1,82 @@
+import importlib
+import os
+from typing import Any, Optional
+
+import _metrics as metrics
+
+# Lightweight pieces shared by the api/*.py entry points. Importing this (and
+# an entry point) must stay cheap: heavy client libraries - supabase, httpx,
+# youtube_transcript_api, yt_dlp - are imported through optional() on first
+# use, so a cold start only pays for what the request actually touches.
+# bench/bench_importtime.py measures this and fails when they creep back in.
+
+_MISSING = object()
+_modules = {}
+
+
+def optional(name: str) -> Optional[Any]:
+    # module, or None when it is not installed; imported once per process
+    mod = _modules.get(name, _MISSING)
+    if mod is _MISSING:
+        try:
+            mod = importlib.import_module(name)
+        except Exception:
+            mod = None
+        _modules[name] = mod
+    return mod
+
+
+class TableProbe:
+    # a feature behind an env flag (on unless 0/false/no) and a table that may
+    # not be migrated yet; the table is probed once per process
+    def __init__(self, table: str, column: str, env_flag: str):
+        self.table = table
+        self.column = column
+        self.env_flag = env_flag
+        self.ok: Optional[bool] = None
+
+    def enabled(self) -> bool:
+        return (os.getenv(self.env_flag) or '1').strip().lower() not in ('0', 'false', 'no')
+
+    def __call__(self, sb=None) -> bool:
+        if not self.enabled():
+            return False
+        if self.ok is None and sb is not None:
+            try:
+                sb.table(self.table).select(self.column).limit(1).execute()
+                self.ok = True
+            except Exception as e:
+                metrics.log('table_unavailable', table=self.table, flag=self.env_flag, error=str(e)[:200])
+                self.ok = False
+        return bool(self.ok)
+
+
+def table_probe(table: str, column: str, env_flag: str) -> TableProbe:
+    return TableProbe(table, column, env_flag)
+
+
+def load_sb(anon: bool = False):
+    # anon=True: prefer the anon key (caller then applies the user's token for RLS)
+    create_client = getattr(optional('supabase'), 'create_client', None)
+    if create_client is None:
+        raise RuntimeError('supabase client not available')
+    url = os.getenv('SUPABASE_URL')
+    keys = (os.getenv('SUPABASE_SERVICE_ROLE_KEY'), os.getenv('SUPABASE_ANON_KEY'))
+    key = (keys[1] or keys[0]) if anon else (keys[0] or keys[1])
+    if not url or not key:
+        raise RuntimeError('Missing SUPABASE_URL or SUPABASE_*_KEY env')
+    return create_client(url, key)
+
+
+def cors(app, methods: str = 'GET, POST, OPTIONS'):
+    # Basic CORS so the frontend (e.g. Vite dev server) can call the API directly
+    @app.after_request
+    def add_cors_headers(resp):
+        try:
+            resp.headers['Access-Control-Allow-Origin'] = '*'
+            resp.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+            resp.headers['Access-Control-Allow-Methods'] = methods
+        except Exception:
+            pass
+        return resp
+    return app
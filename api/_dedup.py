@@ -0,0 +1,119 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from typing import Any, List, Optional, Tuple
+
+import _core as core
+import _metrics as metrics
+import _search_index as search_index
+from _sentences import split_sentences
+
+# Near-duplicate transcripts (re-uploads, reposts of the same Short).
+# Every analysed transcript gets a MinHash signature over character shingles
+# of its normalised sentences (NUM_PERM values), stored in video_fingerprints
+# with its LSH band keys (BANDS bands of ROWS values). A new transcript is
+# looked up by band overlap (GIN index on bands), the candidates are compared
+# by signature and the closest one above threshold() is its donor: the
+# pipeline starts from the donor's analysis and the incremental planner
+# (_incremental.py) re-scores only the sentences that differ, so an exact
+# re-upload costs no Gemini call at all.
+# With 16 bands x 4 rows a pair at Jaccard 0.8 is a candidate with ~99.9%
+# probability, one at 0.3 with ~12%.
+
+TABLE = 'video_fingerprints'
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 5
+
+_PRIME = (1 << 61) - 1
+
+
+def _perm(i: int) -> Tuple[int, int]:
+    h = hashlib.blake2b(f'minhash:{i}'.encode('ascii'), digest_size=16).digest()
+    return int.from_bytes(h[:8], 'big') % (_PRIME - 1) + 1, int.from_bytes(h[8:], 'big') % _PRIME
+
+
+_PERMS = [_perm(i) for i in range(NUM_PERM)]
+
+_probe = core.table_probe(TABLE, 'video_id', 'DEDUP')
+
+
+def enabled() -> bool:
+    return _probe.enabled()
+
+
+def threshold() -> float:
+    # estimated Jaccard similarity above which a transcript reuses an analysis
+    return float(os.getenv('DEDUP_THRESHOLD') or '0.8')
+
+
+def available(sb=None) -> bool:
+    # before the migration every video is analysed in full
+    return _probe(sb)
+
+
+def shingles(sentences: List[str]) -> set:
+    # character n-grams of the normalised text, spaces removed: the same
+    # for Korean, Chinese and English, and indifferent to re-segmentation
+    text = ''.join(''.join(search_index.tokens(s)) for s in sentences)
+    if len(text) <= SHINGLE:
+        return { text } if text else set()
+    return { text[i:i + SHINGLE] for i in range(len(text) - SHINGLE + 1) }
+
+
+def signature(sentences: List[str]) -> List[int]:
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big') % _PRIME
+              for s in shingles(sentences)]
+    if not hashes:
+        return []
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS]
+
+
+def bands(sig: List[int]) -> List[str]:
+    out = []
+    for b in range(BANDS):
+        part = ','.join(str(v) for v in sig[b * ROWS:(b + 1) * ROWS])
+        out.append(f'{b:02d}' + hashlib.blake2b(part.encode('ascii'), digest_size=6).hexdigest())
+    return out
+
+
+def similarity(a: List[int], b: List[int]) -> float:
+    # estimated Jaccard similarity of the two shingle sets
+    if not a or len(a) != len(b):
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def record(sb, video_id: Any, transcript: str, sentences: Optional[List[str]] = None) -> bool:
+    # after an analysis write: this transcript can now donate its analysis
+    if not available(sb):
+        return False
+    sig = signature(sentences if sentences is not None else split_sentences(transcript))
+    if not sig:
+        return False
+    with metrics.timed('sb_write', table=TABLE):
+        sb.table(TABLE).upsert({
+            'video_id': video_id, 'signature': sig, 'bands': bands(sig),
+            'updated_at': datetime.now(timezone.utc).isoformat(),
+        }).execute()
+    return True
+
+
+def match(sb, video_id: Any, sentences: List[str], limit: int = 20) -> Optional[Tuple[Any, float]]:
+    # (donor video id, similarity) of the closest analysed transcript, or None
+    if not available(sb):
+        return None
+    sig = signature(sentences)
+    if not sig:
+        return None
+    with metrics.timed('dedup_lookup'):
+        res = (sb.table(TABLE).select('video_id,signature').ov('bands', bands(sig))
+               .neq('video_id', video_id).limit(limit).execute())
+    best = None
+    for r in getattr(res, 'data', []) or []:
+        sim = similarity(sig, [int(v) for v in (r.get('signature') or [])])
+        if sim >= threshold() and (best is None or sim > best[1]):
+            best = (r['video_id'], sim)
+    return best
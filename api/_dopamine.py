@@ -0,0 +1,181 @@
+import json
+import math
+import os
+import re
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Local (no LLM) dopamine scorer shared by cron_analyze and analyze_one.
+# Keeps the rules of the former analyze_one._estimate_dopamine, but every sentence is
+# scored in one regex pass over the joined transcript.
+
+CURIOSITY_WORDS = ['왜', '어떻게', '정말', '충격', '반전', '경악', '대박', '소름', '비밀', '최초', '금지', '경고']
+SUPERLATIVE_WORDS = ['가장', '최고', '최악', '첫', '완전']
+
+_FEATURES = re.compile(
+    '(?P<cur>' + '|'.join(map(re.escape, CURIOSITY_WORDS)) + ')'
+    '|(?P<sup>' + '|'.join(map(re.escape, SUPERLATIVE_WORDS)) + ')'
+    r'|(?P<ex>!)|(?P<q>\?)|(?P<num>\d)'
+)
+
+_lexicon_cache: Dict[str, Tuple[Optional[re.Pattern], Dict[str, float]]] = {}
+
+
+def load_lexicon(path: Optional[str] = None) -> Tuple[Optional[re.Pattern], Dict[str, float]]:
+    # {"term": weight, ...} JSON; DOPAMINE_LEXICON_PATH or api/dopamine_lexicon.json
+    path = path or os.getenv('DOPAMINE_LEXICON_PATH') or os.path.join(os.path.dirname(__file__), 'dopamine_lexicon.json')
+    if path in _lexicon_cache:
+        return _lexicon_cache[path]
+    weights: Dict[str, float] = {}
+    try:
+        with open(path, encoding='utf-8') as fh:
+            raw = json.load(fh) or {}
+        for term, w in raw.items():
+            term = str(term).strip().lower()
+            if term:
+                weights[term] = float(w)
+    except Exception:
+        weights = {}
+    pat = None
+    if weights:
+        # 긴 단어부터 매칭되도록 정렬
+        pat = re.compile('|'.join(map(re.escape, sorted(weights, key=len, reverse=True))))
+    _lexicon_cache[path] = (pat, weights)
+    return _lexicon_cache[path]
+
+
+def score_sentences(sentences: List[str], lexicon: Optional[Tuple[Optional[re.Pattern], Dict[str, float]]] = None) -> List[int]:
+    n = len(sentences)
+    if not n:
+        return []
+    sents = [(s or '').strip() for s in sentences]
+    # 오프셋은 소문자로 바꾼 뒤에 잰다 ('İ'.lower()처럼 길이가 바뀌는 문자가 있음)
+    lowered = [s.lower() for s in sents]
+    starts = []
+    pos = 0
+    for s in lowered:
+        starts.append(pos)
+        pos += len(s) + 1
+    blob = '\n'.join(lowered)
+
+    cur = [False] * n
+    sup = [False] * n
+    num = [False] * n
+    ex = [0] * n
+    q = [0] * n
+    for m in _FEATURES.finditer(blob):
+        i = bisect_right(starts, m.start()) - 1
+        kind = m.lastgroup
+        if kind == 'cur':
+            cur[i] = True
+        elif kind == 'sup':
+            sup[i] = True
+        elif kind == 'ex':
+            ex[i] += 1
+        elif kind == 'q':
+            q[i] += 1
+        else:
+            num[i] = True
+
+    bonus = [0.0] * n
+    pat, weights = lexicon if lexicon is not None else load_lexicon()
+    if pat is not None:
+        for m in pat.finditer(blob):
+            bonus[bisect_right(starts, m.start()) - 1] += weights.get(m.group(0), 0.0)
+
+    out = []
+    for i, s in enumerate(sents):
+        score = 5
+        if cur[i]:
+            score += 2
+        score += min(2, ex[i]) + min(2, q[i])
+        if num[i]:
+            score += 1
+        if sup[i]:
+            score += 1
+        ln = len(s)
+        if ln < 20:
+            score -= 1
+        elif ln > 120:
+            score -= 1
+        if bonus[i]:
+            score += int(round(max(-3.0, min(3.0, bonus[i]))))
+        out.append(max(1, min(10, score)))
+    return out
+
+
+def local_graph(sentences: List[str], max_len: int = 200) -> List[Dict[str, Any]]:
+    levels = score_sentences(sentences)
+    return [{ 'sentence': s[:max_len], 'level': lv, 'reason': 'auto' } for s, lv in zip(sentences, levels)]
+
+
+def resolve_mode(value: Any, default: str = 'llm') -> str:
+    # 'llm' | 'local' (job 설정 > DOPAMINE_MODE env > 기본값)
+    mode = str(value or os.getenv('DOPAMINE_MODE') or default).strip().lower()
+    return mode if mode in ('llm', 'local') else default
+
+
+def llm_pairs(graph: Any) -> List[Tuple[str, int]]:
+    # LLM이 채점한 dopamine_graph 항목만 (reason == 'auto' 는 로컬 채점 결과)
+    out = []
+    for item in graph if isinstance(graph, list) else []:
+        if not isinstance(item, dict) or item.get('reason') == 'auto':
+            continue
+        s = str(item.get('sentence') or '').strip()
+        try:
+            level = int(item.get('level'))
+        except Exception:
+            continue
+        if s and 1 <= level <= 10:
+            out.append((s, level))
+    return out
+
+
+def calibration_report(pairs: Iterable[Tuple[str, int]], lexicon=None) -> Dict[str, Any]:
+    pairs = list(pairs)
+    if not pairs:
+        return { 'n': 0 }
+    ref = [lv for _, lv in pairs]
+    got = score_sentences([s for s, _ in pairs], lexicon)
+    n = len(pairs)
+    diff = [g - r for g, r in zip(got, ref)]
+    mr = sum(ref) / n
+    mg = sum(got) / n
+    cov = sum((g - mg) * (r - mr) for g, r in zip(got, ref))
+    sd = math.sqrt(sum((g - mg) ** 2 for g in got) * sum((r - mr) ** 2 for r in ref))
+    return {
+        'n': n,
+        'mae': round(sum(abs(d) for d in diff) / n, 3),
+        'rmse': round(math.sqrt(sum(d * d for d in diff) / n), 3),
+        'bias': round(sum(diff) / n, 3),
+        'pearson': round(cov / sd, 3) if sd else None,
+        'within_1': round(sum(1 for d in diff if abs(d) <= 1) / n, 3),
+        'mean_llm': round(mr, 3),
+        'mean_local': round(mg, 3),
+    }
+
+
+_WORD = re.compile(r'[0-9a-z가-힣一-鿿]{2,}')
+
+
+def suggest_lexicon(pairs: Iterable[Tuple[str, int]], min_count: int = 20, top: int = 200) -> Dict[str, float]:
+    # 로컬 점수 대비 LLM 점수의 평균 잔차가 큰 단어 -> 가중치 후보
+    pairs = list(pairs)
+    got = score_sentences([s for s, _ in pairs], (None, {}))
+    if not pairs:
+        return {}
+    bias = sum(ref - g for (_, ref), g in zip(pairs, got)) / len(pairs)
+    acc: Dict[str, List[float]] = {}
+    for (s, ref), g in zip(pairs, got):
+        for w in set(_WORD.findall(s.lower())):
+            acc.setdefault(w, []).append(ref - g - bias)
+    scored = []
+    for w, res in acc.items():
+        if len(res) < min_count:
+            continue
+        mean = sum(res) / len(res)
+        weight = round(mean * 2) / 2
+        if abs(weight) >= 0.5:
+            scored.append((abs(mean) * math.log(len(res)), w, weight))
+    scored.sort(reverse=True)
+    return { w: weight for _, w, weight in scored[:top] }
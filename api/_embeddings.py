@@ -0,0 +1,147 @@
+import hashlib
+import math
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import _analysis_store as analysis_store
+import _core as core
+import _gemini as gemini
+import _metrics as metrics
+import _search_index as search_index
+
+# Embeddings for "find videos like this".
+# After a batch of videos is analysed, one batched embedding call covers all
+# of them (title, material, main idea, keywords and the head of the
+# transcript) and the vectors go into video_embeddings (pgvector, HNSW
+# cosine index). Nearest neighbours are then one index lookup in
+# match_videos() instead of an LLM comparison per pair.
+# source_fp is a hash of the embedded text: re-analysing a video whose text
+# did not change costs no embedding call.
+# Without a Gemini key (or EMBEDDING_PROVIDER=local) vectors are computed
+# locally: signed feature hashing of the same terms the keyword index uses
+# (words, CJK bigrams) with sublinear tf. Coarser, but deterministic and
+# offline. Rows record their model and are only compared within it.
+
+TABLE = 'video_embeddings'
+LOCAL_MODEL = 'local-hash-v1'
+
+_probe = core.table_probe(TABLE, 'video_id', 'EMBEDDINGS')
+
+
+def enabled() -> bool:
+    return _probe.enabled()
+
+
+def dim() -> int:
+    # must match the vector(...) column of the migration
+    return int(os.getenv('EMBEDDING_DIM') or '768')
+
+
+def text_chars() -> int:
+    return max(500, int(os.getenv('EMBEDDING_TEXT_CHARS') or '6000'))
+
+
+def provider() -> str:
+    choice = (os.getenv('EMBEDDING_PROVIDER') or '').strip().lower()
+    if choice in ('local', 'gemini'):
+        return choice
+    return 'gemini' if gemini.keys() else 'local'
+
+
+def model() -> str:
+    return gemini.embed_model() if provider() == 'gemini' else LOCAL_MODEL
+
+
+def available(sb=None) -> bool:
+    # before the migration nothing is embedded
+    return _probe(sb)
+
+
+def text_of(doc: Dict[str, Any]) -> str:
+    parts = [doc.get('title'), doc.get('material'), doc.get('material_main_idea')]
+    for field in ('keywords_ko', 'keywords_en', 'keywords_zh'):
+        kws = doc.get(field)
+        if isinstance(kws, list) and kws:
+            parts.append(', '.join(str(k) for k in kws))
+    head = ' '.join(str(p).strip() for p in parts if p and str(p).strip())
+    transcript = str(doc.get('transcript_text') or '').strip()
+    return (head + '\n\n' + transcript)[:text_chars()].strip()
+
+
+def fingerprint(text: str, model_name: str) -> str:
+    return hashlib.sha1(f'{model_name}\n{text}'.encode('utf-8')).hexdigest()
+
+
+def local_vector(text: str, n: Optional[int] = None) -> List[float]:
+    n = n or dim()
+    vec = [0.0] * n
+    counts: Dict[str, int] = {}
+    for tok in search_index.tokens(text):
+        for term in search_index.terms(tok):
+            counts[term] = counts.get(term, 0) + 1
+    for term, tf in counts.items():
+        h = int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'big')
+        vec[h % n] += (1.0 if (h >> 32) & 1 else -1.0) * (1.0 + math.log(tf))
+    norm = math.sqrt(sum(v * v for v in vec))
+    return [round(v / norm, 6) for v in vec] if norm else vec
+
+
+def vectors(texts: List[str]) -> List[List[float]]:
+    if provider() == 'gemini':
+        return gemini.embed(texts, dim())
+    return [local_vector(t) for t in texts]
+
+
+def _load(sb, ids: List[Any]) -> List[Dict[str, Any]]:
+    cols = 'id,title,material,transcript_text'
+    res = sb.table('videos').select(cols).in_('id', ids).execute()
+    return analysis_store.load_many(sb, getattr(res, 'data', []) or [])
+
+
+def embed_videos(sb, ids: List[Any]) -> Dict[str, int]:
+    # videos just analysed -> one batched embedding call for those whose text changed
+    stats = { 'videos': 0, 'embedded': 0, 'unchanged': 0 }
+    if not ids or not available(sb):
+        return stats
+    name = model()
+    docs = _load(sb, list(ids))
+    res = sb.table(TABLE).select('video_id,model,source_fp').in_('video_id', list(ids)).execute()
+    stored = { str(r.get('video_id')): r for r in (getattr(res, 'data', []) or []) }
+    todo = []
+    for doc in docs:
+        text = text_of(doc)
+        if not text:
+            continue
+        stats['videos'] += 1
+        fp = fingerprint(text, name)
+        if (stored.get(str(doc['id'])) or {}).get('source_fp') == fp:
+            stats['unchanged'] += 1
+            continue
+        todo.append((doc['id'], text, fp))
+    if not todo:
+        return stats
+    with metrics.timed('embed', videos=len(todo), provider=provider()):
+        vecs = vectors([t for _, t, _ in todo])
+    now_iso = datetime.now(timezone.utc).isoformat()
+    rows = [{ 'video_id': vid, 'model': name, 'embedding': vec, 'source_fp': fp, 'updated_at': now_iso }
+            for (vid, _, fp), vec in zip(todo, vecs) if len(vec) == dim()]
+    if rows:
+        with metrics.timed('sb_write', table=TABLE, rows=len(rows)):
+            sb.table(TABLE).upsert(rows).execute()
+    stats['embedded'] = len(rows)
+    metrics.log('embed_videos', **stats)
+    return stats
+
+
+def similar(sb, video_id: Any, k: int = 10) -> List[Dict[str, Any]]:
+    # [{ video_id, similarity }] nearest first, the video itself excluded (match_videos())
+    res = sb.rpc('match_videos', { 'p_video_id': str(video_id), 'p_k': int(k) }).execute()
+    return getattr(res, 'data', []) or []
+
+
+def similar_to_text(sb, text: str, k: int = 10) -> List[Dict[str, Any]]:
+    # free text -> nearest videos embedded with the current model
+    vec = vectors([text[:text_chars()]])[0]
+    res = sb.rpc('match_embedding', { 'p_embedding': vec, 'p_model': model(), 'p_k': int(k) }).execute()
+    return getattr(res, 'data', []) or []
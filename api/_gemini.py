@@ -0,0 +1,577 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import requests
+
+import _admission as admission
+import _metrics as metrics
+from _llm_parse import StreamParser
+
+# Gemini REST client shared by cron_analyze and analyze_one: one key pool per
+# process, generateContent for plain calls and streamGenerateContent (SSE) for
+# calls whose output format can be checked while it is still being generated.
+
+# GEMINI_API_BASE points the client at a local stand-in (bench/stubs.py)
+BASE = (os.getenv('GEMINI_API_BASE') or 'https://generativelanguage.googleapis.com').rstrip('/')
+MODELS = [
+    'models/gemini-2.5-flash',
+    'models/gemini-2.0-flash-exp',
+    'models/gemini-1.5-flash-latest',
+    'models/gemini-1.5-pro-latest',
+]
+# seconds one generate/stream request may take (cron budgets its batches by it)
+CALL_TIMEOUT = 180
+
+
+class FormatViolation(ValueError):
+    # raised when a streamed response is cancelled because of its format;
+    # .text holds what had arrived so far
+    def __init__(self, reason: str, text: str = ''):
+        super().__init__(reason)
+        self.reason = reason
+        self.text = text
+
+
+_lock = threading.Lock()
+_keys_cache: List[str] = []
+_key_index = 0
+_slots = None
+
+
+def keys() -> List[str]:
+    global _keys_cache
+    if _keys_cache:
+        return _keys_cache
+    found = [k.strip().strip('"').strip("'") for k in (os.getenv('GEMINI_API_KEYS') or '').split(',') if k.strip()]
+    if not found:
+        for i in range(1, 101):
+            k = (os.getenv(f'GEMINI_API_KEY{i}') or '').strip().strip('"').strip("'")
+            if k:
+                found.append(k)
+    if not found:
+        single = (os.getenv('GEMINI_API_KEY') or '').strip().strip('"').strip("'")
+        if single:
+            found = [single]
+    _keys_cache = found
+    return found
+
+
+def next_key() -> str:
+    global _key_index
+    pool = keys()
+    if not pool:
+        raise RuntimeError('GEMINI_API_KEY not set')
+    with _lock:
+        key = pool[_key_index % len(pool)]
+        _key_index += 1
+    return key
+
+
+def inflight_cap() -> int:
+    # 키당 동시 요청 수 x 키 개수 (GEMINI_MAX_INFLIGHT로 직접 지정 가능)
+    explicit = int(os.getenv('GEMINI_MAX_INFLIGHT') or '0')
+    if explicit > 0:
+        return explicit
+    per_key = max(1, int(os.getenv('GEMINI_INFLIGHT_PER_KEY') or '2'))
+    return max(1, len(keys()) * per_key)
+
+
+def slots() -> threading.BoundedSemaphore:
+    global _slots
+    if _slots is None:
+        cap = inflight_cap()
+        with _lock:
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(cap)
+    return _slots
+
+
+def stream_enabled() -> bool:
+    return (os.getenv('GEMINI_STREAM') or '1').strip().lower() in ('1', 'true', 'yes')
+
+
+def _routes():
+    prefer = os.getenv('GEMINI_MODEL')
+    candidates = [*( [prefer] if prefer else [] ), *MODELS]
+    for api_ver in ('v1', 'v1beta'):
+        for model in candidates:
+            if model:
+                yield api_ver, model
+
+
+# JSON mode: system prompt -> responseSchema, applied wherever that prompt is sent
+# (plain, streamed, cached, async and batch requests all build their payload here)
+_schemas: Dict[str, Dict[str, Any]] = {}
+
+
+def register_schema(system_prompt: str, schema: Dict[str, Any]) -> None:
+    _schemas[system_prompt] = schema
+
+
+def _generation_config(system_prompt: str) -> Dict[str, Any]:
+    config: Dict[str, Any] = { 'temperature': 0.3 }
+    schema = _schemas.get(system_prompt)
+    if schema is not None:
+        config['responseMimeType'] = 'application/json'
+        config['responseSchema'] = schema
+    return config
+
+
+def _payload(system_prompt: str, user_content: str) -> Dict[str, Any]:
+    return {
+        'contents': [
+            { 'role': 'user', 'parts': [{ 'text': f"{system_prompt}\n\n{user_content}" }] }
+        ],
+        'generationConfig': _generation_config(system_prompt)
+    }
+
+
+# --- context caching (cachedContents, v1beta) ---------------------------------
+# A cache holds a text that would otherwise be resent on every call: the
+# per-video transcript, or a large static prompt. It belongs to the key that
+# created it, so calls that use it are pinned to that key.
+
+class Cache:
+    __slots__ = ('name', 'key', 'model', 'text', 'expires', 'dead')
+
+    def __init__(self, name: str, key: str, model: str, text: str, expires: float):
+        self.name = name
+        self.key = key
+        self.model = model
+        self.text = text
+        self.expires = expires
+        self.dead = False
+
+    def usable(self) -> bool:
+        return not self.dead and time.time() < self.expires - 15
+
+
+_shared_caches: Dict[str, Cache] = {}
+_shared_failed: Dict[str, float] = {}
+
+
+def cache_enabled() -> bool:
+    return (os.getenv('GEMINI_CACHE') or '1').strip().lower() in ('1', 'true', 'yes')
+
+
+def cache_min_tokens() -> int:
+    # 모델별 최소 캐시 크기 미만이면 생성 요청이 400으로 실패하므로 미리 거른다
+    return max(0, int(os.getenv('GEMINI_CACHE_MIN_TOKENS') or '1024'))
+
+
+def _cache_model() -> str:
+    model = os.getenv('GEMINI_MODEL') or MODELS[0]
+    return model if model.startswith('models/') else f'models/{model}'
+
+
+def _cache_body(text: str, model: str, ttl: int) -> Dict[str, Any]:
+    return {
+        'model': model,
+        'contents': [{ 'role': 'user', 'parts': [{ 'text': text }] }],
+        'ttl': f'{int(ttl)}s',
+    }
+
+
+def _new_cache(res, key: str, model: str, text: str, ttl: int) -> Optional[Cache]:
+    if res.status_code >= 400:
+        metrics.count('cache_create_failed', status=res.status_code)
+        return None
+    name = (res.json() or {}).get('name')
+    return Cache(name, key, model, text, time.time() + ttl) if name else None
+
+
+def create_cache(text: str, ttl: Optional[int] = None) -> Optional[Cache]:
+    # None when caching is off or the request fails; callers then send the text inline
+    if not cache_enabled() or not text or not keys():
+        return None
+    ttl = ttl or int(os.getenv('GEMINI_CACHE_TTL') or '600')
+    key, model = next_key(), _cache_model()
+    try:
+        with metrics.timed('cache_create', key=key_id(key)):
+            with slots():
+                res = requests.post(f"{BASE}/v1beta/cachedContents?key={key}", json=_cache_body(text, model, ttl), timeout=60)
+        return _new_cache(res, key, model, text, ttl)
+    except Exception:
+        return None
+
+
+def delete_cache(cache: Optional[Cache]) -> None:
+    # 저장 시간 과금을 줄이기 위해 영상 분석이 끝나면 바로 지운다 (실패해도 TTL로 만료)
+    if cache is None or cache.name in (c.name for c in _shared_caches.values()):
+        return
+    cache.dead = True
+    try:
+        requests.delete(f"{BASE}/v1beta/{cache.name}?key={cache.key}", timeout=10)
+    except Exception:
+        pass
+
+
+def shared_cache(text: str, ttl: Optional[int] = None) -> Optional[Cache]:
+    # process-wide cache for a static prompt, re-created once it expires
+    ttl = ttl or int(os.getenv('GEMINI_STATIC_CACHE_TTL') or '3600')
+    with _lock:
+        cur = _shared_caches.get(text)
+        failed_at = _shared_failed.get(text, 0.0)
+    if cur is not None and cur.usable():
+        return cur
+    if time.time() - failed_at < 300:
+        # 생성 실패(크기 미달, 권한 등) 직후에는 매 호출마다 다시 시도하지 않는다
+        return None
+    cur = create_cache(text, ttl)
+    with _lock:
+        if cur is not None:
+            _shared_caches[text] = cur
+        else:
+            _shared_failed[text] = time.time()
+    return cur
+
+
+def _evict(cache: Cache) -> None:
+    cache.dead = True
+    with _lock:
+        if _shared_caches.get(cache.text) is cache:
+            del _shared_caches[cache.text]
+
+
+def _cached_rest(cache: Optional[Cache], system_prompt: str, user_content: str) -> Optional[str]:
+    # the part of the prompt that is not in the cache, or None if the cache does not apply
+    if cache is None or not cache.usable():
+        return None
+    if cache.text == user_content:
+        return system_prompt
+    if cache.text == system_prompt:
+        return user_content or ' '
+    return None
+
+
+def _attempts(system_prompt: str, user_content: str, cache: Optional[Cache], method: str):
+    # (label, key, url, payload, cache) in the order they should be tried
+    sep = '&' if '?' in method else '?'
+    rest = _cached_rest(cache, system_prompt, user_content)
+    if rest is not None:
+        payload = {
+            'cachedContent': cache.name,
+            'contents': [{ 'role': 'user', 'parts': [{ 'text': rest }] }],
+            'generationConfig': _generation_config(system_prompt),
+        }
+        yield 'cache', cache.key, f"{BASE}/v1beta/{cache.model}:{method}{sep}key={cache.key}", payload, cache
+    payload = _payload(system_prompt, user_content)
+    for api_ver, model in _routes():
+        # rotate per attempt so a 429 on one key moves on to the next
+        key = next_key()
+        yield f"{api_ver}/{model}", key, f"{BASE}/{api_ver}/{model}:{method}{sep}key={key}", payload, None
+
+
+def response_text(data: Dict[str, Any]) -> str:
+    # generateContent 응답과 스트림 청크 모두 같은 모양
+    parts = ((data.get('candidates') or [{}])[0].get('content') or {}).get('parts') or []
+    return ''.join(p.get('text', '') for p in parts if isinstance(p, dict))
+
+
+def _sse_texts(lines: Iterable[str], usage: Optional[List[Dict[str, int]]] = None):
+    for line in lines:
+        if not line or not line.startswith('data:'):
+            continue
+        try:
+            data = json.loads(line[5:].strip())
+        except Exception:
+            continue
+        if usage is not None and data.get('usageMetadata'):
+            usage.append(metrics.usage_of(data))
+        yield response_text(data)
+
+
+def key_id(key: str) -> str:
+    # 로그에는 키 대신 풀 안의 번호만 남긴다
+    try:
+        return f"k{keys().index(key) + 1}"
+    except ValueError:
+        return 'k?'
+
+
+@contextmanager
+def _metered(label: str, key: str, used: Optional[Cache], stream: bool = False):
+    # one HTTP attempt: latency after the in-flight slot is taken, status, usage
+    rec = { 'status': 0, 'usage': None, 't0': time.time(), 'wait_ms': 0.0 }
+    try:
+        yield rec
+    finally:
+        admission.report(rec['status'])
+        metrics.gemini_call(label, key_id(key), rec['status'], (time.time() - rec['t0']) * 1000,
+                            rec['usage'], used is not None, stream, rec['wait_ms'])
+
+
+def _slot_taken(rec: Dict[str, Any]) -> None:
+    now = time.time()
+    rec['wait_ms'] = (now - rec['t0']) * 1000
+    rec['t0'] = now
+
+
+def _check(parser: StreamParser, chunk: str, on_chunk, abort: bool) -> bool:
+    # returns True once the caller can stop reading
+    parser.feed(chunk)
+    if on_chunk:
+        on_chunk(chunk)
+    if abort:
+        reason = parser.violation()
+        if reason:
+            raise FormatViolation(reason, parser.text)
+    # 닫는 괄호 이후(코드펜스, 부연 설명)는 받을 필요가 없다
+    return parser.complete
+
+
+def _failed(errors: List[str], label: str, err, used: Optional[Cache]) -> None:
+    if isinstance(err, Exception):
+        status = getattr(getattr(err, 'response', None), 'status_code', 0)
+        err = str(err)[:80]
+    else:
+        status = int(err)
+    errors.append(f"{label}:{err}")
+    if used is not None and status in (400, 403, 404):
+        # 만료/삭제된 캐시: 이후 호출은 캐시 없이 보낸다 (429는 이번 호출만 캐시 없이 재시도)
+        _evict(used)
+
+
+def generate(system_prompt: str, user_content: str, timeout: int = CALL_TIMEOUT, cache: Optional[Cache] = None) -> str:
+    if not keys():
+        raise RuntimeError('GEMINI_API_KEY not set')
+    errors = []
+    for label, key, url, payload, used in _attempts(system_prompt, user_content, cache, 'generateContent'):
+        try:
+            with _metered(label, key, used) as rec:
+                with admission.admit(inflight_cap()), slots():
+                    _slot_taken(rec)
+                    res = requests.post(url, json=payload, timeout=timeout)
+                rec['status'] = res.status_code
+                if res.status_code == 404:
+                    _failed(errors, label, 404, used)
+                    continue
+                res.raise_for_status()
+                data = res.json()
+                rec['usage'] = metrics.usage_of(data)
+            text = response_text(data)
+            if text:
+                return text
+        except Exception as e:
+            _failed(errors, label, e, used)
+            continue
+    raise RuntimeError('Gemini request failed: ' + '; '.join(errors))
+
+
+def embed_model() -> str:
+    model = os.getenv('EMBEDDING_MODEL') or 'models/text-embedding-004'
+    return model if model.startswith('models/') else f'models/{model}'
+
+
+def embed(texts: List[str], dim: int, task: str = 'SEMANTIC_SIMILARITY', timeout: int = 60) -> List[List[float]]:
+    # batchEmbedContents: one vector per text, in order; up to 100 texts per request
+    if not keys():
+        raise RuntimeError('GEMINI_API_KEY not set')
+    model = embed_model()
+    out: List[List[float]] = []
+    for i in range(0, len(texts), 100):
+        body = { 'requests': [
+            { 'model': model, 'content': { 'parts': [{ 'text': t }] }, 'taskType': task, 'outputDimensionality': dim }
+            for t in texts[i:i + 100]
+        ] }
+        key = next_key()
+        with _metered(f'embed/{model}', key, None) as rec:
+            with admission.admit(inflight_cap()), slots():
+                _slot_taken(rec)
+                res = requests.post(f"{BASE}/v1beta/{model}:batchEmbedContents?key={key}", json=body, timeout=timeout)
+            rec['status'] = res.status_code
+            res.raise_for_status()
+        vectors = [e.get('values') or [] for e in (res.json() or {}).get('embeddings', [])]
+        if len(vectors) != len(body['requests']):
+            raise RuntimeError(f'embedding count mismatch: {len(vectors)} for {len(body["requests"])} texts')
+        out.extend(vectors)
+    return out
+
+
+def stream(system_prompt: str, user_content: str, kind: str = 'text',
+           on_chunk: Optional[Callable[[str], None]] = None, abort: bool = True, timeout: int = CALL_TIMEOUT,
+           cache: Optional[Cache] = None) -> str:
+    # streamGenerateContent; with abort=True a format violation closes the
+    # connection right away and raises FormatViolation instead of waiting
+    # for the rest of a response that will be rejected anyway
+    if not keys():
+        raise RuntimeError('GEMINI_API_KEY not set')
+    errors = []
+    for label, key, url, payload, used in _attempts(system_prompt, user_content, cache, 'streamGenerateContent?alt=sse'):
+        parser = StreamParser(kind)
+        usage: List[Dict[str, int]] = []
+        try:
+            with _metered(label, key, used, stream=True) as rec:
+                with admission.admit(inflight_cap()), slots():
+                    _slot_taken(rec)
+                    with requests.post(url, json=payload, timeout=timeout, stream=True) as res:
+                        rec['status'] = res.status_code
+                        if res.status_code == 404:
+                            _failed(errors, label, 404, used)
+                            continue
+                        res.raise_for_status()
+                        # SSE 응답에는 charset이 없어 기본값(latin-1)으로 디코딩되는 것을 방지
+                        res.encoding = 'utf-8'
+                        try:
+                            for chunk in _sse_texts(res.iter_lines(decode_unicode=True), usage):
+                                if chunk and _check(parser, chunk, on_chunk, abort):
+                                    break
+                        finally:
+                            rec['usage'] = metrics.merge_usage(usage)
+            if parser.text:
+                return parser.text
+        except FormatViolation as e:
+            metrics.count('format_violations', reason=e.reason, route=label)
+            raise
+        except Exception as e:
+            if parser.text:
+                # 중간에 끊긴 스트림: 받은 부분까지 돌려주고 검증은 호출자에게
+                return parser.text
+            _failed(errors, label, e, used)
+            continue
+    raise RuntimeError('Gemini request failed: ' + '; '.join(errors))
+
+
+def call_strict(prompt: str, content: str, validator, tries: int = 3, kind: str = 'text',
+                on_chunk: Optional[Callable[[str], None]] = None, cache: Optional[Cache] = None) -> str:
+    # validator로 검증하고 실패 시 재시도. 스트리밍이면 형식 위반을 받는 도중에 끊고
+    # 바로 재시도하며, 마지막 시도는 끊지 않고 끝까지 받는다.
+    last = ''
+    tries = max(1, tries)
+    for i in range(tries):
+        if i:
+            metrics.count('retries')
+        try:
+            if stream_enabled():
+                last = stream(prompt, content, kind, on_chunk, abort=i < tries - 1, cache=cache)
+            else:
+                last = generate(prompt, content, cache=cache)
+        except FormatViolation as e:
+            last = e.text
+            continue
+        last = (last or '').strip()
+        if validator(last):
+            break
+        time.sleep(0.3)
+    return (last or '').strip()
+
+
+# --- asyncio variants (httpx.AsyncClient + asyncio.Semaphore) ---
+
+async def create_cache_async(client, sem, text: str, ttl: Optional[int] = None) -> Optional[Cache]:
+    if not cache_enabled() or not text or not keys():
+        return None
+    ttl = ttl or int(os.getenv('GEMINI_CACHE_TTL') or '600')
+    key, model = next_key(), _cache_model()
+    try:
+        with metrics.timed('cache_create', key=key_id(key)):
+            async with sem:
+                res = await client.post(f"{BASE}/v1beta/cachedContents?key={key}", json=_cache_body(text, model, ttl), timeout=60)
+        return _new_cache(res, key, model, text, ttl)
+    except Exception:
+        return None
+
+
+async def delete_cache_async(client, cache: Optional[Cache]) -> None:
+    if cache is None or cache.name in (c.name for c in _shared_caches.values()):
+        return
+    cache.dead = True
+    try:
+        await client.delete(f"{BASE}/v1beta/{cache.name}?key={cache.key}", timeout=10)
+    except Exception:
+        pass
+
+
+async def generate_async(client, sem, system_prompt: str, user_content: str, timeout: int = CALL_TIMEOUT,
+                         cache: Optional[Cache] = None) -> str:
+    if not keys():
+        raise RuntimeError('GEMINI_API_KEY not set')
+    errors = []
+    for label, key, url, payload, used in _attempts(system_prompt, user_content, cache, 'generateContent'):
+        try:
+            with _metered(label, key, used) as rec:
+                async with admission.admit_async(inflight_cap()), sem:
+                    _slot_taken(rec)
+                    res = await client.post(url, json=payload, timeout=timeout)
+                rec['status'] = res.status_code
+                if res.status_code == 404:
+                    _failed(errors, label, 404, used)
+                    continue
+                res.raise_for_status()
+                data = res.json()
+                rec['usage'] = metrics.usage_of(data)
+            text = response_text(data)
+            if text:
+                return text
+        except Exception as e:
+            _failed(errors, label, e, used)
+            continue
+    raise RuntimeError('Gemini request failed: ' + '; '.join(errors))
+
+
+async def stream_async(client, sem, system_prompt: str, user_content: str, kind: str = 'text',
+                       on_chunk: Optional[Callable[[str], None]] = None, abort: bool = True, timeout: int = CALL_TIMEOUT,
+                       cache: Optional[Cache] = None) -> str:
+    if not keys():
+        raise RuntimeError('GEMINI_API_KEY not set')
+    errors = []
+    for label, key, url, payload, used in _attempts(system_prompt, user_content, cache, 'streamGenerateContent?alt=sse'):
+        parser = StreamParser(kind)
+        usage: List[Dict[str, int]] = []
+        try:
+            with _metered(label, key, used, stream=True) as rec:
+                async with admission.admit_async(inflight_cap()), sem:
+                    _slot_taken(rec)
+                    async with client.stream('POST', url, json=payload, timeout=timeout) as res:
+                        rec['status'] = res.status_code
+                        if res.status_code == 404:
+                            _failed(errors, label, 404, used)
+                            continue
+                        res.raise_for_status()
+                        try:
+                            async for line in res.aiter_lines():
+                                for chunk in _sse_texts((line,), usage):
+                                    if chunk and _check(parser, chunk, on_chunk, abort):
+                                        break
+                                if parser.complete:
+                                    break
+                        finally:
+                            rec['usage'] = metrics.merge_usage(usage)
+            if parser.text:
+                return parser.text
+        except FormatViolation as e:
+            metrics.count('format_violations', reason=e.reason, route=label)
+            raise
+        except Exception as e:
+            if parser.text:
+                return parser.text
+            _failed(errors, label, e, used)
+            continue
+    raise RuntimeError('Gemini request failed: ' + '; '.join(errors))
+
+
+async def call_strict_async(client, sem, prompt: str, content: str, validator, tries: int = 3, kind: str = 'text',
+                            cache: Optional[Cache] = None) -> str:
+    import asyncio
+    last = ''
+    tries = max(1, tries)
+    for i in range(tries):
+        if i:
+            metrics.count('retries')
+        try:
+            if stream_enabled():
+                last = await stream_async(client, sem, prompt, content, kind, abort=i < tries - 1, cache=cache)
+            else:
+                last = await generate_async(client, sem, prompt, content, cache=cache)
+        except FormatViolation as e:
+            last = e.text
+            continue
+        last = (last or '').strip()
+        if validator(last):
+            break
+        await asyncio.sleep(0.3)
+    return (last or '').strip()
@@ -0,0 +1,143 @@
+import hashlib
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from _incremental import sentence_key
+from _sentences import _segment, clean_sentence
+
+# Compact storage form of dopamine_graph.
+# The list form repeats every sentence (already in transcript_text) and a free
+# text reason per sentence. The packed form keeps
+#   levels   one character per entry ('0'-'9', 'a' = 10)
+#   spans    [gap, length, ...] offsets into the transcript, gap counted from
+#            the end of the previous span (sentence text is read back from
+#            transcript_text)
+#   idx      sentence index of each entry as deltas; omitted when entry i is
+#            sentence i (the usual case)
+#   reasons  distinct reason texts; why = [entry, reason index, ...] only for
+#            entries at or above rmin, or rdef when every entry has the same one
+#   texts    { entry: sentence } for entries that could not be located
+#   fp       fingerprint of the transcript the offsets point into
+# When the transcript was edited after the analysis (fp differs) offsets are no
+# longer valid: decode() then returns empty sentences with the sentence hash
+# ('key', from analysis_sentence_hashes) so incremental re-analysis can still
+# reuse unchanged scores.
+
+FORMAT = 1
+_LEVELS = '0123456789a'
+
+
+def fingerprint(transcript: str) -> str:
+    norm = re.sub(r'\s+', ' ', str(transcript or '')).strip()
+    return hashlib.sha1(norm.encode('utf-8')).hexdigest()[:16]
+
+
+def reason_min_level() -> int:
+    return int(os.getenv('DOPAMINE_REASON_MIN_LEVEL') or '7')
+
+
+def is_packed(value: Any) -> bool:
+    return isinstance(value, dict) and 'levels' in value
+
+
+def _level(value: Any) -> int:
+    try:
+        return max(0, min(10, int(round(float(value)))))
+    except Exception:
+        return 0
+
+
+def _norm(s: str, n: int = 200) -> str:
+    return ' '.join(str(s or '').split())[:n]
+
+
+def _locate(segs, keys: List[str], sentence: str, start: int) -> int:
+    # index of the segment holding sentence, searching forward from start first
+    k = sentence_key(sentence)
+    short = _norm(sentence)
+    for rng in (range(start, len(segs)), range(0, min(start, len(segs)))):
+        for j in rng:
+            if keys[j] == k or (short and _norm(segs[j][2]) == short):
+                return j
+    return -1
+
+
+def encode(transcript: str, graph: Any, reason_min: Optional[int] = None) -> Dict[str, Any]:
+    entries = [e for e in graph if isinstance(e, dict)] if isinstance(graph, list) else []
+    segs = _segment(transcript or '')
+    keys = [sentence_key(s) for _, _, s in segs]
+    rmin = reason_min_level() if reason_min is None else reason_min
+    levels, spans, idx, texts = [], [], [], {}
+    end = cursor = 0
+    for i, e in enumerate(entries):
+        levels.append(_LEVELS[_level(e.get('level'))])
+        j = _locate(segs, keys, e.get('sentence') or '', cursor)
+        if j < 0:
+            texts[str(i)] = str(e.get('sentence') or '')[:200]
+            spans.extend((0, 0))
+            idx.append(-1)
+            continue
+        a, b, _ = segs[j]
+        spans.extend((a - end, b - a))
+        end, cursor = b, j + 1
+        idx.append(j)
+    out: Dict[str, Any] = {
+        'v': FORMAT, 'fp': fingerprint(transcript),
+        'levels': ''.join(levels), 'spans': spans, 'rmin': rmin,
+    }
+    if idx != list(range(len(entries))):
+        deltas, prev = [], -1
+        for j in idx:
+            deltas.append(j - prev if j >= 0 else 0)
+            prev = j if j >= 0 else prev
+        out['idx'] = deltas
+    if texts:
+        out['texts'] = texts
+    reasons = [str(e.get('reason') or '') for e in entries]
+    if reasons and len(set(reasons)) == 1:
+        if reasons[0]:
+            out['rdef'] = reasons[0]
+    else:
+        table: Dict[str, int] = {}
+        why: List[int] = []
+        for i, r in enumerate(reasons):
+            if r and (r in ('auto', 'heuristic') or _level(entries[i].get('level')) >= rmin):
+                why.extend((i, table.setdefault(r, len(table))))
+        if why:
+            out['reasons'] = list(table)
+            out['why'] = why
+    return out
+
+
+def decode(transcript: str, packed: Any, hashes: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    if not is_packed(packed):
+        return packed if isinstance(packed, list) else []
+    transcript = transcript or ''
+    valid = packed.get('fp') == fingerprint(transcript)
+    levels = packed.get('levels') or ''
+    spans = packed.get('spans') or []
+    texts = packed.get('texts') or {}
+    reasons = packed.get('reasons') or []
+    why = packed.get('why') or []
+    reason_of = { why[k]: reasons[why[k + 1]] for k in range(0, len(why) - 1, 2) if why[k + 1] < len(reasons) }
+    deltas = packed.get('idx')
+    out: List[Dict[str, Any]] = []
+    end = 0
+    j = -1
+    for i, ch in enumerate(levels):
+        j = j + (deltas[i] if deltas else 1)
+        e: Dict[str, Any] = { 'sentence': '', 'level': _LEVELS.find(ch) if ch in _LEVELS else 0,
+                              'reason': reason_of.get(i, packed.get('rdef') or '') }
+        if str(i) in texts:
+            e['sentence'] = texts[str(i)]
+        elif 2 * i + 1 < len(spans):
+            a = end + spans[2 * i]
+            b = a + spans[2 * i + 1]
+            end = b
+            if valid:
+                e['sentence'] = clean_sentence(transcript[a:b])[:200]
+        if not valid and not e['sentence'] and hashes and 0 <= j < len(hashes):
+            e['key'] = hashes[j]
+        out.append(e)
+    return out
@@ -0,0 +1,157 @@
+import difflib
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+# Incremental re-analysis after an admin edits transcript_text.
+# Sentences are keyed by a hash of their normalised text. dopamine_graph
+# entries for sentences that did not change are reused, so only new or edited
+# sentences are sent for scoring. Document-level stages (material, structure,
+# categories, ...) run again only when the edit is large; an edit inside the
+# first HOOK_SENTENCES re-runs hooking, which reads exactly those sentences.
+
+HOOK_SENTENCES = 3
+
+# columns a document-level pass fills; an existing but empty (or failed) one forces that pass
+DOC_FIELDS = ('material', 'hooking', 'narrative_structure')
+
+# placeholders written when a stage failed ('분석 오류: ...', '구조 분석 실패', ['감정 포인트 - 재분석 필요'])
+FAILED_PREFIXES = ('분석 오류', '응답 없음')
+FAILED_SUFFIXES = ('분석 실패', '분석 필요', '확인 필요')
+
+
+def sentence_key(sentence: str) -> str:
+    norm = re.sub(r'\s+', ' ', str(sentence or '')).strip()
+    return hashlib.sha1(norm.encode('utf-8')).hexdigest()[:16]
+
+
+def keys_of(sentences: Iterable[str]) -> List[str]:
+    return [sentence_key(s) for s in sentences]
+
+
+def enabled() -> bool:
+    return (os.getenv('INCREMENTAL_ANALYSIS') or '1').strip().lower() not in ('0', 'false', 'no')
+
+
+def doc_threshold() -> float:
+    # share of sentences added/removed/changed above which every document-level stage re-runs
+    return float(os.getenv('INCREMENTAL_DOC_THRESHOLD') or '0.2')
+
+
+def _graph(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    graph = doc.get('dopamine_graph') or []
+    if isinstance(graph, str):
+        try:
+            graph = json.loads(graph)
+        except Exception:
+            graph = []
+    # entries decoded against an edited transcript carry only the sentence hash ('key')
+    return [e for e in graph if isinstance(e, dict) and (e.get('sentence') or e.get('key'))] if isinstance(graph, list) else []
+
+
+def has_graph(doc: Dict[str, Any]) -> bool:
+    # a stored dopamine graph with at least one usable entry
+    return bool(_graph(doc))
+
+
+def _entry_key(e: Dict[str, Any]) -> str:
+    return e.get('key') or sentence_key(e['sentence'])
+
+
+def _reused(e: Dict[str, Any], sentence: str) -> Dict[str, Any]:
+    out = { k: v for k, v in e.items() if k != 'key' }
+    out['sentence'] = out.get('sentence') or sentence[:200]
+    return out
+
+
+class Plan:
+    __slots__ = ('keys', 'reuse', 'todo', 'changed', 'head_changed', 'full')
+
+    def __init__(self, keys: List[str], reuse: Dict[int, Dict[str, Any]], changed: float,
+                 head_changed: bool, full: bool):
+        self.keys = keys
+        self.reuse = reuse
+        self.todo = [i for i in range(len(keys)) if i not in reuse]
+        self.changed = changed
+        self.head_changed = head_changed
+        self.full = full
+
+    @property
+    def recompute_doc(self) -> bool:
+        return self.full or self.changed > doc_threshold()
+
+    @property
+    def recompute_hooking(self) -> bool:
+        return self.recompute_doc or self.head_changed
+
+    def merge(self, sentences: List[str], scored: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # reused + newly scored entries in sentence order; scored answers for
+        # self.todo are matched by position, or by sentence text when the model
+        # skipped or merged some of them
+        if len(scored) == len(self.todo):
+            fresh = dict(zip(self.todo, scored))
+        else:
+            by_key = { sentence_key(e.get('sentence')): e for e in scored }
+            fresh = { i: by_key[self.keys[i]] for i in self.todo if self.keys[i] in by_key }
+        out = []
+        for i in range(len(sentences)):
+            entry = self.reuse.get(i) or fresh.get(i)
+            if entry is not None:
+                out.append(entry)
+        return out
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'sentences': len(self.keys),
+            'reused': len(self.reuse),
+            'todo': len(self.todo),
+            'changed': round(self.changed, 3),
+            'head_changed': self.head_changed,
+            'full': self.full,
+        }
+
+
+def _missing(value: Any) -> bool:
+    if isinstance(value, str):
+        v = value.strip()
+        return not v or v.startswith(FAILED_PREFIXES) or v.endswith(FAILED_SUFFIXES)
+    if isinstance(value, list):
+        return all(_missing(v) for v in value)
+    return not value
+
+
+def plan(doc: Dict[str, Any], sentences: List[str], fields: Iterable[str] = DOC_FIELDS,
+         force: bool = False, seeded: bool = False) -> Plan:
+    # full plan (score everything, every stage) unless doc holds a complete previous
+    # analysis of a different transcript to diff against. Re-running an unchanged
+    # transcript (or force) is a repair and redoes everything; a doc seeded from a
+    # near-duplicate's analysis (_dedup) with the same sentences has nothing left to do.
+    keys = keys_of(sentences)
+    graph = _graph(doc)
+    old = doc.get('analysis_sentence_hashes') or [_entry_key(e) for e in graph]
+    missing = any(f in doc and _missing(doc.get(f)) for f in fields)
+    if force or not enabled() or not graph or not old or missing or (old == keys and not seeded):
+        return Plan(keys, {}, 1.0, True, True)
+    cached = { _entry_key(e): e for e in graph }
+    reuse = { i: _reused(cached[k], sentences[i]) for i, k in enumerate(keys) if k in cached }
+    sm = difflib.SequenceMatcher(None, old, keys, autojunk=False)
+    matched = sum(b.size for b in sm.get_matching_blocks())
+    changed = 1.0 - matched / max(len(old), len(keys), 1)
+    head_changed = old[:HOOK_SENTENCES] != keys[:HOOK_SENTENCES]
+    return Plan(keys, reuse, changed, head_changed, False)
+
+
+def partial_update(transcript: str, plan_: Plan, dopamine_graph: List[Dict[str, Any]],
+                   hooking: Optional[str] = None) -> Dict[str, Any]:
+    # videos patch for a run that skipped the document-level stages
+    updated = {
+        'dopamine_graph': dopamine_graph,
+        'analysis_transcript_len': len(transcript),
+        'transcript_text': transcript,
+        'analysis_sentence_hashes': plan_.keys,
+    }
+    if hooking:
+        updated['hooking'] = hooking.strip()[:1000]
+    return updated
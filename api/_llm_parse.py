@@ -0,0 +1,418 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Shared parser for Gemini output: code fences, JSON (balanced-bracket
+# extraction with partial recovery), markdown tables and "label: value"
+# lines. StreamParser applies the same rules to a response as it streams.
+
+_FENCE = re.compile(r'```[\w-]*[ \t]*\n?(.*?)(?:```|$)', re.S)
+_OUTSIDE = re.compile(r'["{}\[\],]')
+_INSIDE = re.compile(r'["\\]')
+_CLOSE = { '{': '}', '[': ']' }
+
+
+def strip_fences(text: str) -> str:
+    t = (text or '').strip()
+    if '```' not in t:
+        return t
+    m = _FENCE.search(t)
+    return m.group(1).strip() if m else t
+
+
+class _Scanner:
+    # Incremental bracket/string scanner. Records cut points (index, closers)
+    # where text[:index] + closers is valid JSON if the prefix was well formed.
+
+    __slots__ = ('start', 'pos', 'stack', 'in_str', 'esc', 'end', 'bad', 'cuts', 'items', 'item_start')
+
+    def __init__(self, start: int):
+        self.start = start
+        self.pos = start
+        self.stack: List[str] = []
+        self.in_str = False
+        self.esc = False
+        self.end = -1
+        self.bad = False
+        self.cuts: List[Tuple[int, str, bool]] = []
+        # (start, end) of finished top-level array elements / object members
+        self.items: List[Tuple[int, int]] = []
+        self.item_start = start
+
+    def _closers(self) -> str:
+        return ''.join(_CLOSE[c] for c in reversed(self.stack))
+
+    def feed(self, text: str) -> None:
+        i = self.pos
+        n = len(text)
+        while i < n and self.end < 0 and not self.bad:
+            if self.in_str:
+                if self.esc:
+                    self.esc = False
+                    i += 1
+                    continue
+                m = _INSIDE.search(text, i)
+                if not m:
+                    i = n
+                    break
+                i = m.start()
+                if text[i] == '\\':
+                    self.esc = True
+                else:
+                    self.in_str = False
+                i += 1
+                continue
+            m = _OUTSIDE.search(text, i)
+            if not m:
+                i = n
+                break
+            i = m.start()
+            ch = text[i]
+            if ch == '"':
+                self.in_str = True
+            elif ch in '{[':
+                if len(self.stack) == 1:
+                    self.item_start = i
+                self.stack.append(ch)
+                self.cuts.append((i + 1, self._closers(), True))
+            elif ch in '}]':
+                if not self.stack or _CLOSE[self.stack[-1]] != ch:
+                    self.bad = True
+                    break
+                self.stack.pop()
+                if not self.stack:
+                    self.end = i + 1
+                elif len(self.stack) == 1:
+                    self.items.append((self.item_start, i + 1))
+                    self.cuts.append((i + 1, self._closers(), False))
+                else:
+                    self.cuts.append((i + 1, self._closers(), False))
+            elif ch == ',':
+                self.cuts.append((i, self._closers(), False))
+            i += 1
+        self.pos = i
+
+
+def _first_opener(text: str, kind) -> int:
+    if kind is dict:
+        return text.find('{')
+    if kind is list:
+        return text.find('[')
+    idx = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    return min(idx) if idx else -1
+
+
+def _recover(text: str, sc: _Scanner) -> Any:
+    # drop the unfinished tail; prefer cuts after a complete element over bare openers
+    if text[sc.start] == '[':
+        # 배열은 끝까지 받은 요소만 살린다: 잘린 객체({"sentence": "c)나 문자열은 버림
+        for idx, closers, is_open in reversed(sc.cuts):
+            if closers == ']' and not is_open:
+                try:
+                    return json.loads(text[sc.start:idx] + closers)
+                except Exception:
+                    continue
+        return []
+    # 중첩 배열 안에서 잘린 요소(문자열이든 객체든)는 버리고 끝까지 받은 요소만 남긴다
+    if sc.in_str and ']' not in sc._closers():
+        # 잘린 마지막 문자열 값은 닫아서 살린다
+        try:
+            return json.loads(text[sc.start:].rstrip('\\') + '"' + sc._closers())
+        except Exception:
+            pass
+    cuts = sc.cuts[-64:]
+    for allow_open in (False, True):
+        for idx, closers, is_open in reversed(cuts):
+            if (is_open and not allow_open) or ']' in closers[1:]:
+                continue
+            try:
+                return json.loads(text[sc.start:idx] + closers)
+            except Exception:
+                continue
+    return None
+
+
+def extract_json(text: str, kind=None, partial: bool = True) -> Any:
+    t = strip_fences(text)
+    if not t:
+        return None
+    try:
+        obj = json.loads(t)
+        if kind is None or isinstance(obj, kind):
+            return obj
+    except Exception:
+        pass
+    pos = 0
+    for _ in range(4):
+        rel = _first_opener(t[pos:], kind)
+        if rel < 0:
+            return None
+        start = pos + rel
+        sc = _Scanner(start)
+        sc.feed(t)
+        if sc.end > 0:
+            try:
+                obj = json.loads(t[start:sc.end])
+                if kind is None or isinstance(obj, kind):
+                    return obj
+            except Exception:
+                pass
+            pos = sc.end
+            continue
+        if sc.bad:
+            pos = start + 1
+            continue
+        if partial:
+            obj = _recover(t, sc)
+            if obj is not None and (kind is None or isinstance(obj, kind)):
+                return obj
+        return None
+    return None
+
+
+def json_array(text: str) -> List[Any]:
+    arr = extract_json(text, list)
+    if isinstance(arr, list):
+        return [x for x in arr if x not in ({}, [], None, '')]
+    return []
+
+
+def json_object(text: str, partial: bool = True) -> Dict[str, Any]:
+    # partial=False: complete JSON only (validators; a truncated answer must be retried)
+    obj = extract_json(text, dict, partial)
+    return obj if isinstance(obj, dict) else {}
+
+
+# ---- markdown tables ----
+
+_ROW = re.compile(r'^[ \t]*\|(.*)\|[ \t]*$', re.M)
+_SEP_CELL = re.compile(r'^\s*:?-{2,}:?\s*$')
+
+
+def parse_md_table(text: str) -> List[List[str]]:
+    # rows incl. header, separator rows dropped
+    rows = []
+    for m in _ROW.finditer(strip_fences(text)):
+        cells = [c.strip() for c in m.group(1).split('|')]
+        if cells and all(_SEP_CELL.match(c) for c in cells if c):
+            continue
+        rows.append(cells)
+    return rows
+
+
+def table_map(text: str) -> Dict[str, str]:
+    # first column -> second column (e.g. 기승전결 / 후킹 표)
+    out = {}
+    for row in parse_md_table(text)[1:]:
+        if len(row) >= 2 and row[0]:
+            out[row[0]] = row[1]
+    return out
+
+
+def is_md_table(text: str) -> bool:
+    return len(parse_md_table(text)) >= 2
+
+
+# ---- "label: value" lines ----
+
+CATEGORY_FIELDS = {
+    'kr_category_large': re.compile(r'한국\s*대\s*카테고리\s*[:：]\s*(.+)', re.I),
+    'kr_category_medium': re.compile(r'한국\s*중\s*카테고리\s*[:：]\s*(.+)', re.I),
+    'kr_category_small': re.compile(r'한국\s*소\s*카테고리\s*[:：]\s*(.+)', re.I),
+    'en_category_main': re.compile(r'EN\s*Main\s*Category\s*[:：]\s*(.+)', re.I),
+    'en_category_sub': re.compile(r'EN\s*Sub\s*Category\s*[:：]\s*(.+)', re.I),
+    'en_micro_topic': re.compile(r'EN\s*Micro\s*Topic\s*[:：]\s*(.+)', re.I),
+    'cn_category_large': re.compile(r'중국\s*대\s*카테고리\s*[:：]\s*(.+)', re.I),
+    'cn_category_medium': re.compile(r'중국\s*중\s*카테고리\s*[:：]\s*(.+)', re.I),
+    'cn_category_small': re.compile(r'중국\s*소\s*카테고리\s*[:：]\s*(.+)', re.I),
+}
+
+MATERIAL_LINE = re.compile(r'(?:메인\s*아이디어|소재)\s*[:：]\s*(.+)', re.I)
+
+
+def extract_line(pattern, text: str) -> str:
+    pat = pattern if hasattr(pattern, 'search') else re.compile(pattern, re.I)
+    m = pat.search(text or '')
+    if not m:
+        return ''
+    val = m.group(1) if m.groups() and m.group(1) is not None else m.group(0)
+    return val.strip().strip('*').strip()
+
+
+def parse_categories(text: str) -> Dict[str, str]:
+    # JSON 객체로 와도 같은 키로 받는다
+    obj = json_object(text) if '{' in (text or '') else {}
+    out = {}
+    for field, pat in CATEGORY_FIELDS.items():
+        val = obj.get(field) if isinstance(obj.get(field), str) else ''
+        out[field] = (val or '').strip() or extract_line(pat, text)
+    return out
+
+
+# ---- material sections ----
+
+_MAT_MAIN = re.compile(r'메인\s*아이디어\s*\(Main\s*Idea\)\s*[:：]\s*(.+)')
+_MAT_STOP = re.compile(r'^\s*(메인\s*아이디어|핵심\s*소재|3-1|3-2|3-3)\b')
+_MAT_BULLET = re.compile(r'^[-*•·]\s*')
+_MAT_SECTIONS = (
+    ('core_materials', re.compile(r'핵심\s*소재\s*\(Core\s*Materials\)\s*:?', re.I), re.compile(r'^(3-1|3-2|3-3)\b', re.I)),
+    ('lang_patterns', re.compile(r'^(3-1\s*반복되는\s*언어\s*패턴)\b|반복되는\s*언어\s*패턴\s*[:：]', re.I), re.compile(r'^(3-2|3-3)\b', re.I)),
+    ('emotion_points', re.compile(r'^(3-2\s*감정\s*몰입\s*포인트)\b|감정\s*몰입.*[:：]', re.I), re.compile(r'^(3-3)\b', re.I)),
+    ('info_delivery', re.compile(r'^(3-3\s*정보\s*전달\s*방식\s*특징)\b|정보\s*전달\s*방식.*[:：]', re.I), None),
+)
+MATERIAL_KEYS = ('main_idea', 'core_materials', 'lang_patterns', 'emotion_points', 'info_delivery')
+
+
+def _str_list(val) -> List[str]:
+    if isinstance(val, str):
+        val = [x for x in re.split(r'[,\n]', val)]
+    if not isinstance(val, list):
+        return []
+    return [str(x).strip() for x in val if str(x).strip()][:12]
+
+
+def parse_material(text: str) -> Dict[str, Any]:
+    out: Dict[str, Any] = { 'main_idea': '', 'core_materials': [], 'lang_patterns': [], 'emotion_points': [], 'info_delivery': [] }
+    t = (text or '').strip()
+    if not t:
+        return out
+    obj = json_object(t)
+    if obj:
+        out['main_idea'] = str(obj.get('main_idea') or '').strip()
+        for k in MATERIAL_KEYS[1:]:
+            out[k] = _str_list(obj.get(k))
+        return out
+    # header-based capture
+    t = t.replace('\r', '')
+    m = _MAT_MAIN.search(t)
+    if m:
+        out['main_idea'] = m.group(1).strip()
+    lines = t.split('\n')
+    for key, head, stop in _MAT_SECTIONS:
+        acc = []
+        cap = False
+        for line in lines:
+            if not cap and head.search(line):
+                cap = True
+                continue
+            if cap:
+                if stop and stop.search(line):
+                    break
+                s = line.strip()
+                if not s:
+                    continue
+                if _MAT_STOP.match(s):
+                    break
+                acc.append(_MAT_BULLET.sub('', s))
+        out[key] = [x for x in acc if x and len(x) > 1][:12]
+    return out
+
+
+def material_json_ok(text: str) -> bool:
+    obj = json_object(text, partial=False)
+    return (
+        bool(obj) and
+        isinstance(obj.get('main_idea', ''), str) and
+        all(isinstance(obj.get(k, []), list) for k in MATERIAL_KEYS[1:])
+    )
+
+
+# ---- keywords ----
+
+def _norm_keywords(arr) -> List[str]:
+    if isinstance(arr, list):
+        items = arr
+    elif isinstance(arr, str):
+        items = [x.strip() for x in arr.split(',')]
+    else:
+        items = []
+    seen = set()
+    out = []
+    for it in items:
+        s = str(it.get('keyword', '') if isinstance(it, dict) else it).strip().strip('#"\'')
+        if not s:
+            continue
+        key = s.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(s)
+    return out[:20]
+
+
+def parse_keywords(text: str) -> Tuple[List[str], List[str], List[str]]:
+    data = json_object(text)
+    return (
+        _norm_keywords(data.get('ko')), _norm_keywords(data.get('en')), _norm_keywords(data.get('zh') or data.get('cn'))
+    )
+
+
+# ---- streaming ----
+
+class StreamParser:
+    # feed() streamed chunks; violation() reports a format break as early as
+    # possible so the caller can cancel the request instead of retrying later.
+
+    def __init__(self, kind: str = 'text'):
+        self.kind = kind  # 'json' | 'array' | 'table' | 'text'
+        self.buf = ''
+        self._sc: Optional[_Scanner] = None
+        self._taken = 0
+
+    def feed(self, chunk: str) -> None:
+        self.buf += chunk or ''
+        if self.kind not in ('json', 'array'):
+            return
+        if self._sc is None:
+            idx = _first_opener(self.buf, list if self.kind == 'array' else None)
+            if idx < 0:
+                return
+            self._sc = _Scanner(idx)
+        self._sc.feed(self.buf)
+
+    @property
+    def text(self) -> str:
+        return self.buf
+
+    @property
+    def complete(self) -> bool:
+        return self._sc is not None and self._sc.end > 0
+
+    def _lead(self) -> str:
+        # 앞쪽 코드펜스 줄은 무시하고 실제 내용의 시작 부분
+        t = self.buf.lstrip()
+        if t.startswith('```'):
+            nl = t.find('\n')
+            t = t[nl + 1:].lstrip() if nl >= 0 else ''
+        return t
+
+    def violation(self) -> str:
+        lead = self._lead()
+        if self.kind in ('json', 'array'):
+            if self._sc is not None and self._sc.bad:
+                return 'malformed json'
+            if lead and lead[0] not in '{[':
+                if len(lead) >= 8 or '\n' in lead:
+                    return 'prose instead of json'
+        elif self.kind == 'table':
+            lines = [l for l in lead.split('\n') if l.strip()]
+            done = lines if self.buf.endswith('\n') else lines[:-1]
+            if len(done) >= 2 and not any(l.lstrip().startswith('|') for l in done):
+                return 'prose instead of table'
+        return ''
+
+    def new_items(self) -> List[Any]:
+        # 새로 완성된 배열 원소 (dopamine 배열을 받는 즉시 처리할 때)
+        if self._sc is None:
+            return []
+        out = []
+        for a, b in self._sc.items[self._taken:]:
+            try:
+                out.append(json.loads(self.buf[a:b]))
+            except Exception:
+                pass
+        self._taken = len(self._sc.items)
+        return out
+
+    def value(self, kind=None) -> Any:
+        return extract_json(self.buf, kind)
@@ -0,0 +1,252 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+# Structured instrumentation for the analysis pipeline.
+# Every event is one JSON log line (METRICS_LOG=0 to silence) and is also
+# folded into the active Run, which cron_analyze writes to the job_metrics
+# table once per schedule run. The active Run lives in a ContextVar, so
+# overlapping analyze_one requests on a warm instance each keep their own;
+# asyncio tasks and to_thread inherit it, pool workers get it through bind().
+
+# latency histogram upper bounds (ms); the last bucket is open-ended
+BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+def _enabled() -> bool:
+    return (os.getenv('METRICS_LOG') or '1').strip().lower() not in ('0', 'false', 'no')
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def log(event: str, **fields) -> None:
+    if not _enabled():
+        return
+    try:
+        line = json.dumps({ 'ts': _now_iso(), 'event': event, **fields }, ensure_ascii=False, default=str)
+        sys.stdout.write(line + '\n')
+        sys.stdout.flush()
+    except Exception:
+        pass
+
+
+class _Hist:
+    __slots__ = ('count', 'errors', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, ms: float, ok: bool) -> None:
+        self.count += 1
+        self.errors += 0 if ok else 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def quantile(self, q: float) -> Optional[int]:
+        # upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else int(self.max)
+        return int(self.max)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': round(self.total / self.count, 1) if self.count else None,
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'max_ms': round(self.max, 1),
+            'buckets': self.buckets,
+        }
+
+
+class Run:
+    def __init__(self, schedule_id: Any = None, job_type: str = '', config: Optional[Dict[str, Any]] = None):
+        self.schedule_id = None if schedule_id is None else str(schedule_id)
+        self.job_type = job_type or ''
+        self.config = dict(config or {})
+        self.started_at = _now_iso()
+        self.t0 = time.time()
+        self.lock = threading.Lock()
+        self.stages: Dict[str, _Hist] = {}
+        self.counters: Dict[str, int] = {}
+        self.keys: Dict[str, Dict[str, int]] = {}
+        self.tokens = { 'prompt': 0, 'response': 0, 'cached': 0 }
+
+    def observe(self, stage: str, ms: float, ok: bool = True) -> None:
+        with self.lock:
+            self.stages.setdefault(stage, _Hist()).add(ms, ok)
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def key_status(self, key_id: str, status: int) -> None:
+        with self.lock:
+            per = self.keys.setdefault(key_id, {})
+            label = str(status) if status else 'error'
+            per[label] = per.get(label, 0) + 1
+
+    def add_usage(self, prompt: int, response: int, cached: int) -> None:
+        with self.lock:
+            self.tokens['prompt'] += prompt
+            self.tokens['response'] += response
+            self.tokens['cached'] += cached
+
+    def cost_usd(self) -> float:
+        # USD per 1M tokens; defaults are gemini-2.5-flash list prices
+        p_in = float(os.getenv('GEMINI_PRICE_INPUT') or '0.30')
+        p_out = float(os.getenv('GEMINI_PRICE_OUTPUT') or '2.50')
+        p_cached = float(os.getenv('GEMINI_PRICE_CACHED') or '0.075')
+        fresh = max(0, self.tokens['prompt'] - self.tokens['cached'])
+        return round((fresh * p_in + self.tokens['cached'] * p_cached + self.tokens['response'] * p_out) / 1e6, 6)
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            llm = self.stages.get('gemini')
+            return {
+                'schedule_id': self.schedule_id,
+                'job_type': self.job_type,
+                'started_at': self.started_at,
+                'finished_at': _now_iso(),
+                'duration_ms': int((time.time() - self.t0) * 1000),
+                'videos': self.counters.get('videos', 0),
+                'video_errors': self.counters.get('video_errors', 0),
+                'llm_calls': llm.count if llm else 0,
+                'llm_errors': llm.errors if llm else 0,
+                'retries': self.counters.get('retries', 0),
+                'rate_limited': sum(v.get('429', 0) for v in self.keys.values()),
+                'prompt_tokens': self.tokens['prompt'],
+                'response_tokens': self.tokens['response'],
+                'cached_tokens': self.tokens['cached'],
+                'cache_hits': self.counters.get('cache_hits', 0),
+                'est_cost_usd': self.cost_usd(),
+                'config': self.config,
+                'counters': dict(self.counters),
+                'stages': { k: h.as_dict() for k, h in self.stages.items() },
+                'keys': { k: dict(v) for k, v in self.keys.items() },
+            }
+
+
+_run: contextvars.ContextVar = contextvars.ContextVar('metrics_run', default=None)
+
+
+def start_run(schedule_id: Any = None, job_type: str = '', config: Optional[Dict[str, Any]] = None) -> Run:
+    run = Run(schedule_id, job_type, config)
+    _run.set(run)
+    log('run_start', schedule_id=run.schedule_id, job_type=job_type, config=run.config)
+    return run
+
+
+def current() -> Optional[Run]:
+    return _run.get()
+
+
+def bind(fn: Callable) -> Callable:
+    # fn for a pool thread, recording into the caller's Run (each call runs in its own copy of the context)
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.copy().run(fn, *args, **kwargs)
+
+
+def finish_run(sb=None, table: str = 'job_metrics') -> Dict[str, Any]:
+    # summary of the active run; written to `table` when sb is given
+    run = _run.get()
+    _run.set(None)
+    if run is None:
+        return {}
+    row = run.summary()
+    log('run_end', **{ k: v for k, v in row.items() if k not in ('stages', 'keys') })
+    if sb is not None:
+        try:
+            sb.table(table).insert(row).execute()
+        except Exception as e:
+            log('metrics_write_failed', table=table, error=str(e)[:200])
+    return row
+
+
+def observe(stage: str, ms: float, ok: bool = True, **fields) -> None:
+    run = _run.get()
+    if run is not None:
+        run.observe(stage, ms, ok)
+    log('stage', stage=stage, ms=round(ms, 1), ok=ok, **fields)
+
+
+def count(name: str, n: int = 1, **fields) -> None:
+    run = _run.get()
+    if run is not None:
+        run.count(name, n)
+    if fields:
+        log(name, n=n, **fields)
+
+
+@contextmanager
+def timed(stage: str, **fields):
+    t0 = time.time()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        observe(stage, (time.time() - t0) * 1000, ok, **fields)
+
+
+def usage_of(data: Any) -> Dict[str, int]:
+    meta = (data or {}).get('usageMetadata') or {} if isinstance(data, dict) else {}
+    return {
+        'prompt': int(meta.get('promptTokenCount') or 0),
+        'response': int(meta.get('candidatesTokenCount') or 0),
+        'cached': int(meta.get('cachedContentTokenCount') or 0),
+    }
+
+
+def gemini_call(label: str, key_id: str, status: int, ms: float, usage: Optional[Dict[str, int]] = None,
+                cached: bool = False, stream: bool = False, wait_ms: float = 0.0) -> None:
+    # one HTTP attempt against Gemini (status 0 = network error / no response);
+    # wait_ms is the time spent queueing for an in-flight slot before it
+    usage = usage or { 'prompt': 0, 'response': 0, 'cached': 0 }
+    ok = 200 <= status < 300
+    run = _run.get()
+    if run is not None:
+        run.observe('gemini', ms, ok)
+        run.observe('gemini_slot_wait', wait_ms)
+        run.key_status(key_id, status)
+        run.add_usage(usage['prompt'], usage['response'], usage['cached'])
+        if cached and ok:
+            run.count('cache_hits')
+    log('gemini', route=label, key=key_id, status=status, ms=round(ms, 1), wait_ms=round(wait_ms, 1),
+        stream=stream, cache_hit=cached, prompt_tokens=usage['prompt'], response_tokens=usage['response'],
+        cached_tokens=usage['cached'])
+
+
+def merge_usage(parts: List[Dict[str, int]]) -> Dict[str, int]:
+    # streamed responses report usage on (at least) the final chunk; keep the largest
+    out = { 'prompt': 0, 'response': 0, 'cached': 0 }
+    for u in parts:
+        for k in out:
+            out[k] = max(out[k], u.get(k, 0))
+    return out
@@ -0,0 +1,79 @@
+import os
+import re
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import _metrics as metrics
+
+# Keyset pagination over Supabase/PostgREST tables.
+# A bare select() is silently cut at the server's max-rows (1000 by default),
+# and select('*') on videos drags transcript_text / analysis_full /
+# dopamine_graph along. Pages here are ordered by a unique key column and
+# continue with key > last key, so nothing is skipped or repeated when rows
+# are inserted meanwhile, and only the requested columns are read. At most one
+# page is held in memory at a time.
+
+KEY = 'id'
+
+# columns a list/scan never needs; callers must ask for them by name
+BLOB_COLUMNS = ('transcript_text', 'analysis_full', 'dopamine_graph', 'analysis_sentence_hashes')
+
+_COLUMN_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def page_size() -> int:
+    return max(1, min(1000, int(os.getenv('PAGE_SIZE') or '1000')))
+
+
+def columns(spec: Any, key: str = KEY) -> List[str]:
+    # "a,b" or [a, b] -> validated column list that always includes the key
+    raw = spec.split(',') if isinstance(spec, str) else list(spec or [])
+    out: List[str] = []
+    for c in (str(x).strip() for x in raw):
+        if not c:
+            continue
+        if c == '*' or not _COLUMN_RE.match(c):
+            raise ValueError(f'invalid column: {c}')
+        if c not in out:
+            out.append(c)
+    if key not in out:
+        out.insert(0, key)
+    return out
+
+
+def page(sb, table: str, cols: Sequence[str], after: Any = None, limit: Optional[int] = None,
+         filters: Optional[Callable[[Any], Any]] = None, key: str = KEY) -> Tuple[List[Dict[str, Any]], Any]:
+    # one page -> (rows, key to continue after; None once a page comes back empty).
+    # A short page does not end the scan: the server's max-rows may be below n.
+    n = limit or page_size()
+    q = sb.table(table).select(','.join(columns(cols, key)))
+    if filters is not None:
+        q = filters(q)
+    if after is not None:
+        q = q.gt(key, after)
+    with metrics.timed('sb_page', table=table, size=n):
+        res = q.order(key).limit(n).execute()
+    rows = getattr(res, 'data', []) or []
+    return rows, (rows[-1].get(key) if rows else None)
+
+
+def iter_pages(sb, table: str, cols: Sequence[str], page_size_: Optional[int] = None,
+               filters: Optional[Callable[[Any], Any]] = None, key: str = KEY,
+               after: Any = None) -> Iterator[List[Dict[str, Any]]]:
+    # filters: q -> q, applied to every page (e.g. lambda q: q.eq('status', 'x'))
+    while True:
+        rows, after = page(sb, table, cols, after, page_size_, filters, key)
+        if after is None:
+            return
+        yield rows
+
+
+def iter_rows(sb, table: str, cols: Sequence[str], page_size_: Optional[int] = None,
+              filters: Optional[Callable[[Any], Any]] = None, key: str = KEY) -> Iterator[Dict[str, Any]]:
+    for rows in iter_pages(sb, table, cols, page_size_, filters, key):
+        yield from rows
+
+
+def all_ids(sb, table: str = 'videos', filters: Optional[Callable[[Any], Any]] = None,
+            key: str = KEY) -> List[Any]:
+    # every key of the table (job snapshots); only the key column is read
+    return [r[key] for r in iter_rows(sb, table, [key], filters=filters, key=key) if r.get(key) is not None]
@@ -0,0 +1,189 @@
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import _core as core
+import _metrics as metrics
+import _pagination as pagination
+
+# View-growth ranking, materialised after each ranking batch.
+# _update_views_for_videos hands over the rows it just refreshed; their growth
+# (delta, rate, views per day since the previous check) is written onto the
+# videos row and merged into video_rankings, which keeps the top K per
+# (category, metric). Only the refreshed rows are scored: each touched
+# (category, metric) list is read (K + slack rows), merged and trimmed, so a
+# batch costs a few small queries whatever the table size. Ranking pages read
+# video_rankings instead of loading and sorting every video.
+
+TABLE = 'video_rankings'
+ALL = '*'  # category key of the overall ranking
+METRICS = ('growth', 'delta', 'per_day')
+
+_DAY_MS = 86400 * 1000
+_MIN_INTERVAL_MS = 3600 * 1000  # per-day rate over less than an hour is noise
+
+_probe = core.table_probe(TABLE, 'video_id', 'RANKING_MATERIALIZE')
+
+
+def enabled() -> bool:
+    return _probe.enabled()
+
+
+def top_k() -> int:
+    return max(1, int(os.getenv('RANKING_TOP_K') or '200'))
+
+
+def keep() -> int:
+    # rows kept per list: K plus slack, so a member dropping out is replaced from what is stored
+    return top_k() + max(0, int(os.getenv('RANKING_SLACK') or str(top_k() // 2)))
+
+
+def category_columns() -> List[str]:
+    raw = os.getenv('RANKING_CATEGORY_COLUMNS') or 'kr_category_large'
+    return [c.strip() for c in raw.split(',') if c.strip()]
+
+
+def available(sb=None) -> bool:
+    # before the migration ranking batches only update videos
+    return _probe(sb)
+
+
+def parse_count(v: Any) -> int:
+    # 12345 / "12,345" / "조회수 12,345회" -> 12345
+    try:
+        if isinstance(v, (int, float)):
+            return int(v)
+        digits = ''.join(ch for ch in str(v or '') if ch.isdigit())
+        return int(digits) if digits else 0
+    except Exception:
+        return 0
+
+
+def growth(views: int, prev: int, prev_checked_ms: Any = None, now_ms: Optional[int] = None) -> Dict[str, Any]:
+    # videos columns for one refresh; prev is the value views is compared with (views_prev_numeric)
+    now_ms = now_ms or int(time.time() * 1000)
+    delta = views - prev if prev else 0
+    out: Dict[str, Any] = {
+        'views_delta': delta,
+        'views_growth_rate': round(delta / prev, 6) if prev else 0.0,
+        'views_per_day': None,
+    }
+    try:
+        since = now_ms - int(prev_checked_ms)
+    except Exception:
+        since = 0
+    if prev and since > 0:
+        out['views_per_day'] = round(delta * _DAY_MS / max(since, _MIN_INTERVAL_MS), 2)
+    return out
+
+
+def categories(row: Dict[str, Any]) -> List[str]:
+    # ranking lists a video belongs to: the overall one plus "<column>:<value>" per category column
+    out = [ALL]
+    for col in category_columns():
+        value = str(row.get(col) or '').strip()
+        if value:
+            out.append(f'{col}:{value}')
+    return out
+
+
+def _score(row: Dict[str, Any], metric: str) -> Optional[float]:
+    value = row.get({ 'growth': 'views_growth_rate', 'delta': 'views_delta', 'per_day': 'views_per_day' }[metric])
+    return None if value is None else float(value)
+
+
+def _entry(row: Dict[str, Any], category: str, metric: str, score: float, now_iso: str) -> Dict[str, Any]:
+    return {
+        'category': category, 'metric': metric, 'video_id': row['id'], 'score': score,
+        'views': row.get('views_numeric'), 'views_delta': row.get('views_delta'),
+        'growth_rate': row.get('views_growth_rate'), 'per_day': row.get('views_per_day'),
+        'updated_at': now_iso,
+    }
+
+
+def _lists(rows: Iterable[Dict[str, Any]]) -> Dict[Tuple[str, str], List[Tuple[float, Dict[str, Any]]]]:
+    out: Dict[Tuple[str, str], List[Tuple[float, Dict[str, Any]]]] = {}
+    for row in rows:
+        for cat in categories(row):
+            for metric in METRICS:
+                score = _score(row, metric)
+                if score is not None:
+                    out.setdefault((cat, metric), []).append((score, row))
+    return out
+
+
+def materialize(sb, rows: List[Dict[str, Any]]) -> Dict[str, int]:
+    # rows: refreshed videos rows (id, views_numeric, views_delta, views_growth_rate,
+    # views_per_day, category columns) -> merged into the stored top lists
+    stats = { 'lists': 0, 'upserted': 0, 'dropped': 0 }
+    if not rows or not available(sb):
+        return stats
+    if not _has_rows(sb):
+        # first run after the migration: score every video once
+        return rebuild(sb)
+    now_iso = datetime.now(timezone.utc).isoformat()
+    ids = [r['id'] for r in rows]
+    n = keep()
+    with metrics.timed('ranking_materialize', rows=len(rows)):
+        # a refreshed video may have changed category or fallen out: re-rank it from scratch
+        sb.table(TABLE).delete().in_('video_id', ids).execute()
+        for (cat, metric), scored in _lists(rows).items():
+            res = (sb.table(TABLE).select('video_id,score').eq('category', cat).eq('metric', metric)
+                   .order('score', desc=True).limit(n).execute())
+            current = getattr(res, 'data', []) or []
+            merged = [(float(r.get('score') or 0), False, r['video_id']) for r in current]
+            merged += [(score, True, row) for score, row in scored]
+            merged.sort(key=lambda t: t[0], reverse=True)
+            kept, dropped = merged[:n], merged[n:]
+            entries = [_entry(row, cat, metric, score, now_iso) for score, fresh, row in kept if fresh]
+            gone = [ref for _, fresh, ref in dropped if not fresh]
+            if entries:
+                sb.table(TABLE).upsert(entries).execute()
+            if gone:
+                sb.table(TABLE).delete().eq('category', cat).eq('metric', metric).in_('video_id', gone).execute()
+            stats['lists'] += 1
+            stats['upserted'] += len(entries)
+            stats['dropped'] += len(gone)
+    metrics.log('ranking_materialize', **stats)
+    return stats
+
+
+def _has_rows(sb) -> bool:
+    res = sb.table(TABLE).select('video_id').eq('category', ALL).limit(1).execute()
+    return bool(getattr(res, 'data', []) or [])
+
+
+def rebuild(sb) -> Dict[str, int]:
+    # full recompute from the stored videos columns (keyset pages, metric columns only)
+    stats = { 'lists': 0, 'upserted': 0, 'dropped': 0 }
+    if not available(sb):
+        return stats
+    now_iso = datetime.now(timezone.utc).isoformat()
+    n = keep()
+    cols = ['views', 'views_numeric', 'views_prev_numeric', 'views_baseline_numeric',
+            'views_delta', 'views_growth_rate', 'views_per_day', *category_columns()]
+    best: Dict[Tuple[str, str], List[Tuple[float, Dict[str, Any]]]] = {}
+    with metrics.timed('ranking_rebuild'):
+        for page in pagination.iter_pages(sb, 'videos', cols):
+            for row in page:
+                if row.get('views_delta') is None:
+                    # never refreshed since the migration: same numbers the list page shows
+                    views = parse_count(row.get('views_numeric') or row.get('views'))
+                    prev = parse_count(row.get('views_prev_numeric') or row.get('views_baseline_numeric') or row.get('views')) or views
+                    row.update(growth(views, prev))
+                    row['views_numeric'] = views
+            for key, scored in _lists(page).items():
+                merged = best.setdefault(key, [])
+                merged.extend(scored)
+                merged.sort(key=lambda t: t[0], reverse=True)
+                del merged[n:]
+        sb.table(TABLE).delete().in_('metric', list(METRICS)).execute()
+        for (cat, metric), scored in best.items():
+            entries = [_entry(row, cat, metric, score, now_iso) for score, row in scored]
+            for i in range(0, len(entries), 500):
+                sb.table(TABLE).upsert(entries[i:i + 500]).execute()
+            stats['lists'] += 1
+            stats['upserted'] += len(entries)
+    metrics.log('ranking_rebuild', **stats)
+    return stats
@@ -0,0 +1,117 @@
+import os
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import _core as core
+import _metrics as metrics
+import _pagination as pagination
+
+# Velocity-based view refresh scheduling.
+# Every ranking refresh stamps videos.views_next_check_at (epoch ms, like
+# views_last_checked_at) from the growth it just measured and the upload date:
+# fast movers come back within the hour, flat old videos once a week.
+# scope=all ranking jobs then snapshot only the due rows instead of every id,
+# so the YouTube quota goes to the videos whose numbers actually move.
+# Rows never scheduled (NULL: new videos, rows from before the migration) are
+# due first. The snapshot pages through every due row (_pagination), and the
+# cron tick enqueues a ranking job itself whenever rows are due and none is
+# pending or running (REFRESH_AUTO_JOB=0 leaves that to the admin).
+
+COLUMN = 'views_next_check_at'
+
+_HOUR_MS = 3600 * 1000
+_DAY_MS = 24 * _HOUR_MS
+
+# (interval hours, views/day at least, daily growth rate at least, uploaded within days)
+# first tier that matches wins; one condition is enough
+_TIERS = (
+    (1, 10000, 0.05, 2),
+    (6, 1000, 0.01, 14),
+    (24, 100, 0.002, 90),
+)
+
+_DATE_RE = re.compile(r'(\d{4})\D{1,3}(\d{1,2})\D{1,3}(\d{1,2})')
+
+_probe = core.table_probe('videos', f'id,{COLUMN}', 'REFRESH_SCHEDULE')
+
+
+def enabled() -> bool:
+    return _probe.enabled()
+
+
+def max_hours() -> int:
+    # stale videos: once a week by default
+    return max(1, int(os.getenv('REFRESH_MAX_HOURS') or '168'))
+
+
+def auto_job() -> bool:
+    return (os.getenv('REFRESH_AUTO_JOB') or '1').strip().lower() not in ('0', 'false', 'no')
+
+
+def available(sb=None) -> bool:
+    # before the migration ranking jobs refresh every id
+    return _probe(sb)
+
+
+def age_days(date_value: Any, now_ms: int) -> Optional[float]:
+    # videos.date: "2024-05-01", "2024.05.01", ISO timestamps ... -> days since upload
+    m = _DATE_RE.search(str(date_value or ''))
+    if not m:
+        return None
+    try:
+        dt = datetime(int(m.group(1)), int(m.group(2)), int(m.group(3)), tzinfo=timezone.utc)
+    except ValueError:
+        return None
+    return max(0.0, (now_ms - dt.timestamp() * 1000) / _DAY_MS)
+
+
+def interval_hours(row: Dict[str, Any], now_ms: Optional[int] = None) -> int:
+    # row: videos row after the refresh (views_numeric, views_per_day, date)
+    now_ms = now_ms or int(time.time() * 1000)
+    views = float(row.get('views_numeric') or 0)
+    per_day = row.get('views_per_day')
+    age = age_days(row.get('date'), now_ms)
+    for hours, min_per_day, min_rate, max_age in _TIERS:
+        if per_day is not None:
+            if per_day >= min_per_day or (views > 0 and per_day / views >= min_rate):
+                return min(hours, max_hours())
+        if age is not None and age <= max_age:
+            return min(hours, max_hours())
+    if per_day is None:
+        # first measurement: no rate yet, come back soon enough to get one
+        return min(24, max_hours())
+    return max_hours()
+
+
+def next_check(row: Dict[str, Any], now_ms: Optional[int] = None) -> int:
+    now_ms = now_ms or int(time.time() * 1000)
+    return now_ms + interval_hours(row, now_ms) * _HOUR_MS
+
+
+def deferred(now_ms: Optional[int] = None) -> int:
+    # videos the API did not return (deleted/private) or without a YouTube id
+    now_ms = now_ms or int(time.time() * 1000)
+    return now_ms + max_hours() * _HOUR_MS
+
+
+def due_ids(sb, now_ms: Optional[int] = None) -> List[Any]:
+    # every due id (keyset pages): never scheduled first, then the most overdue
+    now_ms = now_ms or int(time.time() * 1000)
+    with metrics.timed('refresh_due'):
+        never = pagination.all_ids(sb, 'videos', lambda q: q.is_(COLUMN, 'null'))
+        overdue = list(pagination.iter_rows(sb, 'videos', ['id', COLUMN], filters=lambda q: q.lte(COLUMN, now_ms)))
+    overdue.sort(key=lambda r: r.get(COLUMN) or 0)
+    out = never + [r['id'] for r in overdue]
+    metrics.log('refresh_due', due=len(out), never_checked=len(never))
+    return out
+
+
+def any_due(sb, now_ms: Optional[int] = None) -> bool:
+    now_ms = now_ms or int(time.time() * 1000)
+    for q in (lambda: sb.table('videos').select('id').is_(COLUMN, 'null'),
+              lambda: sb.table('videos').select('id').lte(COLUMN, now_ms)):
+        if getattr(q().limit(1).execute(), 'data', None):
+            return True
+    return False
@@ -0,0 +1,124 @@
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List
+
+import _core as core
+import _metrics as metrics
+from _llm_parse import CATEGORY_FIELDS
+
+# Server-side keyword search over analysed videos.
+# video_keywords is an inverted index: one (term, video_id) row with a weight,
+# built from keywords_ko/en/zh and the nine category columns. Lookups go
+# through the primary key (term, video_id), so a query costs one index range
+# per term whatever the table size; search_videos() ranks by matched terms,
+# then summed weight.
+# Terms: NFKC + lower case, punctuation/'#' stripped. Latin/digit words are
+# kept whole. Hangul/Han runs are kept whole and also cut into character
+# bigrams, so '경제를' or an unspaced Chinese phrase still match '경제' / '经济'.
+# Rows are rewritten whenever an analysis writes keywords or categories
+# (_analysis_store.write, the async cron path); tools/reindex_search.py
+# backfills everything else.
+
+TABLE = 'video_keywords'
+
+# field -> weight of a whole-token match; bigrams count half
+FIELD_WEIGHTS: Dict[str, float] = {
+    'keywords_ko': 3.0, 'keywords_en': 3.0, 'keywords_zh': 3.0,
+    **{ f: 2.0 for f in CATEGORY_FIELDS },
+}
+FIELDS = tuple(FIELD_WEIGHTS)
+
+MAX_QUERY_TERMS = 32
+
+_CJK = '\u1100-\u11ff\u3130-\u318f\uac00-\ud7af\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'  # Hangul, Han
+_TOKEN_RE = re.compile(rf'[{_CJK}]+|[0-9a-z]+')
+_CJK_RE = re.compile(rf'[{_CJK}]')
+
+_probe = core.table_probe(TABLE, 'video_id', 'SEARCH_INDEX')
+
+
+def enabled() -> bool:
+    return _probe.enabled()
+
+
+def available(sb=None) -> bool:
+    # before the migration nothing is indexed
+    return _probe(sb)
+
+
+def normalize(text: Any) -> str:
+    return unicodedata.normalize('NFKC', str(text or '')).lower()
+
+
+def tokens(text: Any) -> List[str]:
+    # normalised tokens in order, repeats kept
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def terms(text: Any) -> Dict[str, float]:
+    # term -> relative weight (1.0 whole token, 0.5 CJK bigram)
+    out: Dict[str, float] = {}
+    for tok in tokens(text):
+        if _CJK_RE.match(tok):
+            for i in range(len(tok) - 1):
+                out.setdefault(tok[i:i + 2], 0.5)
+        elif len(tok) < 2 and not tok.isdigit():
+            continue
+        out[tok] = 1.0
+    return out
+
+
+def _values(value: Any) -> Iterable[str]:
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value if v]
+    return [str(value)] if value else []
+
+
+def rows(video_id: Any, doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # index rows of one video; a term found in several fields adds up
+    weights: Dict[str, float] = {}
+    for field, w in FIELD_WEIGHTS.items():
+        for value in _values(doc.get(field)):
+            for term, rel in terms(value).items():
+                weights[term] = weights.get(term, 0.0) + w * rel
+    return [{ 'term': t, 'video_id': video_id, 'weight': round(w, 2) } for t, w in weights.items()]
+
+
+def touches(updated: Dict[str, Any]) -> bool:
+    return any(f in updated for f in FIELDS)
+
+
+def index(sb, video_id: Any, doc: Dict[str, Any], chunk: int = 500) -> int:
+    # replaces the video's rows; doc is the full document (all indexed fields)
+    if not available(sb):
+        return 0
+    entries = rows(video_id, doc)
+    with metrics.timed('sb_write', table=TABLE, rows=len(entries)):
+        sb.table(TABLE).delete().eq('video_id', video_id).execute()
+        for i in range(0, len(entries), chunk):
+            sb.table(TABLE).upsert(entries[i:i + chunk]).execute()
+    return len(entries)
+
+
+def refresh(sb, doc: Dict[str, Any], updated: Dict[str, Any]) -> int:
+    # after an analysis write: re-index only when keywords/categories changed
+    if not touches(updated) or not available(sb):
+        return 0
+    return index(sb, doc['id'], { **doc, **updated })
+
+
+def query_terms(q: str) -> List[str]:
+    # whole tokens first, so a long query keeps its words when cut at MAX_QUERY_TERMS
+    found = terms(q)
+    ordered = sorted(found, key=lambda t: -found[t])
+    return ordered[:MAX_QUERY_TERMS]
+
+
+def search(sb, q: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+    # [{ video_id, score, matched }], best first (ranked in search_videos())
+    qt = query_terms(q)
+    if not qt:
+        return []
+    with metrics.timed('search', terms=len(qt)):
+        res = sb.rpc('search_videos', { 'p_terms': qt, 'p_limit': int(limit), 'p_offset': int(offset) }).execute()
+    return getattr(res, 'data', []) or []
@@ -0,0 +1,73 @@
+import re
+from functools import lru_cache
+from typing import List, Tuple
+
+# Shared sentence segmenter for cron_analyze and analyze_one.
+# One finditer pass finds sentence ends; spans point into the original
+# transcript so callers can store offsets instead of sentence copies.
+
+# 문장 끝: 구두점 묶음(… / ... / ?! 등) + 닫는 따옴표, 뒤에 공백이나 끝이 와야 함 (3.5 같은 소수점 제외).
+# 말줄임표(… / ..)는 한글이 바로 붙어도 끝 ('...그리고').
+# 자막 줄 끝의 한국어 종결 어미(다/요/죠/까/네)도 문장 끝으로 본다. 다음 줄이 조사로 시작하면
+# 줄바꿈으로 잘린 단어('바다\n에')라서 끝이 아니다.
+# 구두점 묶음은 첫 글자에서만 시작(앞 글자가 구두점이면 건너뜀): 닫히지 않는 긴 묶음('!!!…"""x')도
+# 위치마다 다시 훑지 않아 선형 시간. 하나의 문자 집합으로 시작해야 re가 후보 위치만 빠르게 훑는다
+_BOUNDARY = re.compile(
+    r'[.?!…다요죠까네]'
+    r'(?:(?<=[.?!…])(?<![.?!…]{2})[.?!…]*["\'”’」』)\]]*(?=\s|$)'
+    r'|(?<=[.…])(?<![.?!…]{2})(?:(?<=…)|(?=\.))[.…]*(?=[\uac00-\ud7a3])'
+    r'|(?<=[다요죠까네])[ \t]*(?=\r?\n(?![ \t]*(?:에서|으로|에게|[은는이가을를에의도와과로만])(?:[ \t.,!?…]|\r?\n|$))))'
+)
+
+# [음악], (박수), <c> 태그, >> 화자 표시, 숫자만 있는 줄(SRT 인덱스)
+_NOISE = re.compile(
+    r'\[[^\]\n]{0,40}\]'
+    r'|\((?:음악|박수|웃음|침묵|배경음|기침|music|applause|laughter)\)'
+    r'|<[^<>\n]{1,40}>'
+    r'|>>'
+    r'|\n[ \t]*\d+[ \t]*(?=\r?\n|$)',
+    re.I,
+)
+_WORD = re.compile(r'\w')
+
+
+def _blank(m) -> str:
+    # 같은 길이의 공백으로 가려서 원문 offset을 유지 (줄바꿈은 남김)
+    return ''.join('\n' if ch == '\n' else ' ' for ch in m.group(0))
+
+
+def clean_sentence(raw: str) -> str:
+    return ' '.join(_NOISE.sub(' ', '\n' + (raw or '')).split())
+
+
+@lru_cache(maxsize=128)
+def _segment(text: str) -> Tuple[Tuple[int, int, str], ...]:
+    # (start, end, cleaned sentence); memoised per transcript
+    masked = _NOISE.sub(_blank, '\n' + text)[1:]
+    out = []
+    start = 0
+    ends = [m.end() for m in _BOUNDARY.finditer(masked)]
+    if not ends or ends[-1] < len(masked):
+        ends.append(len(masked))
+    for stop in ends:
+        if stop <= start:
+            continue
+        seg = masked[start:stop]
+        sent = ' '.join(seg.split())
+        if sent and _WORD.search(sent):
+            # 앞뒤 공백은 span에서 제외
+            a = start + (len(seg) - len(seg.lstrip()))
+            b = start + len(seg.rstrip())
+            out.append((a, b, sent))
+        start = stop
+    return tuple(out)
+
+
+def sentence_spans(text: str) -> List[Tuple[int, int]]:
+    return [(a, b) for a, b, _ in _segment(text or '')]
+
+
+def split_sentences(text: str) -> List[str]:
+    if not text:
+        return []
+    return [s for _, _, s in _segment(text)]
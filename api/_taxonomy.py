@@ -0,0 +1,256 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import _gemini as gemini
+import _metrics as metrics
+import _pagination as pagination
+import _search_index as search_index
+import _token_budget as token_budget
+from _llm_parse import CATEGORY_FIELDS, json_object, parse_categories, parse_keywords
+
+# Categories + search keywords in one call.
+# They used to be two full-transcript calls (nine "label: value" lines, then
+# a {ko, en, zh} JSON). Both only need to know what the video is about, so
+# one JSON-mode call (responseSchema registered with _gemini) now returns all
+# twelve keys from a bounded sample of the transcript (TAXONOMY_INPUT_TOKENS,
+# head/tail anchors plus evenly spaced sentences) instead of tshort.
+# TAXONOMY_MODE=local tries the existing vocabulary first: every distinct
+# category row already in videos is a label, profiled by the terms of its
+# videos' titles, materials and category names (tf-idf over labels, as the
+# keyword index tokenises). A transcript whose sample clearly matches one
+# label (TAXONOMY_MIN_SCORE, TAXONOMY_MIN_MARGIN over the runner-up) takes
+# its categories and locally extracted keywords (one list per script, no
+# translation) without a call; everything else still goes to the LLM.
+
+STAGE = 'taxonomy'
+
+KEYWORD_KEYS = ('ko', 'en', 'zh')
+
+PROMPT = (
+    '아래 "제목"과 "대본 발췌"를 참고하여 영상의 카테고리와 검색 키워드를 JSON 객체 하나로만 출력하세요. '
+    '다른 텍스트/머리말/코드펜스 금지.\n'
+    '{\n'
+    '  "kr_category_large": "한국 대 카테고리", "kr_category_medium": "한국 중 카테고리", "kr_category_small": "한국 소 카테고리",\n'
+    '  "en_category_main": "EN Main Category", "en_category_sub": "EN Sub Category", "en_micro_topic": "EN Micro Topic",\n'
+    '  "cn_category_large": "중국 대 카테고리", "cn_category_medium": "중국 중 카테고리", "cn_category_small": "중국 소 카테고리",\n'
+    '  "ko": ["키워드1", ...], "en": ["keyword1", ...], "zh": ["关键词1", ...]\n'
+    '}\n'
+    '키워드 규칙:\n- 원본 영상을 검색해 찾기 쉬운 핵심 검색 키워드를 언어별 8~15개\n- 각 키워드는 1~4단어의 짧은 구로 작성\n'
+    '- 해시태그/특수문자/따옴표 제거, 불용어 제외\n- 동일 의미/중복 표현은 하나만 유지\n- 인명/채널명/브랜드/핵심 주제 포함\n'
+)
+
+SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        **{ f: { 'type': 'STRING' } for f in CATEGORY_FIELDS },
+        **{ k: { 'type': 'ARRAY', 'items': { 'type': 'STRING' } } for k in KEYWORD_KEYS },
+    },
+    'required': [*CATEGORY_FIELDS, *KEYWORD_KEYS],
+    'propertyOrdering': [*CATEGORY_FIELDS, *KEYWORD_KEYS],
+}
+
+gemini.register_schema(PROMPT, SCHEMA)
+
+# particles cut from unknown Hangul tokens (one-syllable ones only when the rest is a
+# known term: '고양이' stays), and verb endings that never make a keyword ('볼게요')
+_JOSA_LONG = re.compile(r'(에서는|에서|으로|에게|한테|까지|부터|처럼|보다|을|를|은|는)$')
+_JOSA_SHORT = re.compile(r'(이|가|의|에|로|와|과|도|만)$')
+_ENDINGS = re.compile(r'(요|다|죠|까|고|서|면|게|며|니|네)$')
+_HANGUL = re.compile('[\uac00-\ud7a3]')
+_HAN = re.compile('[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+_LATIN_STOP = frozenset('the and that this with for you your are was were have has had not but they them then than there what when just like into from about will would can could'.split())
+
+_vocab: Optional[Dict[str, Any]] = None
+_vocab_at = 0.0
+_vocab_lock = threading.Lock()
+
+
+def mode() -> str:
+    # 'llm' (one combined call) | 'local' (vocabulary first, LLM on low confidence)
+    return 'local' if (os.getenv('TAXONOMY_MODE') or '').strip().lower() == 'local' else 'llm'
+
+
+def input_tokens() -> int:
+    return max(200, int(os.getenv('TAXONOMY_INPUT_TOKENS') or '1500'))
+
+
+def min_score() -> float:
+    return float(os.getenv('TAXONOMY_MIN_SCORE') or '0.3')
+
+
+def min_margin() -> float:
+    return float(os.getenv('TAXONOMY_MIN_MARGIN') or '0.05')
+
+
+def request(doc: Dict[str, Any], transcript: str, sentences: List[str]) -> Tuple[str, str]:
+    # (prompt, content) of the combined stage
+    excerpt = token_budget.fit(transcript, input_tokens(), sentences, 'spread')
+    return PROMPT, f"제목:\n{doc.get('title') or ''}\n\n대본 발췌:\n{excerpt}"
+
+
+def valid(text: str) -> bool:
+    # a JSON answer must be complete (a truncated stream is retried); the nine-line format has no braces
+    if '{' in (text or '') and not json_object(text, partial=False):
+        return False
+    cats = parse_categories(text)
+    return bool(cats.get('kr_category_large') or cats.get('en_category_main'))
+
+
+def parse(text: str) -> Tuple[Dict[str, str], Tuple[List[str], List[str], List[str]]]:
+    # combined answer -> (category fields, (ko, en, zh)); the nine-line format still parses
+    return parse_categories(text), parse_keywords(text)
+
+
+# ---- local classifier ----
+
+def vocab_rows() -> int:
+    return max(100, int(os.getenv('TAXONOMY_VOCAB_ROWS') or '20000'))
+
+
+def vocab_ttl() -> int:
+    return max(60, int(os.getenv('TAXONOMY_VOCAB_TTL') or '3600'))
+
+
+def _min_label_videos() -> int:
+    return max(1, int(os.getenv('TAXONOMY_MIN_LABEL_VIDEOS') or '3'))
+
+
+def _tf(w: float) -> float:
+    # sublinear, bigram-only weights (< 1) kept as they are
+    return 1.0 + math.log(w) if w >= 1 else w
+
+
+def _label_terms(row: Dict[str, Any]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for field, w in (('title', 1.0), ('material', 1.0), *((f, 2.0) for f in CATEGORY_FIELDS)):
+        for term, rel in search_index.terms(row.get(field)).items():
+            out[term] = out.get(term, 0.0) + w * rel
+    return out
+
+
+def _build_vocab(sb) -> Dict[str, Any]:
+    # distinct category rows of analysed videos -> labels with tf-idf term profiles
+    groups: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+    seen = 0
+    for row in pagination.iter_rows(sb, 'videos', ['title', 'material', *CATEGORY_FIELDS]):
+        seen += 1
+        if seen > vocab_rows():
+            break
+        fields = tuple(str(row.get(f) or '').strip() for f in CATEGORY_FIELDS)
+        if not fields[0]:
+            continue
+        g = groups.setdefault(fields, { 'videos': 0, 'terms': {} })
+        g['videos'] += 1
+        for term, w in _label_terms(row).items():
+            g['terms'][term] = g['terms'].get(term, 0.0) + w
+    labels = [(fields, g) for fields, g in groups.items() if g['videos'] >= _min_label_videos()]
+    df: Dict[str, int] = {}
+    for _, g in labels:
+        for term in g['terms']:
+            df[term] = df.get(term, 0) + 1
+    idf = { t: math.log((len(labels) + 1) / (n + 1)) + 1.0 for t, n in df.items() }
+    postings: Dict[str, List[Tuple[int, float]]] = {}
+    out_labels = []
+    for i, (fields, g) in enumerate(labels):
+        vec = { t: _tf(w) * idf[t] for t, w in g['terms'].items() }
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        for t, v in vec.items():
+            postings.setdefault(t, []).append((i, v / norm))
+        out_labels.append({ 'fields': dict(zip(CATEGORY_FIELDS, fields)), 'videos': g['videos'] })
+    metrics.log('taxonomy_vocab', rows=min(seen, vocab_rows()), labels=len(out_labels), terms=len(idf))
+    return { 'labels': out_labels, 'idf': idf, 'postings': postings }
+
+
+def vocabulary(sb) -> Dict[str, Any]:
+    # built once per process and refreshed after TAXONOMY_VOCAB_TTL seconds
+    global _vocab, _vocab_at
+    with _vocab_lock:
+        if _vocab is None or time.time() - _vocab_at > vocab_ttl():
+            with metrics.timed('taxonomy_vocab'):
+                _vocab = _build_vocab(sb)
+            _vocab_at = time.time()
+        return _vocab
+
+
+def classify(vocab: Dict[str, Any], text: str) -> List[Tuple[float, Dict[str, str]]]:
+    # [(cosine, category fields)] best first, at most two
+    idf = vocab['idf']
+    counts: Dict[str, float] = {}
+    for tok in search_index.tokens(text):
+        for term, rel in search_index.terms(tok).items():
+            if term in idf:
+                counts[term] = counts.get(term, 0.0) + rel
+    vec = { t: _tf(c) * idf[t] for t, c in counts.items() }
+    norm = math.sqrt(sum(v * v for v in vec.values()))
+    if not norm:
+        return []
+    scores: Dict[int, float] = {}
+    for t, v in vec.items():
+        for i, w in vocab['postings'].get(t, ()):
+            scores[i] = scores.get(i, 0.0) + v / norm * w
+    best = sorted(scores.items(), key=lambda kv: -kv[1])[:2]
+    return [(s, vocab['labels'][i]['fields']) for i, s in best]
+
+
+def _stem(tok: str, known: Dict[str, float]) -> str:
+    if tok in known or not _HANGUL.match(tok):
+        return tok
+    for pat in (_JOSA_LONG, _JOSA_SHORT):
+        cut = pat.sub('', tok)
+        if cut != tok and len(cut) >= 2 and (pat is _JOSA_LONG or cut in known):
+            return cut
+    return tok
+
+
+def keywords(vocab: Dict[str, Any], title: str, text: str, n: int = 10) -> Dict[str, List[str]]:
+    # { ko, en, zh }: vocabulary terms and repeated (or title) tokens, most distinctive first
+    idf = vocab['idf']
+    default_idf = math.log(len(vocab['labels']) + 1) + 1.0
+    scores: Dict[str, float] = {}
+    seen: Dict[str, float] = {}
+    for weight, source in ((2.0, title), (1.0, text)):
+        for tok in search_index.tokens(source):
+            tok = _stem(tok, idf)
+            if len(tok) < 2 or tok.isdigit() or tok in _LATIN_STOP or (tok.isascii() and len(tok) < 3):
+                continue
+            if tok not in idf and _HANGUL.match(tok) and _ENDINGS.search(tok):
+                continue
+            scores[tok] = scores.get(tok, 0.0) + weight * idf.get(tok, default_idf)
+            seen[tok] = seen.get(tok, 0.0) + weight
+    out: Dict[str, List[str]] = { k: [] for k in KEYWORD_KEYS }
+    for tok in sorted(scores, key=lambda t: -scores[t]):
+        if tok not in idf and seen[tok] < 2:
+            continue
+        key = 'ko' if _HANGUL.match(tok) else 'zh' if _HAN.match(tok) else 'en'
+        if len(out[key]) < n:
+            out[key].append(tok)
+    return out
+
+
+def local(sb, doc: Dict[str, Any], transcript: str, sentences: List[str], force: bool = False) -> Optional[str]:
+    # combined-format answer from the vocabulary, or None when the LLM should decide
+    if sb is None or mode() != 'local':
+        return None
+    try:
+        vocab = vocabulary(sb)
+        excerpt = token_budget.fit(transcript, input_tokens(), sentences, 'spread')
+        title = str(doc.get('title') or '')
+        ranked = classify(vocab, f'{title}\n{excerpt}')
+    except Exception as e:
+        metrics.log('taxonomy_local_failed', id=doc.get('id'), error=str(e)[:200])
+        return None
+    if not ranked:
+        return None
+    score = ranked[0][0]
+    margin = score - (ranked[1][0] if len(ranked) > 1 else 0.0)
+    if not force and (score < min_score() or margin < min_margin()):
+        metrics.count('taxonomy_llm')
+        return None
+    metrics.count('taxonomy_local')
+    metrics.log('taxonomy_local', id=doc.get('id'), score=round(score, 3), margin=round(margin, 3))
+    return json.dumps({ **ranked[0][1], **keywords(vocab, title, excerpt) }, ensure_ascii=False)
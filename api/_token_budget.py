@@ -0,0 +1,221 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import _metrics as metrics
+
+# Token-aware transcript budgeting shared by cron_analyze and analyze_one.
+# Transcripts used to be cut at a fixed character count, which dropped the
+# ending (결) and meant very different token counts for Korean, English and
+# Chinese. fit() samples the whole transcript into a token budget instead;
+# prepare() switches to a summarise-then-analyse pass for very long ones.
+
+# tokens per character by script (Gemini tokenizer, rounded up so budgets hold)
+_SCRIPTS = (
+    (re.compile('[\uac00-\ud7a3\u3131-\u318e]+'), 0.75),  # 한글
+    (re.compile('[\u4e00-\u9fff\u3400-\u4dbf\uf900-\ufaff]+'), 1.0),  # 한자
+    (re.compile('[\u3040-\u30ff]+'), 0.8),  # 가나
+)
+_LATIN_RATE = 0.25
+
+ANCHOR_SENTENCES = 3
+
+SUMMARY_PROMPT = (
+    '다음은 긴 영상 대본의 한 구간입니다. 이 구간에서 일어나는 사건, 등장인물, 핵심 주장, '
+    '감정 변화와 반전을 시간 순서대로 5~8문장으로 요약하세요. 인상적인 대사는 원문 그대로 1~2개 인용하세요. '
+    '요약문만 출력하고 머리말/코드펜스는 쓰지 마세요.'
+)
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    total = 0.0
+    wide = 0
+    for pat, rate in _SCRIPTS:
+        n = sum(map(len, pat.findall(text)))
+        total += n * rate
+        wide += n
+    total += (len(text) - wide) * _LATIN_RATE
+    return int(total) + 1
+
+
+def input_budget() -> int:
+    return max(500, int(os.getenv('ANALYSIS_INPUT_TOKENS') or '9000'))
+
+
+def _pieces(sentences: List[str], limit: int) -> List[str]:
+    # 구두점 없는 자동 자막은 "문장" 하나가 대본 전체일 수 있다: limit 토큰보다 긴 문장은
+    # 글자 단위(가능하면 공백에서)로 잘라 조각으로 다뤄서, 어떤 샘플링이든 예산을 넘지 않게 한다
+    limit = max(1, limit)
+    out: List[str] = []
+    for s in sentences:
+        if estimate_tokens(s) <= limit:
+            out.append(s)
+            continue
+        step = max(1, int(limit * len(s) / estimate_tokens(s)))
+        i = 0
+        while i < len(s):
+            piece = s[i:i + step]
+            while len(piece) > 1 and estimate_tokens(piece) > limit:
+                piece = piece[:int(len(piece) * 0.9)]
+            stop = i + len(piece)
+            space = s.rfind(' ', i + 1, stop) if stop < len(s) else -1
+            if space > i + len(piece) // 2:
+                stop = space
+            if s[i:stop].strip():
+                out.append(s[i:stop].strip())
+            i = stop
+    return out
+
+
+def _take(sentences: List[str], budget: int) -> List[str]:
+    out = []
+    used = 0
+    for s in sentences:
+        t = estimate_tokens(s) + 1
+        if out and used + t > budget:
+            break
+        out.append(s)
+        used += t
+    return out
+
+
+def _cut_chars(text: str, budget: int, from_end: bool = False) -> str:
+    # 문장 정보가 없을 때: 평균 토큰/글자 비율로 글자 수 환산
+    ratio = estimate_tokens(text) / max(1, len(text))
+    n = max(1, int(budget / max(ratio, 0.01)))
+    return text[-n:] if from_end else text[:n]
+
+
+def head_tail(text: str, budget: int, sentences: Optional[List[str]] = None, head_share: float = 0.6) -> str:
+    head_budget = int(budget * head_share)
+    tail_budget = budget - head_budget
+    if not sentences:
+        return _cut_chars(text, head_budget) + '\n…\n' + _cut_chars(text, tail_budget, from_end=True)
+    sentences = _pieces(sentences, max(1, budget // 8))
+    head = _take(sentences, head_budget)
+    tail = _take(sentences[len(head):][::-1], tail_budget)[::-1]
+    if len(head) + len(tail) >= len(sentences):
+        return ' '.join(sentences)
+    return ' '.join(head) + '\n…\n' + ' '.join(tail)
+
+
+def spread(sentences: List[str], budget: int, anchor: int = ANCHOR_SENTENCES) -> str:
+    # 도입부/결말부 anchor 문장은 그대로 두고, 가운데는 고르게 간격을 두고 뽑는다
+    sentences = _pieces(sentences, max(1, budget // (4 * anchor)))
+    n = len(sentences)
+    if n <= 2 * anchor:
+        return ' '.join(_take(sentences, budget))
+    cost = [estimate_tokens(s) + 1 for s in sentences]
+    keep = set(range(anchor)) | set(range(n - anchor, n))
+    left = budget - sum(cost[i] for i in keep)
+    middle = list(range(anchor, n - anchor))
+    if left > 0 and middle:
+        avg = sum(cost[i] for i in middle) / len(middle)
+        k = min(len(middle), max(1, int(left / max(avg, 1))))
+        step = len(middle) / k
+        for j in range(k):
+            i = middle[int(j * step)]
+            if cost[i] <= left:
+                keep.add(i)
+                left -= cost[i]
+    out = []
+    prev = -1
+    for i in sorted(keep):
+        if prev >= 0 and i != prev + 1:
+            out.append('…')
+        out.append(sentences[i])
+        prev = i
+    return ' '.join(out)
+
+
+def fit(text: str, budget: int, sentences: Optional[List[str]] = None, strategy: Optional[str] = None) -> str:
+    # text unchanged when it fits; otherwise head+tail or evenly spaced sentences
+    text = text or ''
+    if estimate_tokens(text) <= budget:
+        return text
+    strategy = (strategy or os.getenv('TRANSCRIPT_SAMPLING') or 'auto').strip().lower()
+    if strategy == 'auto':
+        strategy = 'spread' if sentences and len(sentences) >= 20 else 'head_tail'
+    if strategy == 'spread' and sentences:
+        return spread(sentences, budget)
+    return head_tail(text, budget, sentences)
+
+
+def chunks(sentences: List[str], budget: int) -> List[str]:
+    out: List[str] = []
+    cur: List[str] = []
+    used = 0
+    for s in _pieces(sentences, budget):
+        t = estimate_tokens(s) + 1
+        if cur and used + t > budget:
+            out.append(' '.join(cur))
+            cur, used = [], 0
+        cur.append(s)
+        used += t
+    if cur:
+        out.append(' '.join(cur))
+    return out
+
+
+def _chunk_budget() -> int:
+    return max(1000, int(os.getenv('TRANSCRIPT_CHUNK_TOKENS') or '6000'))
+
+
+def _digest(sentences: List[str], summaries: List[str], budget: int) -> str:
+    # 원문 도입부 + 구간별 요약 + 원문 결말부 (후킹/결 분석은 원문이 필요)
+    head = ' '.join(sentences[:ANCHOR_SENTENCES])
+    tail = ' '.join(sentences[-ANCHOR_SENTENCES:])
+    body = '\n'.join(f'[{i + 1}/{len(summaries)}] {s.strip()}' for i, s in enumerate(summaries))
+    digest = f'도입부 원문:\n{head}\n\n구간별 요약:\n{body}\n\n결말부 원문:\n{tail}'
+    return fit(digest, budget, strategy='head_tail')
+
+
+def map_reduce(sentences: List[str], budget: int, call: Callable[[str, str], str], workers: int = 0) -> str:
+    parts = chunks(sentences, _chunk_budget())
+    per_chunk = max(200, budget // max(1, len(parts)))
+
+    def summarize(part: str) -> str:
+        try:
+            return (call(SUMMARY_PROMPT, part) or '').strip() or fit(part, per_chunk)
+        except Exception:
+            # 요약 실패 구간은 샘플링으로 대체
+            return fit(part, per_chunk)
+
+    workers = workers or max(1, min(len(parts), int(os.getenv('TRANSCRIPT_MAP_WORKERS') or '8')))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        summaries = list(ex.map(metrics.bind(summarize), parts))
+    return _digest(sentences, summaries, budget)
+
+
+async def map_reduce_async(sentences: List[str], budget: int, call) -> str:
+    import asyncio
+    parts = chunks(sentences, _chunk_budget())
+    per_chunk = max(200, budget // max(1, len(parts)))
+
+    async def summarize(part: str) -> str:
+        try:
+            return (await call(SUMMARY_PROMPT, part) or '').strip() or fit(part, per_chunk)
+        except Exception:
+            return fit(part, per_chunk)
+
+    summaries = await asyncio.gather(*(summarize(p) for p in parts))
+    return _digest(sentences, list(summaries), budget)
+
+
+def needs_map_reduce(text: str) -> bool:
+    threshold = int(os.getenv('TRANSCRIPT_MAPREDUCE_TOKENS') or '24000')
+    return threshold > 0 and estimate_tokens(text) > threshold
+
+
+def prepare(text: str, sentences: List[str], budget: Optional[int] = None,
+            call: Optional[Callable[[str, str], str]] = None) -> str:
+    # analysis input within budget: as is, sampled, or (very long + call given) map-reduced
+    budget = budget or input_budget()
+    if estimate_tokens(text) <= budget:
+        return text
+    if call is not None and sentences and needs_map_reduce(text):
+        return map_reduce(sentences, budget, call)
+    return fit(text, budget, sentences)
@@ -0,0 +1,124 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import _core as core
+import _metrics as metrics
+
+# Append-only view-count history: one (video_id, ts, views) point per video
+# per hour, written in bulk by each ranking batch. videos only keeps the last
+# two values (views_prev_numeric / views_numeric); this keeps the curve, so a
+# Short taking off shows up within hours.
+# Storage stays bounded by downsampling in the database
+# (rollup_view_snapshots): hourly points older than SNAPSHOT_HOURLY_DAYS keep
+# the last point of each day, daily points older than SNAPSHOT_DAILY_DAYS the
+# last point of each week. grain records which level a row is at.
+
+TABLE = 'video_view_snapshots'
+
+_HOUR = timedelta(hours=1)
+
+_probe = core.table_probe(TABLE, 'video_id', 'VIEW_SNAPSHOTS')
+
+
+def enabled() -> bool:
+    return _probe.enabled()
+
+
+def available(sb=None) -> bool:
+    # before the migration nothing is recorded
+    return _probe(sb)
+
+
+def _hour(ts_ms: int) -> str:
+    # points are bucketed per hour: a second refresh within the hour replaces the first
+    dt = datetime.fromtimestamp(ts_ms / 1000, timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return dt.isoformat()
+
+
+def record(sb, points: Iterable[Tuple[Any, int]], ts_ms: int, chunk: int = 500) -> int:
+    # points: (video_id, views) from one ranking batch -> bulk upsert, one request per chunk
+    if not available(sb):
+        return 0
+    ts = _hour(ts_ms)
+    rows = [{ 'video_id': vid, 'ts': ts, 'views': int(views), 'grain': 'h' } for vid, views in points]
+    with metrics.timed('sb_write', table=TABLE, rows=len(rows)):
+        for i in range(0, len(rows), chunk):
+            sb.table(TABLE).upsert(rows[i:i + chunk]).execute()
+    return len(rows)
+
+
+def rollup(sb) -> int:
+    # hourly -> daily -> weekly in the database; returns the number of points removed
+    if not available(sb):
+        return 0
+    params = {
+        'p_hourly_days': int(os.getenv('SNAPSHOT_HOURLY_DAYS') or '7'),
+        'p_daily_days': int(os.getenv('SNAPSHOT_DAILY_DAYS') or '90'),
+    }
+    with metrics.timed('view_snapshots_rollup'):
+        res = sb.rpc('rollup_view_snapshots', params).execute()
+    removed = getattr(res, 'data', 0)
+    metrics.log('view_snapshots_rollup', removed=removed)
+    return int(removed or 0) if isinstance(removed, (int, float, str)) else 0
+
+
+def _parse_ts(v: Any) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(str(v).replace('Z', '+00:00'))
+    except Exception:
+        return None
+
+
+def window_growth(sb, ids: List[Any], hours: float, now: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+    # rolling growth over the last `hours` per video:
+    # { id: { views, views_then, delta, rate, per_hour, ts, ts_then } }
+    # views_then is the last point at or before the window start (the window
+    # may reach into daily/weekly points); videos without one are left out.
+    if not ids or not available(sb):
+        return {}
+    now = now or datetime.now(timezone.utc)
+    start = now - timedelta(hours=hours)
+    # one point before the window start is enough: how far back depends on the grain there
+    age_days = hours / 24
+    if age_days < int(os.getenv('SNAPSHOT_HOURLY_DAYS') or '7'):
+        slack = timedelta(hours=2)
+    elif age_days < int(os.getenv('SNAPSHOT_DAILY_DAYS') or '90'):
+        slack = timedelta(days=2)
+    else:
+        slack = timedelta(days=8)
+    since = (start - slack).isoformat()
+    # ids per request so one response stays under PostgREST's max-rows (hourly points, worst case)
+    per_id = int(hours + slack / _HOUR) + 1
+    step = max(1, 1000 // per_id)
+    series: Dict[str, List[Tuple[datetime, int]]] = {}
+    for i in range(0, len(ids), step):
+        res = (sb.table(TABLE).select('video_id,ts,views').in_('video_id', ids[i:i + step])
+               .gte('ts', since).order('ts').limit(1000).execute())
+        for r in getattr(res, 'data', []) or []:
+            ts = _parse_ts(r.get('ts'))
+            if ts is not None:
+                series.setdefault(str(r.get('video_id')), []).append((ts, int(r.get('views') or 0)))
+    out: Dict[str, Dict[str, Any]] = {}
+    for vid, points in series.items():
+        points.sort()
+        before = [p for p in points if p[0] <= start]
+        if not before or points[-1][0] <= start:
+            continue
+        (ts0, v0), (ts1, v1) = before[-1], points[-1]
+        hours_ = max((ts1 - ts0) / _HOUR, 1.0)
+        out[vid] = {
+            'views': v1, 'views_then': v0, 'delta': v1 - v0,
+            'rate': round((v1 - v0) / v0, 6) if v0 else None,
+            'per_hour': round((v1 - v0) / hours_, 2),
+            'ts': ts1.isoformat(), 'ts_then': ts0.isoformat(),
+        }
+    return out
+
+
+def breakouts(sb, hours: int = 6, limit: int = 50, metric: str = 'per_hour') -> List[Dict[str, Any]]:
+    # fastest growing videos over the window, ranked in the database (view_growth_window)
+    if not available(sb):
+        return []
+    res = sb.rpc('view_growth_window', { 'p_hours': int(hours), 'p_limit': int(limit), 'p_metric': metric }).execute()
+    return getattr(res, 'data', []) or []
@@ -1,109 +1,77 @@
 import os
 import json
 import time
-from typing import List, Dict, Any, Tuple
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Tuple
 
 from flask import Flask, jsonify, request
 import requests
 
-try:
-    from supabase import create_client, Client
-except Exception:
-    create_client = None
-    Client = None
-
-try:
-    from youtube_transcript_api import (
-        YouTubeTranscriptApi,
-        TranscriptsDisabled,
-        NoTranscriptFound,
-        VideoUnavailable,
-    )
-except Exception:
-    YouTubeTranscriptApi = None
+import _admission as admission
+import _analysis_store as analysis_store
+import _batch as batch
+import _core as core
+import _dedup as dedup
+import _embeddings as embeddings
+import _gemini as gemini
+import _incremental as incremental
+import _metrics as metrics
+import _pagination as pagination
+import _ranking as ranking
+import _refresh_schedule as refresh_schedule
+import _taxonomy as taxonomy
+import _token_budget as token_budget
+import _view_history as view_history
+from _dopamine import local_graph, resolve_mode
+from _sentences import split_sentences
+from _llm_parse import (
+    MATERIAL_KEYS, MATERIAL_LINE, extract_line, is_md_table, json_array, material_json_ok,
+    CATEGORY_FIELDS, parse_categories, parse_keywords, parse_material,
+)
 
 
-app = Flask(__name__)
+app = core.cors(Flask(__name__), 'GET, POST, OPTIONS')
 
+# supabase / httpx / youtube_transcript_api are imported on first use (_core.optional)
+_load_sb = core.load_sb
 
-@app.after_request
-def add_cors_headers(resp):
-    try:
-        resp.headers['Access-Control-Allow-Origin'] = '*'
-        resp.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-        resp.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-    except Exception:
-        pass
-    return resp
 
+def _httpx():
+    # asyncio path only
+    return core.optional('httpx')
 
-def _load_sb() -> "Client":
-    if create_client is None:
-        raise RuntimeError('supabase client not available')
-    url = os.getenv('SUPABASE_URL')
-    key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-    if not url or not key:
-        raise RuntimeError('Missing SUPABASE_URL or SUPABASE_*_KEY env')
-    return create_client(url, key)
-
-
-def _call_gemini(system_prompt: str, user_content: str) -> str:
-    api_key = os.getenv('GEMINI_API_KEY')
-    if not api_key:
-        raise RuntimeError('GEMINI_API_KEY not set')
-    prefer = os.getenv('GEMINI_MODEL')
-    candidates = [
-        *( [prefer] if prefer else [] ),
-        'models/gemini-2.5-flash',
-        'models/gemini-2.0-flash-exp',
-        'models/gemini-1.5-flash-latest',
-        'models/gemini-1.5-pro-latest',
-    ]
-    payload = {
-        'contents': [
-            { 'role': 'user', 'parts': [{ 'text': f"{system_prompt}\n\n{user_content}" }] }
-        ],
-        'generationConfig': { 'temperature': 0.3 }
-    }
-    base = 'https://generativelanguage.googleapis.com'
-    errors = []
-    for api_ver in ('v1', 'v1beta'):
-        for model in candidates:
-            if not model:
-                continue
-            url = f"{base}/{api_ver}/{model}:generateContent?key={api_key}"
-            try:
-                res = requests.post(url, json=payload, timeout=180)
-                if res.status_code == 404:
-                    errors.append(f"{api_ver}/{model}:404")
-                    continue
-                res.raise_for_status()
-                data = res.json()
-                text = data.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
-                if text:
-                    return text
-            except Exception as e:
-                errors.append(f"{api_ver}/{model}:{str(e)[:80]}")
-                continue
-    raise RuntimeError('Gemini request failed: ' + '; '.join(errors))
 
+def _transcript_api():
+    return getattr(core.optional('youtube_transcript_api'), 'YouTubeTranscriptApi', None)
 
-def _build_category_prompt() -> str:
-    return (
-        '다음 대본을 기반으로 카테고리를 아래 형식으로만 한 줄씩 정확히 출력하세요. 다른 텍스트/머리말/설명 금지.\n'
-        '한국 대 카테고리: \n한국 중 카테고리: \n한국 소 카테고리: \n'
-        'EN Main Category: \nEN Sub Category: \nEN Micro Topic: \n'
-        '중국 대 카테고리: \n중국 중 카테고리: \n중국 소 카테고리: '
-    )
 
+# Gemini key pool and client live in _gemini (shared with analyze_one)
+_gemini_keys = gemini.keys
+_next_gemini_key = gemini.next_key
+_llm_inflight_cap = gemini.inflight_cap
+_llm_slots_sem = gemini.slots
+
+
+def _video_concurrency() -> int:
+    explicit = int(os.getenv('ANALYSIS_VIDEO_CONCURRENCY') or '0')
+    if explicit > 0:
+        return explicit
+    return max(1, min(16, len(_gemini_keys())))
+
+
+def _invocation_budget() -> float:
+    # one deadline per cron_analyze call, under the function's maxDuration (300s in vercel.json)
+    return float(os.getenv('CRON_TIME_BUDGET') or '280')
+
+
+def _batch_reserve() -> float:
+    # time a new analysis batch must still have: one Gemini call, its bulk admission wait, and a margin
+    return gemini.CALL_TIMEOUT + admission.max_wait() + float(os.getenv('CRON_BATCH_MARGIN_SEC') or '15')
 
-def _build_keywords_prompt() -> str:
-    return (
-        '아래 제공된 "제목"과 "대본"을 모두 참고하여, 원본 영상을 검색해 찾기 쉬운 핵심 검색 키워드를 한국어/영어/중국어로 각각 8~15개씩 추출하세요.\n'
-        '출력 형식은 JSON 객체만, 다른 설명/머리말/코드펜스 금지.\n'
-        '요구 형식: {"ko":["키워드1","키워드2",...],"en":["keyword1",...],"zh":["关键词1",...]}\n'
-        '규칙:\n- 각 키워드는 1~4단어의 짧은 구로 작성\n- 해시태그/특수문자/따옴표 제거, 불용어 제외\n- 동일 의미/중복 표현은 하나만 유지\n- 인명/채널명/브랜드/핵심 주제 포함\n'
-    )
+
+def _call_gemini(system_prompt: str, user_content: str, cache=None) -> str:
+    return gemini.generate(system_prompt, user_content, cache=cache)
 
 
 def _persona() -> str:
@@ -149,26 +117,15 @@ def _build_dopamine_prompt(sentences: List[str]) -> str:
     return header + '\n\n문장 배열:\n' + json.dumps(sentences, ensure_ascii=False)
 
 def _is_md_table(text: str) -> bool:
-    t = (text or '').strip()
-    return '|' in t and '\n' in t and t.count('|') >= 6
+    return is_md_table(text)
 
 def _looks_like_structure_table(text: str) -> bool:
     t = (text or '').lower()
     return ('| 기' in t) and ('| 승' in t) and ('| 전' in t) and ('| 결' in t)
 
 def _material_json_ok(text: str) -> bool:
-    try:
-        obj = json.loads(text)
-        return (
-            isinstance(obj, dict) and
-            isinstance(obj.get('main_idea', ''), str) and
-            isinstance(obj.get('core_materials', []), list) and
-            isinstance(obj.get('lang_patterns', []), list) and
-            isinstance(obj.get('emotion_points', []), list) and
-            isinstance(obj.get('info_delivery', []), list)
-        )
-    except Exception:
-        return False
+    # 코드펜스/앞뒤 설명이 붙어도 JSON 객체만 맞으면 통과 (불필요한 재시도 방지)
+    return material_json_ok(text)
 
 
 def _build_analysis_prompt() -> str:
@@ -179,88 +136,17 @@ def _build_analysis_prompt() -> str:
 
 
 def _split_sentences(text: str) -> List[str]:
-    if not text:
-        return []
-    normalized = text.replace('\r', '\n')
-    while '\n\n' in normalized:
-        normalized = normalized.replace('\n\n', '\n')
-    normalized = normalized.replace('>>', ' ')
-    lines = [l.strip() for l in normalized.split('\n') if l.strip() and not l.strip().isdigit()]
-    joined = '\n'.join(lines)
-    joined = joined.replace('\n', ' ')
-    # naive split by punctuation
-    out = []
-    buff = ''
-    for ch in joined:
-        buff += ch
-        if ch in '.?!…':
-            if buff.strip():
-                out.append(buff.strip())
-            buff = ''
-    if buff.strip():
-        out.append(buff.strip())
-    return out
-
-
-def _safe_json_arr(text: str) -> List[Dict[str, Any]]:
-    try:
-        return json.loads(text)
-    except Exception:
-        m = None
-        try:
-            import re
-            m = re.search(r"\[([\s\S]*?)\]", text)
-        except Exception:
-            m = None
-        if m:
-            try:
-                return json.loads('[' + m.group(1) + ']')
-            except Exception:
-                return []
-        return []
+    # 공용 분할기 (analyze_one과 동일한 문장 집합, 대본별 memoise)
+    return split_sentences(text)
 
 
-def _parse_keywords(text: str) -> Tuple[List[str], List[str], List[str]]:
-    def sanitize(payload: str) -> str:
-        payload = payload.strip()
-        if payload.startswith('```'):
-            payload = payload.strip('`').strip()
-        return payload
-    def norm(arr) -> List[str]:
-        if isinstance(arr, list):
-            items = arr
-        elif isinstance(arr, str):
-            items = [x.strip() for x in arr.split(',')]
-        else:
-            items = []
-        seen = set()
-        out = []
-        for it in items:
-            s = str(getattr(it, 'keyword', it)).strip().strip('#"\'')
-            if not s:
-                continue
-            key = s.lower()
-            if key in seen:
-                continue
-            seen.add(key)
-            out.append(s)
-        return out[:20]
-    try:
-        payload = sanitize(text)
-        data = json.loads(payload)
-    except Exception:
-        try:
-            m = json.loads(text[text.index('{'): text.rindex('}') + 1])
-            data = m
-        except Exception:
-            data = {}
-    return (
-        norm(data.get('ko')), norm(data.get('en')), norm(data.get('zh') or data.get('cn'))
-    )
+def _safe_json_arr(text: str) -> List[Any]:
+    return json_array(text)
 
 
 def _fetch_transcript(video_url: str, preferred_langs: List[str]) -> str:
-    if YouTubeTranscriptApi is None:
+    api_cls = _transcript_api()
+    if api_cls is None:
         return ''
     vid = None
     try:
@@ -276,7 +162,7 @@ def _fetch_transcript(video_url: str, preferred_langs: List[str]) -> str:
         vid = None
     if not vid:
         vid = video_url
-    api = YouTubeTranscriptApi()
+    api = api_cls()
     # Try preferred languages first
     fetched = None
     for lang in preferred_langs:
@@ -284,9 +170,8 @@ def _fetch_transcript(video_url: str, preferred_langs: List[str]) -> str:
             fetched = api.fetch(vid, languages=[lang])
             if fetched:
                 break
-        except (NoTranscriptFound, TranscriptsDisabled, VideoUnavailable):
-            continue
         except Exception:
+            # NoTranscriptFound / TranscriptsDisabled / VideoUnavailable / blocked
             continue
     if not fetched:
         try:
@@ -297,89 +182,142 @@ def _fetch_transcript(video_url: str, preferred_langs: List[str]) -> str:
     return text
 
 
-def _analyze_video(doc: Dict[str, Any]) -> Dict[str, Any]:
-    # Hard skip when transcript is known unavailable
-    if doc.get('transcript_unavailable') is True:
-        return {}
-    youtube_url = doc.get('youtube_url')
-    if not youtube_url:
-        return {}
+def _first_sents_for_hook(txt: str, sentences: List[str] = None) -> str:
+    # Hook 요약 정확도를 위해 시작 2~3문장만 사용
+    sents = (sentences if sentences is not None else _split_sentences(txt))[:3]
+    joined = ' '.join(sents)[:800]
+    return joined or txt[:1200]
+
+
+def _transcript_for(doc: Dict[str, Any]) -> str:
     # 우선 DB에 저장된 대본을 사용하고, 없을 때만 원격 자막/자동생성 자막을 시도
     transcript = str(doc.get('transcript_text') or '').strip()
     if not transcript:
-        transcript = _fetch_transcript(youtube_url, ['ko', 'en'])
-    sentences = _split_sentences(transcript)
-    # Material/Hooking/Structure in parallel
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    max_chars = int(os.getenv('GEMINI_MAX_CHARS') or '12000')
-    tshort = transcript if len(transcript) <= max_chars else transcript[:max_chars]
-    # Hook 요약 정확도를 위해 시작 2~3문장만 사용
-    def _first_sents_for_hook(txt: str) -> str:
-        sents = _split_sentences(txt)[:3]
-        joined = ' '.join(sents)[:800]
-        return joined or txt[:1200]
-    # Strict LLM calls with validation (no local fallbacks)
-    material_only = ''
-    hooking_text = ''
-    structure_text = ''
-    with ThreadPoolExecutor(max_workers=3) as ex:
-        def call_strict(prompt, content, validator, tries=3):
-            last = ''
-            for _ in range(max(1, tries)):
-                last = (_call_gemini(prompt, content) or '').strip()
-                if validator(last):
-                    break
-                time.sleep(0.3)
-            return last
-        futs = {
-            'material': ex.submit(call_strict, _build_material_prompt(), tshort, _material_json_ok, 3),
-            # 형식을 강제하지 않고 비어있지만 않으면 저장
-            'hooking': ex.submit(call_strict, _build_hooking_prompt(), _first_sents_for_hook(tshort), lambda s: bool((s or '').strip()), 2),
-            'structure': ex.submit(call_strict, _build_structure_prompt(), tshort, lambda s: bool((s or '').strip()), 2)
-        }
-        for k, f in futs.items():
-            try:
-                val = (f.result() or '').strip()
-            except Exception:
-                val = ''
-            if k == 'material': material_only = val
-            elif k == 'hooking': hooking_text = val
-            else: structure_text = val
-    # Analysis(카드/세부)
-    analysis_text = _call_gemini(_build_analysis_prompt(), tshort)
-    # Categories
-    categories_text = _call_gemini(_build_category_prompt(), transcript)
-    # Keywords
-    keywords_text = _call_gemini(_build_keywords_prompt(), f"제목:\n{doc.get('title','')}\n\n대본:\n{transcript}")
-    # Dopamine (batch into chunks of 50, fewer calls)
-    dopamine_graph: List[Dict[str, Any]] = []
-    batch = 50
-    for i in range(0, len(sentences), batch):
-        sub = sentences[i:i+batch]
-        text = _call_gemini(_build_dopamine_prompt(sub), '')
-        arr = _safe_json_arr(text)
-        for item in arr:
-            s = str(item.get('sentence') or item.get('text') or '')
-            try:
-                level = int(round(float(item.get('level') or item.get('score') or 0)))
-            except Exception:
-                # varied fallback
-                raw = str(s)
-                base = 5
-                if any(k in raw for k in ['?', '!']): base += 1
-                if any(ch.isdigit() for ch in raw): base += 1
-                level = max(1, min(10, base))
-            dopamine_graph.append({ 'sentence': s, 'level': level, 'reason': str(item.get('reason') or '') })
-        # reduced rate delay
-        time.sleep(0.05)
-
-    # Post processing
-    def _extract_line(regex: str, text: str) -> str:
-        import re
-        m = re.search(regex, text, re.I)
-        if not m:
-            return ''
-        return (m.group(1) if m.groups() else m.group(0)).strip()
+        with metrics.timed('transcript_fetch'):
+            transcript = _fetch_transcript(doc.get('youtube_url'), ['ko', 'en'])
+    return transcript
+
+
+def _shorten(transcript: str, sentences: List[str]) -> str:
+    # ANALYSIS_INPUT_TOKENS 안에 맞춘 분석 입력 (아주 긴 대본은 구간 요약 후 분석)
+    with metrics.timed('stage.input'):
+        return token_budget.prepare(transcript, sentences, call=_call_gemini)
+
+
+async def _shorten_async(transcript: str, sentences: List[str], client, llm_sem) -> str:
+    with metrics.timed('stage.input'):
+        if token_budget.estimate_tokens(transcript) > token_budget.input_budget() and token_budget.needs_map_reduce(transcript):
+            return await token_budget.map_reduce_async(
+                sentences, token_budget.input_budget(),
+                lambda prompt, content: _call_gemini_async(client, llm_sem, prompt, content),
+            )
+        return token_budget.prepare(transcript, sentences)
+
+
+def _nonempty(s: str) -> bool:
+    return bool((s or '').strip())
+
+
+def _one_line_ok(s: str) -> bool:
+    s = (s or '').strip()
+    return bool(s) and ('\n' not in s) and len(s) <= 200
+
+
+def _stage_requests(doc: Dict[str, Any], transcript: str, tshort: str, sentences: List[str]) -> Dict[str, Tuple[str, str]]:
+    # stage -> (prompt, content) for every single-shot LLM stage of _analyze_video
+    return {
+        'material': (_build_material_prompt(), tshort),
+        'hooking': (_build_hooking_prompt(), _first_sents_for_hook(tshort, sentences)),
+        'structure': (_build_structure_prompt(), tshort),
+        'analysis': (_build_analysis_prompt(), tshort),
+        # 카테고리+키워드: JSON 한 번, 대본 전체 대신 제한된 발췌
+        taxonomy.STAGE: taxonomy.request(doc, transcript, sentences),
+    }
+
+
+# stage -> (validator, tries, stream kind); stages not listed are single plain calls.
+# kind 'json' lets the streaming client drop a prose answer after its first line.
+_STRICT_STAGES = {
+    'material': (_material_json_ok, 3, 'json'),
+    # 형식을 강제하지 않고 비어있지만 않으면 저장
+    'hooking': (_nonempty, 2, 'text'),
+    'structure': (_nonempty, 2, 'text'),
+    taxonomy.STAGE: (taxonomy.valid, 2, 'json'),
+}
+
+# columns of a finished document-level pass; an empty (or failed) one makes an incremental run redo the pass
+_DOC_FIELDS = (*incremental.DOC_FIELDS, 'analysis_full', 'kr_category_large', 'keywords_ko', 'material_main_idea',
+               'material_core_materials', 'material_lang_patterns', 'material_emotion_points', 'material_info_delivery')
+
+# second-pass prompts for material sections the first response did not contain
+_MATERIAL_FOLLOWUPS = {
+    'main_idea': _persona() + '\n\n메인 아이디어만 1문장으로 출력. 다른 텍스트 금지.',
+    'core_materials': _persona() + '\n\n핵심 소재만 JSON 배열로 3~7개 출력. 다른 텍스트 금지.',
+    'lang_patterns': _persona() + '\n\n반복되는 언어 패턴만 JSON 배열로 3~6개 출력. 다른 텍스트 금지.',
+    'emotion_points': _persona() + '\n\n감정 몰입 포인트만 JSON 배열로 3~6개 출력. 다른 텍스트 금지.',
+    'info_delivery': _persona() + '\n\n정보 전달 방식 특징만 JSON 배열로 3~6개 출력. 다른 텍스트 금지.',
+}
+
+
+def _approx_tokens(text: str) -> int:
+    return token_budget.estimate_tokens(text)
+
+
+def _dopamine_batches(sentences: List[str]) -> List[List[str]]:
+    # 응답이 문장을 그대로 되돌려주므로 입력 토큰 예산으로 배치 크기를 정한다
+    budget = max(100, int(os.getenv('DOPAMINE_BATCH_TOKENS') or '1200'))
+    max_n = max(1, int(os.getenv('DOPAMINE_BATCH_MAX') or '50'))
+    batches: List[List[str]] = []
+    cur: List[str] = []
+    used = 0
+    for s in sentences:
+        t = _approx_tokens(s) + 2
+        if cur and (used + t > budget or len(cur) >= max_n):
+            batches.append(cur)
+            cur, used = [], 0
+        cur.append(s)
+        used += t
+    if cur:
+        batches.append(cur)
+    return batches
+
+
+def _dopamine_items(text: str) -> List[Dict[str, Any]]:
+    out = []
+    for item in _safe_json_arr(text):
+        if not isinstance(item, dict):
+            continue
+        s = str(item.get('sentence') or item.get('text') or '')
+        raw = item.get('level', item.get('score'))
+        try:
+            # 숫자 점수가 없는 항목(잘린 응답 등)은 버리고, 범위는 analyze_one과 같이 1~10
+            level = max(1, min(10, int(round(float(raw)))))
+        except (TypeError, ValueError, OverflowError):
+            continue
+        out.append({ 'sentence': s, 'level': level, 'reason': str(item.get('reason') or '') })
+    return out
+
+
+def _section_fields(sections: Dict[str, Any]) -> Dict[str, Any]:
+    # parsed material sections -> material_* columns
+    out: Dict[str, Any] = {}
+    mi = sections.get('main_idea')
+    core, lang, emo, info = (sections.get(k) for k in MATERIAL_KEYS[1:])
+    if mi: out['material_main_idea'] = str(mi)[:1000]
+    if core: out['material_core_materials'] = [str(x) for x in core][:12]
+    if lang: out['material_lang_patterns'] = [str(x) for x in lang][:12]
+    if emo: out['material_emotion_points'] = [str(x) for x in emo][:12]
+    if info: out['material_info_delivery'] = [str(x) for x in info][:12]
+    return out
+
+
+def _build_update(doc: Dict[str, Any], transcript: str, sentences: List[str], texts: Dict[str, str],
+                  dopamine_graph: List[Dict[str, Any]], sections: Dict[str, Any]) -> Dict[str, Any]:
+    # Post processing (no LLM calls): stage outputs -> videos row patch
+    analysis_text = texts.get('analysis') or ''
+    material_only = texts.get('material') or ''
+    hooking_text = texts.get('hooking') or ''
+    structure_text = texts.get('structure') or ''
 
     updated = {}
     updated['analysis_full'] = analysis_text
@@ -392,19 +330,22 @@ def _analyze_video(doc: Dict[str, Any]) -> Dict[str, Any]:
     if structure_text:
         updated['narrative_structure'] = structure_text.strip()[:2000]
 
-    # categories
-    updated['kr_category_large'] = _extract_line(r"한국\s*대\s*카테고리\s*[:：]\s*(.+)", categories_text) or doc.get('kr_category_large')
-    updated['kr_category_medium'] = _extract_line(r"한국\s*중\s*카테고리\s*[:：]\s*(.+)", categories_text) or doc.get('kr_category_medium')
-    updated['kr_category_small'] = _extract_line(r"한국\s*소\s*카테고리\s*[:：]\s*(.+)", categories_text) or doc.get('kr_category_small')
-    updated['en_category_main'] = _extract_line(r"EN\s*Main\s*Category\s*[:：]\s*(.+)", categories_text) or doc.get('en_category_main')
-    updated['en_category_sub'] = _extract_line(r"EN\s*Sub\s*Category\s*[:：]\s*(.+)", categories_text) or doc.get('en_category_sub')
-    updated['en_micro_topic'] = _extract_line(r"EN\s*Micro\s*Topic\s*[:：]\s*(.+)", categories_text) or doc.get('en_micro_topic')
-    updated['cn_category_large'] = _extract_line(r"중국\s*대\s*카테고리\s*[:：]\s*(.+)", categories_text) or doc.get('cn_category_large')
-    updated['cn_category_medium'] = _extract_line(r"중국\s*중\s*카테고리\s*[:：]\s*(.+)", categories_text) or doc.get('cn_category_medium')
-    updated['cn_category_small'] = _extract_line(r"중국\s*소\s*카테고리\s*[:：]\s*(.+)", categories_text) or doc.get('cn_category_small')
-
-    # material + split sections
-    material_candidate = _extract_line(r"메인\s*아이디어|소재\s*[:：]\s*(.+)", material_only) or material_only.strip()
+    # categories + keywords (batches submitted before the taxonomy stage carry the two old stages).
+    # A taxonomy stage that failed every try ('' or still invalid) writes nothing over the stored
+    # values; a video left without them is redone by the next run (they are _DOC_FIELDS).
+    keywords = ([], [], [])
+    if texts.get('categories') and not texts.get(taxonomy.STAGE):
+        categories, keywords = parse_categories(texts['categories']), parse_keywords(texts.get('keywords') or '')
+    elif taxonomy.valid(texts.get(taxonomy.STAGE) or ''):
+        categories, keywords = taxonomy.parse(texts[taxonomy.STAGE])
+    else:
+        categories = {}
+        metrics.count('taxonomy_failed', id=doc.get('id'))
+    for field, val in categories.items():
+        updated[field] = val or doc.get(field)
+
+    # material
+    material_candidate = extract_line(MATERIAL_LINE, material_only) or material_only.strip()
     if not material_candidate:
         material_candidate = (
             updated.get('kr_category_small') or
@@ -416,69 +357,365 @@ def _analyze_video(doc: Dict[str, Any]) -> Dict[str, Any]:
         )
     updated['material'] = material_candidate
 
-    # parse composite sections
-    def _split_material_sections(text: str):
-        import re
-        t = (text or '').replace('\r','')
-        main_idea = ''
-        def cap_list(header, stop=None):
-            pat = re.compile(header, re.I)
-            stopre = re.compile(stop, re.I) if stop else None
-            acc = []
-            cap = False
-            for line in t.split('\n'):
-                if not cap and pat.search(line):
-                    cap = True
-                    continue
-                if cap:
-                    if stopre and stopre.search(line):
-                        break
-                    s = line.strip()
-                    if not s: continue
-                    if re.match(r"^\s*(메인\s*아이디어|핵심\s*소재|3-1|3-2|3-3)\b", s):
-                        break
-                    s = re.sub(r"^[-*•·]\s*", '', s)
-                    acc.append(s)
-            return [x for x in acc if x and len(x)>1][:12]
-        m = __import__('re').search(r"메인\s*아이디어\s*\(Main\s*Idea\)\s*[:：]\s*(.+)", t)
-        if m: main_idea = m.group(1).strip()
-        core = cap_list(r"핵심\s*소재\s*\(Core\s*Materials\)\s*:?", r"^(3-1|3-2|3-3)\b")
-        lang = cap_list(r"^(3-1\s*반복되는\s*언어\s*패턴)\b|반복되는\s*언어\s*패턴\s*[:：]", r"^(3-2|3-3)\b")
-        emo = cap_list(r"^(3-2\s*감정\s*몰입\s*포인트)\b|감정\s*몰입.*[:：]", r"^(3-3)\b")
-        info = cap_list(r"^(3-3\s*정보\s*전달\s*방식\s*특징)\b|정보\s*전달\s*방식.*[:：]", None)
-        return main_idea, core, lang, emo, info
-    try:
-        mi, core, lang, emo, info = _split_material_sections(material_only)
-        if not mi:
-            # second-pass: main idea only (JSON-불필요)
-            def _one_line_ok(s):
-                s = (s or '').strip(); return bool(s) and ('\n' not in s) and len(s) <= 200
-            mi = call_strict(_persona() + '\n\n메인 아이디어만 1문장으로 출력. 다른 텍스트 금지.', tshort, _one_line_ok, 2)
-        if not core:
-            core = _safe_json_arr(_call_gemini(_persona() + '\n\n핵심 소재만 JSON 배열로 3~7개 출력. 다른 텍스트 금지.', tshort)) or []
-        if not lang:
-            lang = _safe_json_arr(_call_gemini(_persona() + '\n\n반복되는 언어 패턴만 JSON 배열로 3~6개 출력. 다른 텍스트 금지.', tshort)) or []
-        if not emo:
-            emo = _safe_json_arr(_call_gemini(_persona() + '\n\n감정 몰입 포인트만 JSON 배열로 3~6개 출력. 다른 텍스트 금지.', tshort)) or []
-        if not info:
-            info = _safe_json_arr(_call_gemini(_persona() + '\n\n정보 전달 방식 특징만 JSON 배열로 3~6개 출력. 다른 텍스트 금지.', tshort)) or []
-        if mi: updated['material_main_idea'] = str(mi)[:1000]
-        if core: updated['material_core_materials'] = [str(x) for x in core][:12]
-        if lang: updated['material_lang_patterns'] = [str(x) for x in lang][:12]
-        if emo: updated['material_emotion_points'] = [str(x) for x in emo][:12]
-        if info: updated['material_info_delivery'] = [str(x) for x in info][:12]
-    except Exception:
-        pass
+    updated.update(_section_fields(sections))
 
     # keywords
-    ko, en, zh = _parse_keywords(keywords_text)
-    updated['keywords_ko'] = ko
-    updated['keywords_en'] = en
-    updated['keywords_zh'] = zh
+    if any(keywords):
+        updated['keywords_ko'], updated['keywords_en'], updated['keywords_zh'] = keywords
 
     return updated
 
 
+def _call_strict(prompt: str, content: str, validator, tries: int = 3, kind: str = 'text', cache=None) -> str:
+    # streamed when GEMINI_STREAM is on, so a response in the wrong format is cut off early
+    return gemini.call_strict(prompt, content, validator, tries, kind, cache=cache)
+
+
+def _cacheable(text: str) -> bool:
+    return gemini.cache_enabled() and _approx_tokens(text) >= gemini.cache_min_tokens()
+
+
+def _video_cache(tshort: str):
+    # 소재/구조/분석/후속 호출이 같은 tshort를 보내므로 한 번만 올려두고 참조한다
+    return gemini.create_cache(tshort) if _cacheable(tshort) else None
+
+
+def _static_cache(prompt: str):
+    # 영상 캐시가 없을 때: 큰 고정 템플릿(_build_analysis_prompt)을 프로세스 단위로 캐시
+    return gemini.shared_cache(prompt) if _cacheable(prompt) else None
+
+
+def _run_stage(k: str, prompt: str, content: str, cache_fut=None) -> str:
+    cache = cache_fut.result() if cache_fut is not None else None
+    if cache is None:
+        cache = _static_cache(prompt)
+    with metrics.timed(f'stage.{k}', cached=cache is not None):
+        if k in _STRICT_STAGES:
+            # Strict LLM calls with validation (no local fallbacks)
+            validator, tries, kind = _STRICT_STAGES[k]
+            return _call_strict(prompt, content, validator, tries, kind, cache)
+        return _call_gemini(prompt, content, cache)
+
+
+def _score_batch(sub: List[str]) -> str:
+    with metrics.timed('stage.dopamine_batch', sentences=len(sub)):
+        return _call_gemini(_build_dopamine_prompt(sub), '')
+
+
+def _force(job: Dict[str, Any]) -> bool:
+    # job/body config force=true: 대본이 그대로여도 증분 없이 전체 재분석
+    return str(job.get('force') or '').lower() in ('1', 'true')
+
+
+def _analyze_plan(doc: Dict[str, Any], sentences: List[str], force: bool = False, seeded: bool = False):
+    # 편집된 대본: 바뀐 문장만 도파민 채점, 문서 단위 단계는 변경량/도입부 변경에 따라
+    plan = incremental.plan(doc, sentences, _DOC_FIELDS, force, seeded)
+    if not plan.full:
+        metrics.count('dopamine_reused', len(plan.reuse))
+        metrics.log('incremental', id=doc.get('id'), **plan.summary())
+    return plan
+
+
+# fields a donor analysis hands over to a near-duplicate transcript
+_SEED_FIELDS = (*analysis_store.FIELDS, 'material', 'hooking', 'narrative_structure', *CATEGORY_FIELDS)
+
+
+def _dedup_seed(sb, doc: Dict[str, Any], sentences: List[str]) -> Dict[str, Any]:
+    # 재업로드/거의 같은 대본: 이미 분석된 영상의 결과에서 출발해 바뀐 문장/단계만 호출
+    if sb is None or not sentences or incremental.has_graph(doc):
+        return {}
+    try:
+        found = dedup.match(sb, doc.get('id'), sentences)
+        if not found:
+            return {}
+        donor_id, sim = found
+        res = sb.table('videos').select('*').eq('id', donor_id).limit(1).execute()
+        rows = getattr(res, 'data', []) or []
+        if not rows:
+            return {}
+        donor = analysis_store.load(sb, { 'id': donor_id, **rows[0] })
+    except Exception as e:
+        metrics.log('dedup_failed', id=doc.get('id'), error=str(e)[:200])
+        return {}
+    seed = { k: donor[k] for k in _SEED_FIELDS if donor.get(k) }
+    if not seed.get('dopamine_graph'):
+        return {}
+    metrics.count('dedup_hits')
+    metrics.log('dedup_hit', id=doc.get('id'), donor=donor_id, similarity=round(sim, 3))
+    doc.update(seed)
+    return seed
+
+
+def _taxonomy_local(sb, doc: Dict[str, Any], transcript: str, sentences: List[str],
+                    reqs: Dict[str, Tuple[str, str]]) -> Dict[str, str]:
+    # TAXONOMY_MODE=local: 기존 카테고리 어휘와 확실히 맞으면 분류 호출을 빼고 로컬 결과를 쓴다
+    if taxonomy.STAGE not in reqs:
+        return {}
+    text = taxonomy.local(sb, doc, transcript, sentences)
+    if not text:
+        return {}
+    reqs.pop(taxonomy.STAGE)
+    return { taxonomy.STAGE: text }
+
+
+def _planned_stages(plan, reqs: Dict[str, Tuple[str, str]]) -> Dict[str, Tuple[str, str]]:
+    if plan.recompute_doc:
+        return reqs
+    return { k: v for k, v in reqs.items() if k == 'hooking' and plan.recompute_hooking }
+
+
+def _analyze_video(doc: Dict[str, Any], dopamine_mode: str = None, sb=None, force: bool = False) -> Dict[str, Any]:
+    # Hard skip when transcript is known unavailable
+    if doc.get('transcript_unavailable') is True:
+        return {}
+    if not doc.get('youtube_url'):
+        return {}
+    transcript = _transcript_for(doc)
+    sentences = _split_sentences(transcript)
+    seed = _dedup_seed(sb, doc, sentences)
+    plan = _analyze_plan(doc, sentences, force, bool(seed))
+    # 문서 단위 단계를 건너뛰면 tshort(긴 대본은 구간 요약 호출)도 필요 없다
+    tshort = _shorten(transcript, sentences) if plan.recompute_doc else transcript
+    reqs = _planned_stages(plan, _stage_requests(doc, transcript, tshort, sentences))
+    texts: Dict[str, str] = _taxonomy_local(sb, doc, transcript, sentences, reqs)
+    # local 모드: 도파민은 LLM 없이 로컬 채점 (가장 호출이 많은 단계 생략)
+    local_dopamine = resolve_mode(dopamine_mode) == 'local'
+    batches = [] if local_dopamine else _dopamine_batches([sentences[i] for i in plan.todo])
+    # 모든 단계(소재/후킹/구조/분석/분류 + 도파민 배치)를 한 번에 fan-out.
+    # 영상 하나의 소요 시간은 가장 느린 호출 하나로 묶인다 (동시 호출 수는 _llm_slots_sem이 제한)
+    workers = min(len(reqs) + len(batches) + 1, max(3, int(os.getenv('ANALYSIS_STAGE_WORKERS') or '12')))
+    cache_fut = None
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            # 캐시 생성은 가장 먼저 제출: tshort를 보내는 단계만 기다리고 나머지는 바로 출발
+            cache_fut = ex.submit(metrics.bind(_video_cache), tshort if plan.recompute_doc else '')
+            dopa_futs = [ex.submit(metrics.bind(_score_batch), sub) for sub in batches]
+            futs = {
+                k: ex.submit(metrics.bind(_run_stage), k, prompt, content, cache_fut if content == tshort else None)
+                for k, (prompt, content) in reqs.items()
+            }
+            for k, f in futs.items():
+                if k in _STRICT_STAGES:
+                    try:
+                        texts[k] = (f.result() or '').strip()
+                    except Exception:
+                        texts[k] = ''
+                else:
+                    # Analysis(카드/세부): 실패 시 영상 전체 실패 (기존 동작 유지)
+                    texts[k] = f.result()
+            # 배치 순서대로 병합
+            scored: List[Dict[str, Any]] = []
+            for f in dopa_futs:
+                scored.extend(_dopamine_items(f.result()))
+            dopamine_graph = local_graph(sentences) if local_dopamine else plan.merge(sentences, scored)
+        cache = cache_fut.result()
+        if not plan.recompute_doc:
+            return { **seed, **incremental.partial_update(transcript, plan, dopamine_graph, texts.get('hooking')) }
+
+        # parse composite sections, second pass only for the missing ones
+        sections: Dict[str, Any] = {}
+        try:
+            sections = parse_material(texts['material'])
+            missing = [k for k in _MATERIAL_FOLLOWUPS if not sections.get(k)]
+            if missing:
+                with ThreadPoolExecutor(max_workers=len(missing)) as ex:
+                    futs = {
+                        # main idea: JSON-불필요
+                        k: ex.submit(metrics.bind(_call_strict), _MATERIAL_FOLLOWUPS[k], tshort, _one_line_ok, 2, 'text', cache) if k == 'main_idea'
+                        else ex.submit(metrics.bind(_call_gemini), _MATERIAL_FOLLOWUPS[k], tshort, cache)
+                        for k in missing
+                    }
+                    for k, f in futs.items():
+                        sections[k] = f.result() if k == 'main_idea' else (_safe_json_arr(f.result()) or [])
+        except Exception:
+            pass
+    finally:
+        if cache_fut is not None:
+            gemini.delete_cache(cache_fut.result())
+
+    updated = _build_update(doc, transcript, sentences, texts, dopamine_graph, sections)
+    updated['analysis_sentence_hashes'] = plan.keys
+    return { **seed, **updated }
+
+
+# ---------------------------------------------------------------------------
+# asyncio execution path (ANALYSIS_ASYNC=1 or job.async): one event loop,
+# semaphores instead of threads for every Gemini / Supabase round trip.
+# ---------------------------------------------------------------------------
+
+def _async_enabled(job: Dict[str, Any]) -> bool:
+    if _httpx() is None:
+        return False
+    flag = job.get('async')
+    if flag is None:
+        flag = (os.getenv('ANALYSIS_ASYNC') or '0').strip().lower() in ('1', 'true', 'yes')
+    return bool(flag)
+
+
+async def _call_gemini_async(client, llm_sem, system_prompt: str, user_content: str, cache=None) -> str:
+    return await gemini.generate_async(client, llm_sem, system_prompt, user_content, cache=cache)
+
+
+async def _call_strict_async(client, llm_sem, prompt: str, content: str, validator, tries: int = 3,
+                             kind: str = 'text', cache=None) -> str:
+    return await gemini.call_strict_async(client, llm_sem, prompt, content, validator, tries, kind, cache=cache)
+
+
+def _rest_headers(prefer: str = '') -> Dict[str, str]:
+    key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
+    if not os.getenv('SUPABASE_URL') or not key:
+        raise RuntimeError('Missing SUPABASE_URL or SUPABASE_*_KEY env')
+    headers = { 'apikey': key, 'Authorization': f'Bearer {key}' }
+    if prefer:
+        headers['Prefer'] = prefer
+    return headers
+
+
+def _rest_url(table: str) -> str:
+    return os.getenv('SUPABASE_URL', '').rstrip('/') + f'/rest/v1/{table}'
+
+
+async def _sb_get_row_async(client, table: str, vid: str, key: str = 'id') -> Dict[str, Any]:
+    res = await client.get(_rest_url(table), params={ 'select': '*', key: f'eq.{vid}', 'limit': '1' }, headers=_rest_headers())
+    res.raise_for_status()
+    rows = res.json() or []
+    return rows[0] if rows else {}
+
+
+async def _sb_update_async(client, table: str, vid: str, patch: Dict[str, Any]) -> None:
+    res = await client.patch(_rest_url(table), params={ 'id': f'eq.{vid}' }, json=patch, headers=_rest_headers('return=minimal'))
+    res.raise_for_status()
+
+
+async def _sb_upsert_async(client, table: str, row: Dict[str, Any]) -> None:
+    res = await client.post(_rest_url(table), json=row, headers=_rest_headers('resolution=merge-duplicates,return=minimal'))
+    res.raise_for_status()
+
+
+async def _analyze_video_async(doc: Dict[str, Any], client, llm_sem, dopamine_mode: str = None, sb=None,
+                               force: bool = False) -> Dict[str, Any]:
+    if doc.get('transcript_unavailable') is True:
+        return {}
+    if not doc.get('youtube_url'):
+        return {}
+    transcript = str(doc.get('transcript_text') or '').strip()
+    if not transcript:
+        # youtube_transcript_api is sync-only; keep it off the event loop
+        with metrics.timed('transcript_fetch'):
+            transcript = await asyncio.to_thread(_fetch_transcript, doc.get('youtube_url'), ['ko', 'en'])
+    sentences = _split_sentences(transcript)
+    seed = await asyncio.to_thread(_dedup_seed, sb, doc, sentences)
+    plan = _analyze_plan(doc, sentences, force, bool(seed))
+    tshort = await _shorten_async(transcript, sentences, client, llm_sem) if plan.recompute_doc else transcript
+    reqs = _planned_stages(plan, _stage_requests(doc, transcript, tshort, sentences))
+    local_texts = await asyncio.to_thread(_taxonomy_local, sb, doc, transcript, sentences, reqs)
+
+    cache_task = asyncio.ensure_future(
+        gemini.create_cache_async(client, llm_sem, tshort) if plan.recompute_doc and _cacheable(tshort) else asyncio.sleep(0)
+    )
+
+    async def stage(k):
+        prompt, content = reqs[k]
+        try:
+            cache = await cache_task if content == tshort else None
+            if cache is None and _cacheable(prompt):
+                cache = await asyncio.to_thread(gemini.shared_cache, prompt)
+            with metrics.timed(f'stage.{k}', cached=cache is not None):
+                if k in _STRICT_STAGES:
+                    validator, tries, kind = _STRICT_STAGES[k]
+                    return await _call_strict_async(client, llm_sem, prompt, content, validator, tries, kind, cache)
+                return await _call_gemini_async(client, llm_sem, prompt, content, cache)
+        except Exception:
+            # 분석은 동기 경로와 마찬가지로 실패 시 전체 실패
+            if k in _STRICT_STAGES:
+                return ''
+            raise
+
+    local_dopamine = resolve_mode(dopamine_mode) == 'local'
+    async def score_batch(sub):
+        with metrics.timed('stage.dopamine_batch', sentences=len(sub)):
+            return await _call_gemini_async(client, llm_sem, _build_dopamine_prompt(sub), '')
+
+    todo = [sentences[i] for i in plan.todo]
+    dopa_calls = [] if local_dopamine else [score_batch(sub) for sub in _dopamine_batches(todo)]
+    keys = list(reqs.keys())
+    try:
+        results = await asyncio.gather(*(stage(k) for k in keys), *dopa_calls)
+        texts = { **local_texts, **{ k: (results[i] or '') for i, k in enumerate(keys) } }
+        for k in _STRICT_STAGES:
+            if k in texts:
+                texts[k] = texts[k].strip()
+        scored: List[Dict[str, Any]] = []
+        for text in results[len(keys):]:
+            scored.extend(_dopamine_items(text))
+        dopamine_graph = local_graph(sentences) if local_dopamine else plan.merge(sentences, scored)
+        if not plan.recompute_doc:
+            return { **seed, **incremental.partial_update(transcript, plan, dopamine_graph, texts.get('hooking')) }
+
+        cache = await cache_task
+        sections: Dict[str, Any] = {}
+        try:
+            sections = parse_material(texts['material'])
+            missing = [k for k in _MATERIAL_FOLLOWUPS if not sections.get(k)]
+            calls = [
+                _call_strict_async(client, llm_sem, _MATERIAL_FOLLOWUPS[k], tshort, _one_line_ok, 2, 'text', cache) if k == 'main_idea'
+                else _call_gemini_async(client, llm_sem, _MATERIAL_FOLLOWUPS[k], tshort, cache)
+                for k in missing
+            ]
+            for k, val in zip(missing, await asyncio.gather(*calls)):
+                sections[k] = val if k == 'main_idea' else (_safe_json_arr(val) or [])
+        except Exception:
+            pass
+    finally:
+        await gemini.delete_cache_async(client, await cache_task)
+
+    updated = _build_update(doc, transcript, sentences, texts, dopamine_graph, sections)
+    updated['analysis_sentence_hashes'] = plan.keys
+    return { **seed, **updated }
+
+
+async def _process_videos_async(ids: List[str], dopamine_mode: str = None, sb=None, force: bool = False) -> int:
+    done = 0
+    side = await asyncio.to_thread(analysis_store.available, sb)
+    httpx = _httpx()
+    limits = httpx.Limits(max_connections=max(10, _llm_inflight_cap() + 10))
+    async with httpx.AsyncClient(timeout=180, limits=limits) as client:
+        llm_sem = asyncio.Semaphore(_llm_inflight_cap())
+        video_sem = asyncio.Semaphore(_video_concurrency())
+
+        async def one(vid):
+            nonlocal done
+            async with video_sem:
+                with metrics.timed('sb_read'):
+                    row = await _sb_get_row_async(client, 'videos', vid)
+                if not row:
+                    return
+                video = { 'id': vid, **row }
+                allowed = set(video.keys())
+                if side:
+                    video = analysis_store.merge(video, await _sb_get_row_async(client, analysis_store.TABLE, vid, 'video_id'))
+                with metrics.timed('video', id=vid):
+                    updated = await _analyze_video_async(video, client, llm_sem, dopamine_mode, sb, force)
+                if not updated:
+                    return
+                payload, side_row = analysis_store.videos_patch(sb, video, updated, allowed)
+                if side_row is not None:
+                    with metrics.timed('sb_write', table=analysis_store.TABLE):
+                        await _sb_upsert_async(client, analysis_store.TABLE, side_row)
+                if payload:
+                    with metrics.timed('sb_write'):
+                        await _sb_update_async(client, 'videos', vid, payload)
+                await asyncio.to_thread(analysis_store.after_write, sb, video, updated)
+                metrics.count('videos')
+                done += 1
+
+        for res in await asyncio.gather(*(one(v) for v in ids), return_exceptions=True):
+            if isinstance(res, Exception):
+                # mark error (optional: write to jobs table when exists)
+                metrics.count('video_errors', error=str(res)[:200])
+    return done
+
+
 def _get_youtube_keys(sb) -> List[str]:
     keys_raw = os.getenv('YOUTUBE_API_KEYS', '')
     keys = [k.strip() for k in keys_raw.split(',') if k.strip()]
@@ -487,6 +724,21 @@ def _get_youtube_keys(sb) -> List[str]:
     return []
 
 
+# videos columns a ranking refresh reads (growth is computed against the previous check)
+_VIEW_COLUMNS = ('id', 'youtube_url', 'views', 'views_numeric', 'views_prev_numeric',
+                 'views_baseline_numeric', 'views_last_checked_at', 'date')
+
+
+def _read_view_rows(sb, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    cols = list(_VIEW_COLUMNS) + [c for c in ranking.category_columns() if c not in _VIEW_COLUMNS]
+    try:
+        res = sb.table('videos').select(','.join(cols)).in_('id', ids).execute()
+    except Exception:
+        # 컬럼이 없는 예전 스키마
+        res = sb.table('videos').select('id,youtube_url').in_('id', ids).execute()
+    return { str(r.get('id')): r for r in (getattr(res, 'data', []) or []) }
+
+
 def _update_views_for_videos(sb, ids: List[str]) -> int:
     keys = _get_youtube_keys(sb)
     if not keys:
@@ -496,14 +748,12 @@ def _update_views_for_videos(sb, ids: List[str]) -> int:
     base = 'https://www.googleapis.com/youtube/v3/videos'
     id_map = {}
     vids = []
+    rows_by_id = _read_view_rows(sb, ids)
     for vid in ids:
-        # fetch video row from supabase
-        res = sb.table('videos').select('*').eq('id', vid).limit(1).execute()
-        rows = getattr(res, 'data', []) or []
-        if not rows:
+        row = rows_by_id.get(str(vid))
+        if not row:
             continue
-        data = rows[0]
-        url = data.get('youtube_url') or ''
+        url = row.get('youtube_url') or ''
         video_id = None
         try:
             if 'watch?v=' in url:
@@ -519,10 +769,14 @@ def _update_views_for_videos(sb, ids: List[str]) -> int:
         if video_id:
             id_map[video_id] = vid
             vids.append(video_id)
-    if not vids:
-        return 0
     now_ms = int(time.time()*1000)
+    scheduled = refresh_schedule.available(sb)
+    # 다시 볼 필요가 없는 행 (YouTube ID 없음 / API가 돌려주지 않음): 최대 간격 뒤로
+    mapped_ids = set(id_map.values())
+    missing = [vid for vid in ids if str(vid) in rows_by_id and vid not in mapped_ids]
     updated = 0
+    refreshed = []
+    points = []
     for i in range(0, len(vids), 50):
         chunk = vids[i:i+50]
         # rotate key per chunk
@@ -532,31 +786,19 @@ def _update_views_for_videos(sb, ids: List[str]) -> int:
         if res.status_code != 200:
             continue
         data = res.json()
+        returned = { item.get('id') for item in data.get('items', []) }
+        missing += [id_map[v] for v in chunk if v not in returned]
         for item in data.get('items', []):
             video_id = item.get('id')
             mapped = id_map.get(video_id)
             stats = item.get('statistics', {})
             views = int(stats.get('viewCount') or 0)
             if mapped:
-                prev = 0
-                basev = 0
-                # read again to compute prev/base
-                try:
-                    old = data or {}
-                    def _parse_human(v):
-                        try:
-                            if isinstance(v, (int, float)):
-                                return int(v)
-                            s = str(v or '')
-                            digits = ''.join(ch for ch in s if ch.isdigit())
-                            return int(digits) if digits else 0
-                        except Exception:
-                            return 0
-                    prev = int(old.get('views_numeric') or 0)
-                    basev = int(old.get('views_baseline_numeric') or 0)
-                    orig = _parse_human(old.get('views'))
-                except Exception:
-                    orig = 0
+                # 이전값/베이스라인은 방금 읽은 videos 행에서
+                old = rows_by_id.get(str(mapped)) or {}
+                prev = int(old.get('views_numeric') or 0)
+                basev = int(old.get('views_baseline_numeric') or 0)
+                orig = ranking.parse_count(old.get('views'))
                 # 이전값 결정: 기존 current > baseline > import original
                 prev_for_patch = prev or basev or orig
                 patch = {
@@ -567,40 +809,86 @@ def _update_views_for_videos(sb, ids: List[str]) -> int:
                 if not basev:
                     # 최초 베이스라인은 기존 current 또는 import 원본
                     patch['views_baseline_numeric'] = prev or orig or views
+                # 증가수/증가율/일평균 (직전 확인 시각 기준)
+                growth = ranking.growth(views, prev_for_patch, old.get('views_last_checked_at'), now_ms)
+                if ranking.available(sb):
+                    patch.update(growth)
+                if scheduled:
+                    # 다음 확인 시각: 증가 속도/업로드 경과일 기준 (1시간 ~ 1주)
+                    patch[refresh_schedule.COLUMN] = refresh_schedule.next_check({ **old, **patch, **growth }, now_ms)
                 sb.table('videos').update(patch).eq('id', mapped).execute()
+                refreshed.append({ **old, **patch, **growth, 'id': mapped })
+                points.append((mapped, views))
                 updated += 1
+    if scheduled and missing:
+        try:
+            sb.table('videos').update({ refresh_schedule.COLUMN: refresh_schedule.deferred(now_ms) }).in_('id', missing).execute()
+        except Exception as e:
+            metrics.log('refresh_defer_failed', error=str(e)[:200])
+    if points:
+        try:
+            # 조회수 시계열: 배치 전체를 한 번에 기록 (시간 단위 버킷)
+            view_history.record(sb, points, now_ms)
+        except Exception as e:
+            metrics.log('view_snapshots_failed', error=str(e)[:200])
+    if refreshed:
+        try:
+            # 랭킹 물리화: 방금 갱신한 행만 상위 K 목록에 반영
+            ranking.materialize(sb, refreshed)
+        except Exception as e:
+            metrics.log('ranking_materialize_failed', error=str(e)[:200])
     return updated
 
 
+def _analyze_and_store(sb, vid: str, dopamine_mode: str = None, force: bool = False) -> bool:
+    with metrics.timed('sb_read'):
+        res = sb.table('videos').select('*').eq('id', vid).limit(1).execute()
+    rows = getattr(res, 'data', []) or []
+    if not rows:
+        return False
+    video = { 'id': vid, **rows[0] }
+    allowed = set(video.keys())
+    video = analysis_store.load(sb, video)
+    with metrics.timed('video', id=vid):
+        updated = _analyze_video(video, dopamine_mode, sb, force)
+    if not updated:
+        return False
+    analysis_store.write(sb, video, updated, allowed)
+    metrics.count('videos')
+    return True
+
+
 def _process_job_batch(sb, job: Dict[str, Any], batch_size: int = 3) -> Dict[str, Any]:
     scope = job.get('scope')
     remaining = list(job.get('remaining_ids') or job.get('ids') or job.get('remainingIds') or [])
     if scope == 'all' and not remaining:
-        # snapshot all video ids
-        res = sb.table('videos').select('id').execute()
-        rows = getattr(res, 'data', []) or []
-        remaining = [r['id'] for r in rows if r.get('id')]
+        if job.get('type') == 'ranking' and refresh_schedule.available(sb):
+            # 조회수 갱신은 확인 시각이 된 영상만
+            remaining = refresh_schedule.due_ids(sb)
+        else:
+            # snapshot all video ids (keyset pages: a bare select stops at PostgREST's max-rows)
+            remaining = pagination.all_ids(sb, 'videos')
     ids_to_run = remaining[:batch_size]
     left = remaining[batch_size:]
     if job.get('type') == 'ranking':
-        cnt = _update_views_for_videos(sb, ids_to_run)
+        with metrics.timed('ranking_batch', ids=len(ids_to_run)):
+            cnt = _update_views_for_videos(sb, ids_to_run)
+    elif _async_enabled(job):
+        asyncio.run(_process_videos_async(ids_to_run, job.get('dopamine_mode'), sb, _force(job)))
     else:
-        for vid in ids_to_run:
-            try:
-                res = sb.table('videos').select('*').eq('id', vid).limit(1).execute()
-                rows = getattr(res, 'data', []) or []
-                if not rows:
-                    continue
-                video = { 'id': vid, **rows[0] }
-                updated = _analyze_video(video)
-                if updated:
-                    allowed = set(video.keys())
-                    payload = { k: v for k, v in updated.items() if k in allowed }
-                    if payload:
-                        sb.table('videos').update(payload).eq('id', vid).execute()
-            except Exception as e:
-                # mark error (optional: write to jobs table when exists)
-                pass
+        # 여러 영상을 동시에 분석하고, 끝나는 순서대로 바로 저장
+        workers = max(1, min(len(ids_to_run), _video_concurrency()))
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futs = [ex.submit(metrics.bind(_analyze_and_store), sb, vid, job.get('dopamine_mode'), _force(job))
+                    for vid in ids_to_run]
+            for f in as_completed(futs):
+                try:
+                    f.result()
+                except Exception as e:
+                    # mark error (optional: write to jobs table when exists)
+                    metrics.count('video_errors', error=str(e)[:200])
+    if job.get('type') != 'ranking':
+        _embed_analyzed(sb, ids_to_run)
     # update job progress
     now_iso = __import__('datetime').datetime.utcnow().isoformat() + 'Z'
     patch = { 'updated_at': now_iso }
@@ -608,22 +896,291 @@ def _process_job_batch(sb, job: Dict[str, Any], batch_size: int = 3) -> Dict[str
         patch.update({ 'status': 'running', 'remaining_ids': left })
     else:
         patch.update({ 'status': 'done', 'remaining_ids': [] })
+    _patch_job(sb, job['id'], patch)
+    return patch
+
+
+def _auto_ranking_row(sb) -> Optional[Dict[str, Any]]:
+    # cron이 등록한 정기 갱신 행 (하나만 두고 매번 다시 쓴다)
+    res = sb.table('schedules').select('id,content,created_at').execute()
+    for row in getattr(res, 'data', []) or []:
+        try:
+            cfg = json.loads(row.get('content') or '{}')
+        except Exception:
+            continue
+        if isinstance(cfg, dict) and cfg.get('auto') and cfg.get('type') == 'ranking':
+            return { **row, 'cfg': cfg }
+    return None
+
+
+def _enqueue_ranking(sb, due: List[Dict[str, Any]], now_ms: int, iso_now: str) -> Optional[Dict[str, Any]]:
+    # 확인 시각이 된 영상이 있는데 실행할 랭킹 작업이 없으면 cron이 직접 등록 (관리자 예약과 같은 content 형식)
+    # 틱마다 행이 쌓이지 않도록 예전에 등록한 auto 행이 있으면 pending으로 되돌려 재사용
+    if not refresh_schedule.auto_job() or not refresh_schedule.available(sb):
+        return None
+    if any(row.get('type') == 'ranking' for row in due):
+        return None
+    try:
+        if not refresh_schedule.any_due(sb, now_ms):
+            return None
+        prev = _auto_ranking_row(sb)
+        cfg = { **(prev or {}).get('cfg', {}), 'type': 'ranking', 'scope': 'all', 'remaining_ids': [], 'status': 'pending',
+                'run_at': iso_now, 'updated_at': iso_now, 'auto': True }
+        cfg.setdefault('created_at', iso_now)
+        if prev:
+            sb.table('schedules').update({ 'content': json.dumps(cfg) }).eq('id', prev['id']).execute()
+            rows = [{ k: v for k, v in prev.items() if k != 'cfg' }]
+        else:
+            res = sb.table('schedules').insert({ 'content': json.dumps(cfg), 'created_at': iso_now }).execute()
+            rows = getattr(res, 'data', []) or []
+    except Exception as e:
+        metrics.log('ranking_enqueue_failed', error=str(e)[:200])
+        return None
+    if not rows or rows[0].get('id') is None:
+        # id를 돌려받지 못하면 다음 틱에 schedules 조회로 집어 간다
+        return None
+    metrics.log('ranking_enqueued', id=rows[0].get('id'), reused=bool(prev))
+    return { **rows[0], **cfg }
+
+
+def _patch_job(sb, job_id: Any, patch: Dict[str, Any]) -> None:
     # Try column update; if schema is minimal, merge into content JSON
     try:
-        sb.table('schedules').update(patch).eq('id', job['id']).execute()
+        sb.table('schedules').update(patch).eq('id', job_id).execute()
+        return
     except Exception:
+        pass
+    try:
+        cur = sb.table('schedules').select('content').eq('id', job_id).limit(1).execute()
+        rows = getattr(cur, 'data', []) or []
+        content_raw = rows[0].get('content') if rows else None
         try:
-            cur = sb.table('schedules').select('content').eq('id', job['id']).limit(1).execute()
-            rows = getattr(cur, 'data', []) or []
-            content_raw = rows[0].get('content') if rows else None
-            try:
-                cfg = json.loads(content_raw or '{}')
-            except Exception:
-                cfg = {}
-            cfg.update(patch)
-            sb.table('schedules').update({ 'content': json.dumps(cfg) }).eq('id', job['id']).execute()
+            cfg = json.loads(content_raw or '{}')
+        except Exception:
+            cfg = {}
+        cfg.update(patch)
+        sb.table('schedules').update({ 'content': json.dumps(cfg) }).eq('id', job_id).execute()
+    except Exception:
+        pass
+    # 컬럼 스키마에 batch 같은 추가 키가 없어 실패한 경우: 기본 컬럼만이라도 갱신
+    base = { k: v for k, v in patch.items() if k in ('status', 'remaining_ids', 'updated_at') }
+    if base and len(base) < len(patch):
+        try:
+            sb.table('schedules').update(base).eq('id', job_id).execute()
         except Exception:
             pass
+
+
+# ---------------------------------------------------------------------------
+# Batch API path (job.mode='batch', or ANALYSIS_BATCH_MODE=1 for scope=all):
+# each tick submits up to BATCH_MAX_VIDEOS videos as one Gemini batch and
+# returns; later ticks poll it, store the results and submit the next chunk.
+# Phase 2 is a small follow-up batch for material sections phase 1 missed.
+# ---------------------------------------------------------------------------
+
+def _job_batch_state(job: Dict[str, Any]) -> Dict[str, Any]:
+    state = job.get('batch')
+    if state is None and job.get('content'):
+        try:
+            state = json.loads(job['content']).get('batch')
+        except Exception:
+            state = None
+    if isinstance(state, str):
+        try:
+            state = json.loads(state)
+        except Exception:
+            state = None
+    return dict(state or {})
+
+
+def _batch_inputs(doc: Dict[str, Any], force: bool = False, seeded: bool = False):
+    # (transcript, sentences, tshort, plan) exactly as _analyze_video would use them;
+    # no map-reduce here (that would be synchronous calls), long transcripts are sampled
+    transcript = str(doc.get('transcript_text') or '').strip()
+    sentences = _split_sentences(transcript)
+    plan = _analyze_plan(doc, sentences, force, seeded)
+    tshort = token_budget.prepare(transcript, sentences) if plan.recompute_doc else transcript
+    return transcript, sentences, tshort, plan
+
+
+def _batch_video_lines(sb, doc: Dict[str, Any], dopamine_mode: str = None, force: bool = False) -> List[str]:
+    if doc.get('transcript_unavailable') is True or not doc.get('youtube_url'):
+        return []
+    if not str(doc.get('transcript_text') or '').strip():
+        # 자막을 받아 와야 하는 영상: 결과 처리 때 같은 대본을 쓰도록 먼저 저장
+        doc['transcript_text'] = _transcript_for(doc)
+        if not doc['transcript_text']:
+            return []
+        sb.table('videos').update({ 'transcript_text': doc['transcript_text'] }).eq('id', doc['id']).execute()
+    allowed = { k for k in doc if k not in analysis_store.FIELDS and k != analysis_store.PACKED }
+    seed = _dedup_seed(sb, doc, _split_sentences(str(doc['transcript_text']).strip()))
+    if seed:
+        # 결과 처리 때 다시 읽는 문서도 같은 출발점이 되도록 기증 분석을 먼저 저장 (완전 중복이면 요청 없음)
+        analysis_store.write(sb, doc, { **seed, 'transcript_text': str(doc['transcript_text']).strip() }, allowed)
+    transcript, sentences, tshort, plan = _batch_inputs(doc, force, bool(seed))
+    vid = doc['id']
+    reqs = _planned_stages(plan, _stage_requests(doc, transcript, tshort, sentences))
+    # 로컬로 분류되는 영상은 분류 요청 없이 제출 (결과 처리 때 다시 분류)
+    _taxonomy_local(sb, doc, transcript, sentences, reqs)
+    lines = [batch.line(f'{vid}:{k}', prompt, content) for k, (prompt, content) in reqs.items()]
+    if resolve_mode(dopamine_mode) != 'local':
+        for i, sub in enumerate(_dopamine_batches([sentences[j] for j in plan.todo])):
+            lines.append(batch.line(f'{vid}:dopamine.{i}', _build_dopamine_prompt(sub), ''))
+    return lines
+
+
+def _batch_store(sb, vid: str, got: Dict[str, Dict[str, Any]], dopamine_mode: str = None,
+                 force: bool = False) -> List[str]:
+    # phase 1 results of one video -> videos row; returns phase 2 lines (missing material sections)
+    res = sb.table('videos').select('*').eq('id', vid).limit(1).execute()
+    rows = getattr(res, 'data', []) or []
+    if not rows:
+        return []
+    doc = { 'id': vid, **rows[0] }
+    allowed = set(doc.keys())
+    doc = analysis_store.load(sb, doc)
+    transcript, sentences, tshort, plan = _batch_inputs(doc, force)
+    texts = { k: (v.get('text') or '').strip() for k, v in got.items() if not k.startswith('dopamine.') }
+    planned = _planned_stages(plan, _stage_requests(doc, transcript, tshort, sentences))
+    for k in planned:
+        if k not in _STRICT_STAGES and not texts.get(k):
+            # 분석 실패는 동기 경로와 같이 영상 전체 실패
+            raise RuntimeError(f'batch stage {k} failed: {got.get(k, {}).get("error")}')
+    for k, (validator, _, _) in _STRICT_STAGES.items():
+        if k in texts and not validator(texts[k]):
+            texts[k] = ''
+    if taxonomy.STAGE in planned and not texts.get(taxonomy.STAGE) and 'categories' not in texts:
+        # 제출 때 로컬로 분류된 영상: 요청이 없었으므로 어휘로 다시 분류
+        texts[taxonomy.STAGE] = taxonomy.local(sb, doc, transcript, sentences, force=True) or ''
+    scored: List[Dict[str, Any]] = []
+    for i in range(len(got)):
+        part = got.get(f'dopamine.{i}')
+        if part is None:
+            break
+        scored.extend(_dopamine_items(part.get('text') or ''))
+    local = resolve_mode(dopamine_mode) == 'local'
+    dopamine_graph = local_graph(sentences) if local else plan.merge(sentences, scored)
+    followups: List[str] = []
+    if plan.recompute_doc:
+        sections = parse_material(texts.get('material') or '')
+        updated = _build_update(doc, transcript, sentences, texts, dopamine_graph, sections)
+        updated['analysis_sentence_hashes'] = plan.keys
+        followups = [
+            batch.line(f'{vid}:followup.{k}', _MATERIAL_FOLLOWUPS[k], tshort)
+            for k in _MATERIAL_FOLLOWUPS if not sections.get(k)
+        ]
+    else:
+        updated = incremental.partial_update(transcript, plan, dopamine_graph, texts.get('hooking'))
+    analysis_store.write(sb, doc, updated, allowed)
+    metrics.count('videos')
+    return followups
+
+
+def _batch_store_followups(sb, vid: str, got: Dict[str, Dict[str, Any]]) -> None:
+    sections: Dict[str, Any] = {}
+    for name, v in got.items():
+        k = name.split('.', 1)[-1]
+        text = (v.get('text') or '').strip()
+        if k == 'main_idea':
+            sections[k] = text if _one_line_ok(text) else ''
+        else:
+            sections[k] = _safe_json_arr(text) or []
+    patch = _section_fields(sections)
+    if not patch:
+        return
+    res = sb.table('videos').select('*').eq('id', vid).limit(1).execute()
+    rows = getattr(res, 'data', []) or []
+    if rows:
+        doc = { 'id': vid, **rows[0] }
+        allowed = set(doc.keys())
+        analysis_store.write(sb, analysis_store.load(sb, doc), patch, allowed)
+
+
+def _batch_collect(sb, job: Dict[str, Any], state: Dict[str, Any], file_name: str) -> List[str]:
+    # stores a finished batch; returns phase 2 lines (empty for phase 2 itself)
+    by_video: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for key, item in batch.results(state, file_name).items():
+        vid, stage = batch.split_key(key)
+        by_video.setdefault(vid, {})[stage] = item
+    followups: List[str] = []
+    for vid in state.get('ids') or []:
+        got = by_video.get(str(vid)) or {}
+        try:
+            if state.get('phase') == 2:
+                _batch_store_followups(sb, str(vid), got)
+            elif got:
+                followups.extend(_batch_store(sb, str(vid), got, job.get('dopamine_mode'), _force(job)))
+            else:
+                raise RuntimeError('no batch results')
+        except Exception as e:
+            metrics.count('video_errors', error=str(e)[:200], id=vid)
+    if state.get('phase') != 2:
+        _embed_analyzed(sb, [str(v) for v in state.get('ids') or []])
+    return followups
+
+
+def _embed_analyzed(sb, ids: List[str]) -> None:
+    # 분석이 끝난 영상들의 임베딩: 배치당 호출 한 번 (본문이 그대로면 건너뜀)
+    try:
+        embeddings.embed_videos(sb, ids)
+    except Exception as e:
+        metrics.log('embed_failed', error=str(e)[:200])
+
+
+def _run_batch_job(sb, job: Dict[str, Any]) -> Dict[str, Any]:
+    state = _job_batch_state(job)
+    remaining = list(job.get('remaining_ids') or job.get('ids') or [])
+    if not state and job.get('scope') == 'all' and not remaining:
+        remaining = pagination.all_ids(sb, 'videos')
+    state.setdefault('failures', 0)
+    if state.get('name'):
+        with metrics.timed('batch_poll'):
+            st, file_name = batch.poll(state)
+        metrics.log('batch_state', job=job.get('id'), name=state['name'], state=st, phase=state.get('phase'))
+        if st in batch.FAILED_STATES:
+            state['failures'] += 1
+            if state.get('phase') != 2:
+                # 실패한 청크는 다시 대기열로 (2번 실패하면 동기 경로로 전환)
+                remaining = list(state.get('ids') or []) + remaining
+            state.update(name=None, ids=[], phase=None)
+        elif st in batch.DONE_STATES and file_name:
+            followups = _batch_collect(sb, job, state, file_name)
+            state.update(name=None, ids=[], phase=None)
+            if followups:
+                ids = sorted({ batch.split_key(json.loads(l)['key'])[0] for l in followups })
+                state.update(batch.submit(followups, f"analysis-{job.get('id')}-followups"), ids=ids, phase=2)
+        else:
+            # 아직 처리 중: 다음 cron 틱에 다시 확인
+            return _batch_patch(sb, job, state, remaining)
+    if state.get('failures', 0) >= 2:
+        patch = { 'mode': 'sync', 'status': 'running', 'remaining_ids': remaining }
+        patch['updated_at'] = __import__('datetime').datetime.utcnow().isoformat() + 'Z'
+        _patch_job(sb, job['id'], patch)
+        return patch
+    while not state.get('name') and remaining:
+        ids, remaining = remaining[:batch.max_videos()], remaining[batch.max_videos():]
+        res = sb.table('videos').select('*').in_('id', ids).execute()
+        lines: List[str] = []
+        for row in analysis_store.load_many(sb, getattr(res, 'data', []) or []):
+            try:
+                lines.extend(_batch_video_lines(sb, dict(row), job.get('dopamine_mode'), _force(job)))
+            except Exception as e:
+                metrics.count('video_errors', error=str(e)[:200], id=row.get('id'))
+        if lines:
+            ids = sorted({ batch.split_key(json.loads(l)['key'])[0] for l in lines })
+            state.update(batch.submit(lines, f"analysis-{job.get('id')}"), ids=ids, phase=1)
+    return _batch_patch(sb, job, state, remaining)
+
+
+def _batch_patch(sb, job: Dict[str, Any], state: Dict[str, Any], remaining: List[str]) -> Dict[str, Any]:
+    active = bool(state.get('name'))
+    patch = {
+        'updated_at': __import__('datetime').datetime.utcnow().isoformat() + 'Z',
+        'status': 'running' if active or remaining else 'done',
+        'remaining_ids': remaining,
+        'batch': state if active or remaining else None,
+    }
+    _patch_job(sb, job['id'], patch)
     return patch
 
 
@@ -632,7 +1189,10 @@ def _process_job_batch(sb, job: Dict[str, Any], batch_size: int = 3) -> Dict[str
 @app.route('/api/cron_analyze', methods=['GET'])
 def cron_analyze():
     try:
+        end = time.time() + _invocation_budget()
         sb = _load_sb()
+        # 백그라운드 작업: analyze_one(대화형)이 돌고 있거나 429가 나면 양보
+        admission.use('bulk', sb)
         now = int(time.time() * 1000)
         # Schedules from supabase table 'schedules'
         # Support both numeric ms column 'runAt' and timestamptz 'run_at'
@@ -667,6 +1227,11 @@ def cron_analyze():
                         row['scope'] = cfg.get('scope', 'all')
                         row['type'] = cfg.get('type', 'analysis')
                         row['remaining_ids'] = cfg.get('remaining_ids') or cfg.get('ids') or []
+                        row['dopamine_mode'] = cfg.get('dopamine_mode')
+                        row['force'] = cfg.get('force')
+                        row['auto'] = cfg.get('auto')
+                        row['mode'] = cfg.get('mode')
+                        row['batch'] = cfg.get('batch')
                         # 시간 조건
                         try:
                             ts = int(run_at)
@@ -687,14 +1252,22 @@ def cron_analyze():
             if rid in seen: continue
             seen.add(rid); unique.append(row)
         due = unique
+        auto = _enqueue_ranking(sb, due, now, iso_now)
+        if auto:
+            due.append(auto)
         if not due:
             return jsonify({ 'ok': True, 'processed': 0 })
 
         processed = 0
         ranking_batch_size = int(os.getenv('RANKING_BATCH_SIZE', '250') or '250')
-        analysis_batch_size = int(os.getenv('ANALYSIS_BATCH_SIZE', '3') or '3')
+        # 동시 분석 수보다 작은 배치는 워커를 놀리게 되므로 최소 그만큼은 가져온다
+        analysis_batch_size = max(int(os.getenv('ANALYSIS_BATCH_SIZE', '3') or '3'), _video_concurrency())
         time_budget_sec = int(os.getenv('RANKING_TIME_BUDGET', '40') or '40')
+        analysis_budget_sec = int(os.getenv('ANALYSIS_TIME_BUDGET', '150') or '150')
         for job in due:
+            # 남은 작업은 다음 틱에서 (status가 pending/running인 채로 남는다)
+            if time.time() >= end:
+                break
             # take lease: set running
             try:
                 sb.table('schedules').update({ 'status': 'running', 'updated_at': __import__('datetime').datetime.utcnow().isoformat() + 'Z' }).eq('id', job['id']).execute()
@@ -711,38 +1284,81 @@ def cron_analyze():
                     sb.table('schedules').update({ 'content': json.dumps(cfg) }).eq('id', job['id']).execute()
                 except Exception:
                     pass
-            if job.get('type') == 'ranking':
-                deadline = time.time() + max(5, time_budget_sec)
-                while time.time() < deadline:
-                    patch = _process_job_batch(sb, job, batch_size=ranking_batch_size)
-                    job['remainingIds'] = patch.get('remainingIds', job.get('remainingIds', []))
-                    job['status'] = patch.get('status', job.get('status'))
-                    if job['status'] == 'done' or not job.get('remainingIds'):
-                        break
-                # chain next job: analysis
-                try:
-                    if job.get('status') == 'done':
-                        now_iso2 = __import__('datetime').datetime.utcnow().isoformat() + 'Z'
-                        cfg = {
-                            'type': 'analysis',
-                            'scope': job.get('scope'),
-                            'remaining_ids': job.get('remaining_ids') or job.get('ids') or [],
-                            'status': 'pending',
-                            'run_at': now_iso2,
-                            'created_at': now_iso2,
-                            'updated_at': now_iso2
-                        }
-                        sb.table('schedules').insert({ 'content': json.dumps(cfg), 'created_at': now_iso2 }).execute()
-                except Exception:
-                    pass
-            else:
-                _process_job_batch(sb, job, batch_size=analysis_batch_size)
+            # 실행 단위 계측: 설정값과 함께 job_metrics에 한 줄로 남긴다
+            metrics.start_run(job.get('id'), job.get('type') or 'analysis', {
+                'ranking_batch_size': ranking_batch_size,
+                'analysis_batch_size': analysis_batch_size,
+                'video_concurrency': _video_concurrency(),
+                'gemini_keys': len(_gemini_keys()),
+                'inflight_cap': _llm_inflight_cap(),
+                'async': _async_enabled(job),
+                'batch': batch.enabled(job),
+                'stream': gemini.stream_enabled(),
+                'cache': gemini.cache_enabled(),
+                'dopamine_mode': resolve_mode(job.get('dopamine_mode')),
+                'force': _force(job),
+            })
+            try:
+                _run_job(sb, job, ranking_batch_size, analysis_batch_size, time_budget_sec, analysis_budget_sec, end)
+            finally:
+                metrics.finish_run(sb)
             processed += 1
         return jsonify({ 'ok': True, 'processed': processed })
     except Exception as e:
         return jsonify({ 'ok': False, 'error': str(e) }), 500
 
 
+def _run_job(sb, job: Dict[str, Any], ranking_batch_size: int, analysis_batch_size: int,
+             time_budget_sec: int, analysis_budget_sec: int, end: float) -> None:
+    # end: the invocation's deadline (epoch seconds), shared by every job of one cron call
+    if job.get('type') == 'ranking':
+        # 분석 작업으로 이어 줄 대상 (배치마다 remaining_ids가 줄어든다)
+        chained_ids = list(job.get('remaining_ids') or job.get('ids') or job.get('remainingIds') or [])
+        deadline = min(time.time() + max(5, time_budget_sec), end)
+        while time.time() < deadline:
+            patch = _process_job_batch(sb, job, batch_size=ranking_batch_size)
+            job['remaining_ids'] = patch.get('remaining_ids', [])
+            job['status'] = patch.get('status', job.get('status'))
+            if job['status'] == 'done' or not job['remaining_ids']:
+                break
+        if job.get('status') == 'done':
+            try:
+                # 오래된 스냅샷 다운샘플링 (hourly -> daily -> weekly)
+                view_history.rollup(sb)
+            except Exception as e:
+                metrics.log('view_snapshots_rollup_failed', error=str(e)[:200])
+        # chain next job: analysis (cron이 직접 등록한 정기 갱신은 조회수만)
+        try:
+            if job.get('status') == 'done' and not job.get('auto'):
+                now_iso2 = __import__('datetime').datetime.utcnow().isoformat() + 'Z'
+                cfg = {
+                    'type': 'analysis',
+                    'scope': job.get('scope'),
+                    'remaining_ids': chained_ids,
+                    'status': 'pending',
+                    'run_at': now_iso2,
+                    'created_at': now_iso2,
+                    'updated_at': now_iso2
+                }
+                sb.table('schedules').insert({ 'content': json.dumps(cfg), 'created_at': now_iso2 }).execute()
+        except Exception:
+            pass
+    elif batch.enabled(job):
+        # Batch API: 제출/확인만 하고 바로 반환 (결과는 이후 cron 틱에서 수거)
+        patch = _run_batch_job(sb, job)
+        job['status'] = patch.get('status')
+    else:
+        # 남은 시간 안에서 새 배치를 계속 시작 (배치 하나가 끝날 때까지는 기다림)
+        # 호출 하나가 시간 제한까지 걸려도 끝낼 수 있을 때만 시작한다
+        deadline = time.time() + max(5, analysis_budget_sec)
+        while end - time.time() >= _batch_reserve():
+            patch = _process_job_batch(sb, job, batch_size=analysis_batch_size)
+            job['remaining_ids'] = patch.get('remaining_ids', [])
+            job['status'] = patch.get('status', job.get('status'))
+            if job['status'] == 'done' or not job['remaining_ids'] or time.time() >= deadline:
+                break
+
+
 @app.route('/health', methods=['GET'])
 def health():
     return ('ok', 200)
@@ -753,6 +1369,7 @@ def health():
 def analyze_one():
     try:
         sb = _load_sb()
+        admission.use('interactive', sb)
         body = {}
         try:
             body = request.get_json(force=True) or {}
@@ -765,10 +1382,12 @@ def analyze_one():
         rows = getattr(row, 'data', []) or []
         if not rows:
             return jsonify({ 'ok': False, 'error': 'not_found' }), 404
-        video = rows[0]
-        updated = _analyze_video(video)
+        video = { 'id': vid, **rows[0] }
+        allowed = set(video.keys())
+        video = analysis_store.load(sb, video)
+        updated = _analyze_video(video, body.get('dopamine_mode'), sb, _force(body))
         if updated:
-            sb.table('videos').update(updated).eq('id', vid).execute()
+            analysis_store.write(sb, video, updated, allowed)
         return jsonify({ 'ok': True, 'updated': bool(updated) })
     except Exception as e:
         return jsonify({ 'ok': False, 'error': str(e) }), 500
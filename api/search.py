@@ -0,0 +1,69 @@
+from typing import Any, Dict, List
+
+from flask import Flask, jsonify, request
+
+import _core as core
+import _pagination as pagination
+import _search_index as search_index
+
+# Ranked keyword search over analysed videos (index: api/_search_index.py):
+#   GET /api/search?q=경제 뉴스&limit=20&offset=0&columns=id,title,channel
+#   -> { ok, rows, next }   rows best first, each with score / matched;
+#                           next = offset of the following page, null at the end
+# Blob columns are refused, as in videos_page.
+
+DEFAULT_COLUMNS = 'id,thumbnail,title,channel,date,views,views_numeric,youtube_url,kr_category_large,kr_category_medium,kr_category_small,material'
+MAX_LIMIT = 100
+
+app = core.cors(Flask(__name__), 'GET, OPTIONS')
+
+
+def _load_sb():
+    sb = core.load_sb(anon=True)
+    # 로그인한 사용자의 토큰으로 조회 (RLS 적용)
+    auth = request.headers.get('Authorization') or ''
+    if auth.lower().startswith('bearer '):
+        sb.postgrest.auth(auth[7:].strip())
+    return sb
+
+
+def _rows(sb, hits: List[Dict[str, Any]], cols: List[str]) -> List[Dict[str, Any]]:
+    # index hits -> videos rows in rank order (rows the caller may not read are skipped)
+    if not hits:
+        return []
+    res = sb.table('videos').select(','.join(cols)).in_('id', [h['video_id'] for h in hits]).execute()
+    by_id = { str(r.get('id')): r for r in (getattr(res, 'data', []) or []) }
+    out = []
+    for h in hits:
+        row = by_id.get(str(h['video_id']))
+        if row is not None:
+            out.append({ **row, 'score': h.get('score'), 'matched': h.get('matched') })
+    return out
+
+
+@app.route('/', methods=['GET', 'OPTIONS'])
+@app.route('/search', methods=['GET', 'OPTIONS'])
+@app.route('/api/search', methods=['GET', 'OPTIONS'])
+def search():
+    if request.method == 'OPTIONS':
+        return ('', 204)
+    try:
+        q = (request.args.get('q') or '').strip()
+        if not q:
+            return jsonify({ 'ok': False, 'error': 'q is required' }), 400
+        cols = pagination.columns(request.args.get('columns') or DEFAULT_COLUMNS)
+        blobs = [c for c in cols if c in pagination.BLOB_COLUMNS]
+        if blobs:
+            return jsonify({ 'ok': False, 'error': f"blob columns are not listed: {','.join(blobs)}" }), 400
+        limit = max(1, min(MAX_LIMIT, int(request.args.get('limit') or '20')))
+        offset = max(0, int(request.args.get('offset') or '0'))
+        sb = _load_sb()
+        if not search_index.available(sb):
+            return jsonify({ 'ok': False, 'error': 'search index not available' }), 503
+        hits = search_index.search(sb, q, limit, offset)
+        nxt = offset + len(hits) if len(hits) == limit else None
+        return jsonify({ 'ok': True, 'rows': _rows(sb, hits, cols), 'next': nxt })
+    except ValueError as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 400
+    except Exception as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 500
@@ -0,0 +1,84 @@
+from typing import Any, Dict, List
+
+from flask import Flask, jsonify, request
+
+import _core as core
+import _embeddings as embeddings
+import _pagination as pagination
+
+# "Find videos like this" (embeddings: api/_embeddings.py):
+#   GET /api/similar?id=<video id>&k=10&columns=id,title,channel
+#   GET /api/similar?q=<free text>&k=10
+#   -> { ok, rows }   rows nearest first, each with similarity (cosine, 1 = same)
+# Blob columns are refused, as in videos_page. q embeds the text (a paid
+# call with the Gemini provider), so it needs a signed-in user's bearer token.
+
+DEFAULT_COLUMNS = 'id,thumbnail,title,channel,date,views,views_numeric,youtube_url,kr_category_large,material'
+MAX_K = 50
+
+app = core.cors(Flask(__name__), 'GET, OPTIONS')
+
+
+def _token() -> str:
+    auth = request.headers.get('Authorization') or ''
+    return auth[7:].strip() if auth.lower().startswith('bearer ') else ''
+
+
+def _load_sb(token: str):
+    sb = core.load_sb(anon=True)
+    # 로그인한 사용자의 토큰으로 조회 (RLS 적용)
+    if token:
+        sb.postgrest.auth(token)
+    return sb
+
+
+def _signed_in(sb, token: str) -> bool:
+    # 토큰이 있는 것만으로는 부족: auth 서버에서 유효한 사용자인지 확인
+    if not token:
+        return False
+    try:
+        return getattr(sb.auth.get_user(token), 'user', None) is not None
+    except Exception:
+        return False
+
+
+def _rows(sb, hits: List[Dict[str, Any]], cols: List[str]) -> List[Dict[str, Any]]:
+    # neighbour ids -> videos rows in distance order
+    if not hits:
+        return []
+    res = sb.table('videos').select(','.join(cols)).in_('id', [h['video_id'] for h in hits]).execute()
+    by_id = { str(r.get('id')): r for r in (getattr(res, 'data', []) or []) }
+    return [{ **by_id[str(h['video_id'])], 'similarity': h.get('similarity') }
+            for h in hits if str(h['video_id']) in by_id]
+
+
+@app.route('/', methods=['GET', 'OPTIONS'])
+@app.route('/similar', methods=['GET', 'OPTIONS'])
+@app.route('/api/similar', methods=['GET', 'OPTIONS'])
+def similar():
+    if request.method == 'OPTIONS':
+        return ('', 204)
+    try:
+        vid = (request.args.get('id') or '').strip()
+        q = (request.args.get('q') or '').strip()
+        if not vid and not q:
+            return jsonify({ 'ok': False, 'error': 'id or q is required' }), 400
+        cols = pagination.columns(request.args.get('columns') or DEFAULT_COLUMNS)
+        blobs = [c for c in cols if c in pagination.BLOB_COLUMNS]
+        if blobs:
+            return jsonify({ 'ok': False, 'error': f"blob columns are not listed: {','.join(blobs)}" }), 400
+        k = max(1, min(MAX_K, int(request.args.get('k') or '10')))
+        token = _token()
+        if not vid and not token:
+            return jsonify({ 'ok': False, 'error': 'sign-in required for q' }), 401
+        sb = _load_sb(token)
+        if not vid and not _signed_in(sb, token):
+            return jsonify({ 'ok': False, 'error': 'sign-in required for q' }), 401
+        if not embeddings.available(sb):
+            return jsonify({ 'ok': False, 'error': 'embeddings not available' }), 503
+        hits = embeddings.similar(sb, vid, k) if vid else embeddings.similar_to_text(sb, q, k)
+        return jsonify({ 'ok': True, 'rows': _rows(sb, hits, cols) })
+    except ValueError as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 400
+    except Exception as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 500
@@ -6,44 +6,24 @@ import time
 from collections import OrderedDict
 from flask import Flask, request, jsonify
 
-try:
-    from yt_dlp import YoutubeDL
-except Exception as e:
-    YoutubeDL = None  # vercel 빌드 실패 시 런타임 에러 메시지 제공
+import _core as core
 
-try:
-    import requests
-except Exception:
-    requests = None
+# youtube_transcript_api is imported on the first request; yt_dlp and requests
+# only on the STT fallback (off by default), never at cold start.
 
-try:
+
+def _transcript_api():
+    # (YouTubeTranscriptApi, WebshareProxyConfig, "no transcript" errors) or (None, None, ())
     # use public exports; avoid importing private module `_errors`
-    from youtube_transcript_api import (
-        YouTubeTranscriptApi,
-        TranscriptsDisabled,
-        NoTranscriptFound,
-        VideoUnavailable,
-    )
-    from youtube_transcript_api.proxies import WebshareProxyConfig
-except Exception:
-    YouTubeTranscriptApi = None
-    WebshareProxyConfig = None
-    class _TranscriptApiImportFallback(Exception):
-        pass
-    TranscriptsDisabled = NoTranscriptFound = VideoUnavailable = _TranscriptApiImportFallback
-
-app = Flask(__name__)
-
-# Basic CORS so frontend (e.g., Vite dev server) can call this API directly
-@app.after_request
-def add_cors_headers(resp):
-    try:
-        resp.headers['Access-Control-Allow-Origin'] = '*'
-        resp.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-        resp.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-    except Exception:
-        pass
-    return resp
+    mod = core.optional('youtube_transcript_api')
+    if mod is None:
+        return None, None, ()
+    proxies = core.optional('youtube_transcript_api.proxies')
+    errors = (mod.NoTranscriptFound, mod.TranscriptsDisabled, mod.VideoUnavailable)
+    return mod.YouTubeTranscriptApi, getattr(proxies, 'WebshareProxyConfig', None), errors
+
+
+app = core.cors(Flask(__name__), 'GET, OPTIONS')
 
 DEFAULT_HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36',
@@ -102,6 +82,9 @@ def _stt_with_deepgram(audio_url: str, preferred_langs: List[str]) -> Dict[str,
         if p.startswith('en'):
             lang = 'en'
             break
+    requests = core.optional('requests')
+    if requests is None:
+        return {}
     payload = { 'url': audio_url }
     resp = requests.post(
         f'https://api.deepgram.com/v1/listen?language={lang}&smart_format=true',
@@ -188,6 +171,7 @@ def _to_plain_text(body: str, ext: str) -> str:
 @app.route('/api/transcript', methods=['GET'])
 def transcript_root():
     try:
+        YouTubeTranscriptApi, WebshareProxyConfig, no_transcript = _transcript_api()
         if YouTubeTranscriptApi is None:
             return jsonify({ 'error': 'youtube_transcript_api not available' }), 500
 
@@ -251,7 +235,7 @@ def transcript_root():
                     fetched = ytt_api.fetch(vid, languages=[lang])
                     if fetched:
                         break
-                except (NoTranscriptFound, TranscriptsDisabled, VideoUnavailable) as e:
+                except no_transcript as e:
                     error_msg = str(e)
                     continue
                 except Exception as e:
@@ -265,7 +249,7 @@ def transcript_root():
             if not fetched:
                 try:
                     fetched = ytt_api.fetch(vid)
-                except (NoTranscriptFound, TranscriptsDisabled, VideoUnavailable) as e:
+                except no_transcript as e:
                     error_msg = str(e)
                     fetched = None
                 except Exception as e:
@@ -280,6 +264,7 @@ def transcript_root():
                 text = '\n'.join([snip.text for snip in fetched if getattr(snip, 'text', '')])
             if not text.strip() and stt_enabled:
                 try:
+                    YoutubeDL = getattr(core.optional('yt_dlp'), 'YoutubeDL', None)
                     if YoutubeDL is None:
                         raise RuntimeError('yt-dlp not available')
                     # keep requests minimal; do not download media
@@ -0,0 +1,82 @@
+from typing import Any, Dict, List
+
+from flask import Flask, jsonify, request
+
+import _core as core
+import _pagination as pagination
+
+# One keyset page of a table, projected to the requested columns, for the
+# admin UI's "all rows" screens:
+#   GET /api/videos_page?columns=id,title,channel&after=<last id>&limit=1000
+#   -> { ok, rows, next }   (next=null once a page comes back empty)
+# Blob columns are refused; the list screens ask for the derived status
+# fields instead, which the database computes (see the videos_status_fields
+# migration) or, before that migration, this endpoint derives page by page.
+
+TABLES = ('videos',)
+
+# derived field -> source columns it is computed from
+DERIVED = {
+    'has_transcript': ('transcript_text',),
+    'is_analyzed': ('dopamine_graph', 'material', 'hooking', 'narrative_structure'),
+}
+
+app = core.cors(Flask(__name__), 'GET, OPTIONS')
+
+
+def _load_sb():
+    sb = core.load_sb(anon=True)
+    # 로그인한 관리자의 토큰으로 조회 (RLS 적용)
+    auth = request.headers.get('Authorization') or ''
+    if auth.lower().startswith('bearer '):
+        sb.postgrest.auth(auth[7:].strip())
+    return sb
+
+
+def _derive(rows: List[Dict[str, Any]], wanted: List[str], sources: List[str]) -> List[Dict[str, Any]]:
+    # computed fields are missing in the database: reduce the source columns here, one page at a time
+    for r in rows:
+        if 'has_transcript' in wanted:
+            r['has_transcript'] = bool(str(r.get('transcript_text') or '').strip())
+        if 'is_analyzed' in wanted:
+            graph = r.get('dopamine_graph')
+            r['is_analyzed'] = bool((isinstance(graph, list) and graph) or r.get('material')
+                                    or r.get('hooking') or r.get('narrative_structure'))
+        for c in sources:
+            r.pop(c, None)
+    return rows
+
+
+@app.route('/', methods=['GET', 'OPTIONS'])
+@app.route('/videos_page', methods=['GET', 'OPTIONS'])
+@app.route('/api/videos_page', methods=['GET', 'OPTIONS'])
+def videos_page():
+    if request.method == 'OPTIONS':
+        return ('', 204)
+    try:
+        table = request.args.get('table') or 'videos'
+        if table not in TABLES:
+            return jsonify({ 'ok': False, 'error': f'table not allowed: {table}' }), 400
+        cols = pagination.columns(request.args.get('columns') or 'id')
+        blobs = [c for c in cols if c in pagination.BLOB_COLUMNS]
+        if blobs:
+            return jsonify({ 'ok': False, 'error': f"blob columns are not listed: {','.join(blobs)}" }), 400
+        limit = max(1, min(pagination.page_size(), int(request.args.get('limit') or pagination.page_size())))
+        after = request.args.get('after') or None
+        sb = _load_sb()
+        try:
+            rows, nxt = pagination.page(sb, table, cols, after, limit)
+        except Exception:
+            wanted = [c for c in cols if c in DERIVED]
+            if not wanted:
+                raise
+            # 마이그레이션 전: 원본 컬럼을 읽어 이 페이지만 계산 (페이지를 줄여 메모리 제한)
+            sources = [s for c in wanted for s in DERIVED[c] if s not in cols]
+            plain = [c for c in cols if c not in DERIVED] + sources
+            rows, nxt = pagination.page(sb, table, plain, after, min(limit, 200))
+            rows = _derive(rows, wanted, sources)
+        return jsonify({ 'ok': True, 'rows': rows, 'next': nxt })
+    except ValueError as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 400
+    except Exception as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 500
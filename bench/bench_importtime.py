@@ -0,0 +1,113 @@
+import argparse
+import glob
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Tuple
+
+# Cold-start gate for the Vercel functions: imports every api/*.py entry point
+# in a fresh interpreter under `python -X importtime` and fails when
+#   - an entry point's import time (median of --runs) exceeds its budget, or
+#   - a module that should only load on first use (HEAVY) shows up at import,
+#   - or one entry point imports another (each one is deployed on its own).
+#
+#   python bench/bench_importtime.py
+#   python bench/bench_importtime.py --runs 9 --budget-ms 300 --budget cron_analyze=450 --json out.json
+
+API = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+
+# imported lazily through _core.optional(); never at module load
+HEAVY = ('supabase', 'httpx', 'youtube_transcript_api', 'yt_dlp')
+
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def entry_points() -> List[str]:
+    return sorted(os.path.basename(p)[:-3] for p in glob.glob(os.path.join(API, '*.py'))
+                  if not os.path.basename(p).startswith('_'))
+
+
+def parse(stderr: str) -> List[Tuple[int, int, int, str]]:
+    # (self us, cumulative us, depth, module)
+    out = []
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            out.append((int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2, m.group(4)))
+    return out
+
+
+def import_once(name: str) -> List[Tuple[int, int, int, str]]:
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (API, env.get('PYTHONPATH')) if p)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {name}'],
+                          cwd=API, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        tail = [l for l in proc.stderr.splitlines() if not l.startswith('import time:')][-3:]
+        raise RuntimeError(f'import {name} failed: ' + ' | '.join(tail))
+    return parse(proc.stderr)
+
+
+def measure(name: str, runs: int) -> Dict[str, Any]:
+    # first run warms the bytecode cache (Vercel ships .pyc too); it is not counted
+    import_once(name)
+    totals, rows = [], []
+    for _ in range(max(1, runs)):
+        rows = import_once(name)
+        totals.append(next((cum for _, cum, _, mod in rows if mod == name), 0) / 1000)
+    packages: Dict[str, int] = {}
+    for self_us, _, _, mod in rows:
+        top = mod.split('.')[0]
+        packages[top] = packages.get(top, 0) + self_us
+    loaded = { mod.split('.')[0] for *_, mod in rows }
+    return {
+        'entry': name,
+        'median_ms': round(statistics.median(totals), 1),
+        'max_ms': round(max(totals), 1),
+        'heaviest': [(p, round(us / 1000, 1)) for p, us in sorted(packages.items(), key=lambda kv: -kv[1])[:5]],
+        'heavy_loaded': sorted(loaded & set(HEAVY)),
+        'entries_loaded': sorted(loaded & (set(entry_points()) - { name })),
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='Cold-start import time gate for the api/*.py entry points')
+    ap.add_argument('--entries', nargs='*', default=None, help='entry modules (default: every api/*.py)')
+    ap.add_argument('--runs', type=int, default=5)
+    ap.add_argument('--budget-ms', type=float, default=float(os.getenv('IMPORT_BUDGET_MS') or '500'))
+    ap.add_argument('--budget', action='append', default=[], help='per entry budget, e.g. cron_analyze=600')
+    ap.add_argument('--json', help='write results to this path')
+    args = ap.parse_args(argv)
+
+    budgets = { k: float(v) for k, v in (b.split('=', 1) for b in args.budget) }
+    results, failures = [], []
+    for name in args.entries or entry_points():
+        try:
+            r = measure(name, args.runs)
+        except RuntimeError as e:
+            failures.append(str(e))
+            continue
+        r['budget_ms'] = budgets.get(name, args.budget_ms)
+        results.append(r)
+        heaviest = ', '.join(f'{p} {ms}ms' for p, ms in r['heaviest'])
+        print(f"{name:<14} median {r['median_ms']:>7.1f}ms  max {r['max_ms']:>7.1f}ms  budget {r['budget_ms']:.0f}ms  [{heaviest}]")
+        if r['median_ms'] > r['budget_ms']:
+            failures.append(f"{name}: {r['median_ms']}ms over budget {r['budget_ms']:.0f}ms")
+        if r['heavy_loaded']:
+            failures.append(f"{name}: imports {', '.join(r['heavy_loaded'])} at module load (use _core.optional)")
+        if r['entries_loaded']:
+            failures.append(f"{name}: imports entry point {', '.join(r['entries_loaded'])}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump({ 'results': results, 'failures': failures }, fh, indent=2)
+    for f in failures:
+        print('FAIL', f)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
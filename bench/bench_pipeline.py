@@ -0,0 +1,351 @@
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'api'))
+sys.path.insert(0, HERE)
+
+from stubs import FakeSupabase, GeminiStub, Knobs, make_transcript, transcript_api  # noqa: E402
+
+# Offline load test of the analysis pipeline against bench/stubs.py: no
+# Gemini quota, YouTube or Supabase needed. Each scenario is one mode at one
+# concurrency setting; the report has per-video wall time, Gemini calls per
+# video and throughput, and can be saved / compared against a previous run.
+#
+#   python bench/bench_pipeline.py --videos 24 --concurrency 1 4 8 --json out.json
+#   python bench/bench_pipeline.py --latency-ms 1500 --rate-429 0.1 --compare out.json
+#
+# modes:
+#   analyze_video       cron_analyze._analyze_video, N videos on `concurrency` threads
+#   analyze_video_fast  analyze_one's single-call fallback path, same fan-out
+#   job_batch           cron_analyze._process_job_batch (ANALYSIS_VIDEO_CONCURRENCY)
+#   job_batch_async     same, asyncio path over httpx (PostgREST served by the stub)
+#   batch_api           Batch API job mode: cron ticks every --tick-ms until the job is
+#                       done; per-video time is submission -> results stored
+#   transcript_root     api/transcript.py handler with a fake YouTubeTranscriptApi
+
+MODES = ('analyze_video', 'analyze_video_fast', 'job_batch', 'job_batch_async', 'batch_api', 'transcript_root')
+
+VIDEO_COLUMNS = (
+    'title', 'youtube_url', 'transcript_text', 'analysis_full', 'dopamine_graph', 'analysis_transcript_len',
+    'hooking', 'narrative_structure', 'material', 'material_main_idea', 'material_core_materials',
+    'material_lang_patterns', 'material_emotion_points', 'material_info_delivery',
+    'kr_category_large', 'kr_category_medium', 'kr_category_small', 'en_category_main', 'en_category_sub',
+    'en_micro_topic', 'cn_category_large', 'cn_category_medium', 'cn_category_small',
+    'keywords_ko', 'keywords_en', 'keywords_zh',
+)
+
+
+def video_rows(n: int, chars: int, prefix: str, fetch: bool, punctuated: bool = True) -> List[Dict[str, Any]]:
+    rows = []
+    for i in range(n):
+        vid = f'{prefix}{i:04d}'
+        row = { c: None for c in VIDEO_COLUMNS }
+        row.update({
+            'id': vid,
+            'title': f'bench video {i}',
+            'youtube_url': f'https://www.youtube.com/shorts/{vid}',
+            'transcript_text': '' if fetch else make_transcript(chars, seed=i, punctuated=punctuated),
+        })
+        rows.append(row)
+    return rows
+
+
+def _pct(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    s = sorted(values)
+    return round(s[min(len(s) - 1, int(q * len(s)))], 1)
+
+
+def _reset_pool() -> None:
+    # key pool, in-flight semaphore and admission state are per process; rebuild for each scenario
+    import _admission as admission
+    import _gemini as gemini
+    admission._state.update(interactive_until=0.0, cooldown_until=0.0, strikes=0)
+    gemini._keys_cache = []
+    gemini._slots = None
+    gemini._shared_caches.clear()
+    gemini._shared_failed.clear()
+
+
+def _load_fast():
+    return importlib.import_module('analyze_one')._analyze_video_fast
+
+
+class Timer:
+    # wraps a per-video function and keeps each call's wall time
+    def __init__(self):
+        self.ms: List[float] = []
+        self.errors: List[str] = []
+
+    def wrap(self, fn: Callable) -> Callable:
+        def run(*args, **kwargs):
+            t0 = time.time()
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                self.errors.append(str(e)[:200])
+                raise
+            finally:
+                self.ms.append((time.time() - t0) * 1000)
+        return run
+
+    def wrap_async(self, fn: Callable) -> Callable:
+        async def run(*args, **kwargs):
+            t0 = time.time()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                self.errors.append(str(e)[:200])
+                raise
+            finally:
+                self.ms.append((time.time() - t0) * 1000)
+        return run
+
+
+@contextlib.contextmanager
+def patched(obj, name: str, value):
+    old = getattr(obj, name)
+    setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        setattr(obj, name, old)
+
+
+def _fan_out(fn: Callable, rows: List[Dict[str, Any]], concurrency: int, timer: Timer) -> None:
+    run = timer.wrap(fn)
+
+    def one(row):
+        try:
+            run(dict(row))
+        except Exception:
+            pass
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as ex:
+        list(ex.map(one, rows))
+
+
+def run_mode(mode: str, rows: List[Dict[str, Any]], sb: FakeSupabase, concurrency: int,
+             args, knobs: Knobs) -> Timer:
+    timer = Timer()
+    os.environ['ANALYSIS_VIDEO_CONCURRENCY'] = str(concurrency)
+    import _admission as admission
+    admission.use('interactive' if mode in ('analyze_video_fast', 'transcript_root') else 'bulk')
+    if mode == 'analyze_video_fast':
+        _fan_out(_load_fast(), rows, concurrency, timer)
+        return timer
+    if mode == 'transcript_root':
+        return run_transcript(rows, concurrency, args, knobs, timer)
+
+    import cron_analyze as cron
+    fake_api = transcript_api(knobs, args.transcript_chars, not args.unpunctuated)
+    with patched(cron, '_transcript_api', lambda: fake_api):
+        if mode == 'analyze_video':
+            _fan_out(lambda row: cron._analyze_video(row, args.dopamine_mode), rows, concurrency, timer)
+        elif mode == 'job_batch':
+            job = { 'id': 'bench', 'type': 'analysis', 'remaining_ids': [r['id'] for r in rows],
+                    'dopamine_mode': args.dopamine_mode }
+            with patched(cron, '_analyze_video', timer.wrap(cron._analyze_video)):
+                cron._process_job_batch(sb, job, batch_size=len(rows))
+        elif mode == 'job_batch_async':
+            if cron._httpx() is None:
+                raise RuntimeError('httpx not installed')
+            job = { 'id': 'bench', 'type': 'analysis', 'async': True, 'remaining_ids': [r['id'] for r in rows],
+                    'dopamine_mode': args.dopamine_mode }
+            with patched(cron, '_analyze_video_async', timer.wrap_async(cron._analyze_video_async)):
+                cron._process_job_batch(sb, job, batch_size=len(rows))
+        elif mode == 'batch_api':
+            run_batch_api(cron, rows, sb, args, timer)
+    return timer
+
+
+def run_batch_api(cron, rows, sb: FakeSupabase, args, timer: Timer) -> None:
+    sb.tables['schedules'] = [{ 'id': 'bench', 'status': 'running', 'type': 'analysis', 'mode': 'batch',
+                                'remaining_ids': [r['id'] for r in rows], 'batch': None,
+                                'dopamine_mode': args.dopamine_mode }]
+    store = cron._batch_store
+    t0 = time.time()
+
+    def stored(*a, **k):
+        try:
+            return store(*a, **k)
+        finally:
+            timer.ms.append((time.time() - t0) * 1000)
+
+    deadline = t0 + 600
+    with patched(cron, '_batch_store', stored):
+        while sb.tables['schedules'][0]['status'] != 'done' and time.time() < deadline:
+            cron._run_job(sb, dict(sb.tables['schedules'][0]), 0, 0, 0, 0, deadline)
+            time.sleep(args.tick_ms / 1000)
+
+
+def run_transcript(rows, concurrency: int, args, knobs: Knobs, timer: Timer) -> Timer:
+    import transcript
+    transcript._cache = transcript._LRUCache(transcript._CACHE_MAX)
+    fake_api = transcript_api(knobs, args.transcript_chars, not args.unpunctuated)
+
+    def one(row):
+        with transcript.app.test_request_context(f"/api/transcript?url={row['youtube_url']}&lang=ko,en"):
+            resp, status = transcript.transcript_root()
+        if status != 200:
+            raise RuntimeError(f'status {status}')
+
+    with patched(transcript, '_transcript_api', lambda: (fake_api, None, ())):
+        _fan_out(lambda row: one(row), rows, concurrency, timer)
+    return timer
+
+
+def scenario(mode: str, concurrency: int, args, stub: GeminiStub, index: int) -> Dict[str, Any]:
+    import _metrics as metrics
+    rows = video_rows(args.videos, args.transcript_chars, f'v{index:02d}_', args.fetch_transcripts,
+                      not args.unpunctuated)
+    stub.sb.tables['videos'] = [dict(r) for r in rows]
+    stub.reset()
+    _reset_pool()
+    metrics.start_run('bench', mode, { 'concurrency': concurrency })
+    quiet = io.StringIO()
+    t0 = time.time()
+    error = None
+    try:
+        # the pipeline prints progress; keep the report readable
+        with contextlib.redirect_stdout(quiet if not args.verbose else sys.stdout):
+            timer = run_mode(mode, rows, stub.sb, concurrency, args, stub.knobs)
+    except Exception as e:
+        timer, error = Timer(), str(e)[:200]
+    wall = time.time() - t0
+    run = metrics.finish_run()
+    counts = stub.snapshot()
+    calls = counts.get('generate', 0) + counts.get('stream', 0) + counts.get('batch_request', 0)
+    n = max(1, len(timer.ms))
+    ok = len(timer.ms) - len(timer.errors)
+    return {
+        'mode': mode,
+        'concurrency': concurrency,
+        'videos': len(timer.ms),
+        'ok': ok,
+        'errors': len(timer.errors),
+        'error': error or (timer.errors[0] if timer.errors else None),
+        'wall_s': round(wall, 2),
+        'videos_per_min': round(ok / wall * 60, 2) if wall > 0 else 0.0,
+        'per_video_ms': {
+            'avg': round(sum(timer.ms) / n, 1) if timer.ms else None,
+            'p50': _pct(timer.ms, 0.5),
+            'p95': _pct(timer.ms, 0.95),
+            'max': round(max(timer.ms), 1) if timer.ms else None,
+        },
+        'calls_per_video': round(calls / n, 2),
+        'http_429': counts.get('http_429', 0),
+        'retries': run.get('retries', 0),
+        'cache_creates': counts.get('cache_create', 0),
+        'cache_hits': counts.get('cache_hit', 0),
+        'streams_cancelled': counts.get('stream_cancelled', 0),
+        'prompt_tokens_per_video': round(run.get('prompt_tokens', 0) / n),
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], threshold: float) -> List[str]:
+    # throughput down, p95 up or more calls per video by more than `threshold` is a regression
+    base = { (r['mode'], r['concurrency']): r for r in baseline }
+    out = []
+    for r in results:
+        b = base.get((r['mode'], r['concurrency']))
+        if not b or r.get('error') and not r['videos']:
+            continue
+        tag = f"{r['mode']}@{r['concurrency']}"
+        if b['videos_per_min'] and r['videos_per_min'] < b['videos_per_min'] * (1 - threshold):
+            out.append(f"{tag}: videos/min {b['videos_per_min']} -> {r['videos_per_min']}")
+        bp, rp = b['per_video_ms'].get('p95'), r['per_video_ms'].get('p95')
+        if bp and rp and rp > bp * (1 + threshold):
+            out.append(f'{tag}: p95 per video {bp}ms -> {rp}ms')
+        if b['calls_per_video'] and r['calls_per_video'] > b['calls_per_video'] * (1 + threshold):
+            out.append(f"{tag}: calls/video {b['calls_per_video']} -> {r['calls_per_video']}")
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--modes', nargs='+', choices=MODES, default=['analyze_video', 'analyze_video_fast', 'job_batch'])
+    ap.add_argument('--videos', type=int, default=12)
+    ap.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    ap.add_argument('--keys', type=int, default=4, help='size of the fake Gemini key pool')
+    ap.add_argument('--inflight', type=int, default=0, help='GEMINI_MAX_INFLIGHT (0 = per-key default)')
+    ap.add_argument('--latency-ms', type=float, default=800)
+    ap.add_argument('--jitter-ms', type=float, default=200)
+    ap.add_argument('--rate-429', type=float, default=0.0)
+    ap.add_argument('--sb-latency-ms', type=float, default=20)
+    ap.add_argument('--transcript-latency-ms', type=float, default=300)
+    ap.add_argument('--transcript-chars', type=int, default=3000)
+    ap.add_argument('--unpunctuated', action='store_true',
+                    help='auto-caption transcripts: no punctuation or line breaks (one "sentence")')
+    ap.add_argument('--batch-delay-ms', type=float, default=2000, help='stub batch turnaround')
+    ap.add_argument('--tick-ms', type=float, default=1000, help='cron interval for batch_api')
+    ap.add_argument('--fetch-transcripts', action='store_true', help='rows start without transcript_text')
+    ap.add_argument('--dopamine-mode', default=None)
+    ap.add_argument('--no-stream', action='store_true')
+    ap.add_argument('--no-cache', action='store_true')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--json', help='write results to this file')
+    ap.add_argument('--compare', help='baseline JSON from an earlier --json run')
+    ap.add_argument('--threshold', type=float, default=0.15)
+    ap.add_argument('--verbose', action='store_true')
+    args = ap.parse_args()
+
+    knobs = Knobs(args.latency_ms, args.jitter_ms, args.rate_429, sb_latency_ms=args.sb_latency_ms,
+                  transcript_latency_ms=args.transcript_latency_ms, batch_delay_ms=args.batch_delay_ms, seed=args.seed)
+    stub = GeminiStub(knobs, FakeSupabase(latency_ms=args.sb_latency_ms)).start()
+    os.environ.update({
+        'GEMINI_API_BASE': stub.url,
+        'GEMINI_API_KEYS': ','.join(f'bench-key-{i + 1}' for i in range(max(1, args.keys))),
+        'SUPABASE_URL': stub.url,
+        'SUPABASE_SERVICE_ROLE_KEY': 'bench',
+        'METRICS_LOG': '0',
+        'GEMINI_STREAM': '0' if args.no_stream else '1',
+        'GEMINI_CACHE': '0' if args.no_cache else '1',
+        # synthetic transcripts reshuffle the same dozen lines: every video would donate to the next
+        'DEDUP': '0',
+    })
+    if args.inflight:
+        os.environ['GEMINI_MAX_INFLIGHT'] = str(args.inflight)
+
+    results = []
+    try:
+        i = 0
+        for mode in args.modes:
+            for c in args.concurrency:
+                r = scenario(mode, c, args, stub, i)
+                i += 1
+                results.append(r)
+                pv = r['per_video_ms']
+                print(f"{mode:<20} c={c:<3} {r['ok']:>3}/{r['videos']:<3} ok  wall {r['wall_s']:>7.2f}s  "
+                      f"{r['videos_per_min']:>7.2f} videos/min  per video p50 {pv['p50']}ms p95 {pv['p95']}ms  "
+                      f"{r['calls_per_video']:>5.2f} calls/video  429s {r['http_429']}"
+                      + (f"  error: {r['error']}" if r['error'] else ''))
+    finally:
+        stub.stop()
+
+    out = { 'knobs': knobs.as_dict(), 'videos': args.videos, 'keys': args.keys, 'results': results }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(out, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f).get('results') or []
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print('REGRESSION', line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+from _sentences import _segment, split_sentences  # noqa: E402
+
+# Micro-benchmark: shared segmenter vs the two splitters it replaced.
+#
+#   python bench/bench_sentences.py --sizes 10000 100000 1000000 --json out.json
+
+
+def legacy_split_sentences(text):
+    # cron_analyze._split_sentences before the shared segmenter
+    if not text:
+        return []
+    normalized = text.replace('\r', '\n')
+    while '\n\n' in normalized:
+        normalized = normalized.replace('\n\n', '\n')
+    normalized = normalized.replace('>>', ' ')
+    lines = [l.strip() for l in normalized.split('\n') if l.strip() and not l.strip().isdigit()]
+    joined = '\n'.join(lines).replace('\n', ' ')
+    out = []
+    buff = ''
+    for ch in joined:
+        buff += ch
+        if ch in '.?!…':
+            if buff.strip():
+                out.append(buff.strip())
+            buff = ''
+    if buff.strip():
+        out.append(buff.strip())
+    return out
+
+
+def legacy_clean_sentences_ko(text):
+    # analyze_one._clean_sentences_ko before the shared segmenter
+    t = re.sub(r"\[[^\]]*\]", " ", text or '')
+    t = re.sub(r"^\s*>>.*", " ", t, flags=re.MULTILINE)
+    t = re.sub(r"\b(음악|박수|웃음|침묵|배경음|기침)\b", " ", t, flags=re.IGNORECASE)
+    t = t.replace('\r', '\n')
+    t = re.sub(r"\n{2,}", "\n", t)
+    t = re.sub(r"[\t ]{2,}", " ", t)
+    t = re.sub(r"(요|다|죠|네|습니다|습니까|네요|군요)([.!?])", r"\1\2\n", t)
+    parts = [p.strip() for p in re.split(r"(?<=[.!?…]|\n)\s+", t) if p and p.strip()]
+    out, buf = [], ''
+    for p in parts:
+        cur = (buf + ' ' + p).strip() if buf else p
+        if len(cur) < 10:
+            buf = cur
+            continue
+        out.append(cur)
+        buf = ''
+    if buf:
+        out.append(buf)
+    return [s for s in out if len(re.sub(r"[^\w\d가-힣]", "", s)) >= 3][:300]
+
+
+_WORDS = ['오늘은', '정말', '놀라운', '이야기를', '해드릴게요', '그런데', '갑자기', '3.5배나', '비싼', '가격이었죠',
+          '여러분', '왜', '이런', '일이', '생겼을까요', '충격적인', '반전이', '있었습니다', '"멈춰!"라고', '말했다']
+_ENDS = ['.', '?', '!', '...', '…', '', '']
+
+
+def make_transcript(chars: int, seed: int = 7) -> str:
+    rnd = random.Random(seed)
+    lines = []
+    size = 0
+    while size < chars:
+        line = ' '.join(rnd.choice(_WORDS) for _ in range(rnd.randint(3, 9))) + rnd.choice(_ENDS)
+        if rnd.random() < 0.05:
+            line = '[음악]'
+        if rnd.random() < 0.05:
+            line = '>> ' + line
+        lines.append(line)
+        size += len(line) + 1
+    return '\n'.join(lines)
+
+
+def _time(fn, text, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(sizes, repeat, legacy_max):
+    rows = []
+    for n in sizes:
+        cases = {
+            'captions': make_transcript(n),
+            'blank_lines': 'a' + '\n' * n + 'b.',
+            # unclosed punctuation runs: must stay linear (no rescan from every '!' / '.')
+            'punct_run': '!' * (n // 2) + '"' * (n // 2) + 'x',
+            'dot_run': 'a' + '.' * n + 'b',
+        }
+        for name, text in cases.items():
+            row = { 'case': name, 'chars': len(text) }
+            # legacy _clean_sentences_ko is quadratic on runs of blank lines; skip it past legacy_max
+            slow_ok = name != 'blank_lines' or len(text) <= legacy_max
+            row['legacy_split_ms'] = round(_time(legacy_split_sentences, text, repeat) * 1000, 2)
+            row['legacy_clean_ko_ms'] = round(_time(legacy_clean_sentences_ko, text, repeat) * 1000, 2) if slow_ok else None
+
+            def cold(t):
+                _segment.cache_clear()
+                return split_sentences(t)
+            row['shared_cold_ms'] = round(_time(cold, text, repeat) * 1000, 2)
+            split_sentences(text)
+            row['shared_memo_ms'] = round(_time(split_sentences, text, repeat) * 1000, 3)
+            row['sentences'] = len(split_sentences(text))
+            rows.append(row)
+    return rows
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='sentence splitter micro-benchmark')
+    ap.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 500000])
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--legacy-max', type=int, default=20000, help='largest blank-line case to run the quadratic legacy splitter on')
+    ap.add_argument('--json', help='write results to this file')
+    args = ap.parse_args(argv)
+    rows = run(args.sizes, args.repeat, args.legacy_max)
+    cols = ['case', 'chars', 'legacy_split_ms', 'legacy_clean_ko_ms', 'shared_cold_ms', 'shared_memo_ms', 'sentences']
+    print('  '.join(f'{c:>18}' for c in cols))
+    for r in rows:
+        print('  '.join(f'{str(r[c]):>18}' for c in cols))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump(rows, fh, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,588 @@
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-ins for the services the analysis pipeline talks to, so it can
+# be load-tested without spending quota:
+#   GeminiStub     HTTP server for generateContent / streamGenerateContent /
+#                  cachedContents, plus PostgREST /rest/v1/<table> for the
+#                  async path, and the Files/Batch API (upload, batchGenerateContent,
+#                  poll, download); latency, jitter and 429 rate are configurable
+#   FakeSupabase   in-memory sb.table(...).select().eq()...execute() chain
+#   transcript_api YouTubeTranscriptApi replacement with fetch latency
+# Used by bench/bench_pipeline.py; point the code at the stub with
+# GEMINI_API_BASE / SUPABASE_URL before importing it.
+
+_LINES = [
+    '여러분 이거 진짜 믿기 힘든 이야기인데요.',
+    '어느 날 한 남자가 공원 벤치에서 낡은 가방을 발견했습니다.',
+    '가방 안에는 아무도 예상하지 못한 물건이 들어 있었죠.',
+    '그는 경찰에 신고할지 한참을 고민했습니다.',
+    '그런데 바로 그때 누군가 그의 어깨를 두드렸어요!',
+    '알고 보니 가방의 주인은 십 년 전에 헤어진 친구였습니다.',
+    '두 사람은 그 자리에서 한참 동안 아무 말도 하지 못했죠.',
+    '왜 그 가방이 하필 그 벤치에 있었을까요?',
+    '친구는 매년 같은 날 그곳에 가방을 두고 갔다고 합니다.',
+    '언젠가 그가 찾아 주기를 바라면서요.',
+    '이 이야기는 SNS에서 삼백만 번 넘게 공유됐습니다.',
+    '여러분이라면 그 가방을 열어 보셨을까요?',
+]
+
+
+def make_transcript(chars: int, seed: int = 0, punctuated: bool = True) -> str:
+    # punctuated=False: auto-caption shape, one unpunctuated run without line breaks
+    rnd = random.Random(seed)
+    out: List[str] = []
+    n = 0
+    while n < chars:
+        line = rnd.choice(_LINES)
+        out.append(line)
+        n += len(line) + 1
+    if not punctuated:
+        return re.sub(r'[.?!,"]', '', ' '.join(out))
+    return '\n'.join(out)
+
+
+# ---- canned Gemini answers --------------------------------------------------
+
+_MATERIAL = {
+    'main_idea': '잊혀진 약속이 십 년 만에 우연처럼 이루어진다.',
+    'core_materials': ['낡은 가방', '공원 벤치', '십 년 만의 재회'],
+    'lang_patterns': ['여러분이라면?', '알고 보니', '바로 그때'],
+    'emotion_points': ['발견의 긴장', '재회의 반전', '기다림의 여운'],
+    'info_delivery': ['질문형 도입', '시간 순 서술', '수치 인용'],
+}
+_COMBINED = {
+    'material': '공원 벤치에서 발견한 가방을 계기로 십 년 전 친구와 재회하는 이야기. 발견, 고민, 반전, 재회 순으로 전개된다.',
+    'hooking': '"믿기 힘든 이야기"라는 선언으로 결말에 대한 궁금증을 만든다.',
+    'structure': '기: 가방 발견, 승: 신고 고민, 전: 주인의 등장, 결: 십 년 만의 재회',
+}
+_HOOK = '| 🤔 후킹 요약 | 패턴(분류) |\n| :--- | :--- |\n| 믿기 힘든 이야기라고 먼저 선언 | 의문제시/과장 |'
+_STRUCT = (
+    '| 구분 | 요약 |\n| :--- | :--- |\n| 기 (상황 도입) | 벤치에서 가방을 발견한다 |\n'
+    '| 승 (사건 전개) | 신고할지 고민한다 |\n| 전 (위기/전환) | 가방 주인이 나타난다 |\n| 결 (결말) | 오랜 친구와 재회한다 |'
+)
+_TAXONOMY = {
+    'kr_category_large': '라이프', 'kr_category_medium': '감동 실화', 'kr_category_small': '재회',
+    'en_category_main': 'Lifestyle', 'en_category_sub': 'True Story', 'en_micro_topic': 'Reunion',
+    'cn_category_large': '生活', 'cn_category_medium': '真实故事', 'cn_category_small': '重逢',
+    'ko': ['공원 가방', '십 년 재회', '감동 실화'], 'en': ['lost bag', 'reunion'], 'zh': ['重逢', '真实故事'],
+}
+
+
+def _dopamine(prompt: str) -> str:
+    try:
+        arr = json.loads(prompt.split('문장 배열:\n', 1)[1].split('\n\n', 1)[0])
+    except Exception:
+        arr = []
+    return json.dumps([
+        { 'sentence': s, 'level': 3 + (len(s) % 7), 'reason': '궁금증 유발' } for s in arr
+    ], ensure_ascii=False)
+
+
+def canned(prompt: str) -> str:
+    # answer shaped like what the real model returns for each pipeline prompt
+    if '문장 배열:' in prompt:
+        return _dopamine(prompt)
+    if '긴 영상 대본의 한 구간' in prompt:
+        return '한 남자가 가방을 발견하고 고민하다가 주인과 재회한다. "바로 그때 누군가 어깨를 두드렸어요!"'
+    if '"material"' in prompt and '"structure"' in prompt:
+        return json.dumps(_COMBINED, ensure_ascii=False)
+    if '"main_idea"' in prompt:
+        return json.dumps(_MATERIAL, ensure_ascii=False)
+    if '메인 아이디어만' in prompt:
+        return _MATERIAL['main_idea']
+    if 'JSON 배열로' in prompt or '나열하세요' in prompt or '찾아주세요' in prompt:
+        return json.dumps(_MATERIAL['core_materials'], ensure_ascii=False)
+    if '후킹 프롬프트' in prompt:
+        return _HOOK
+    if '기승전결 프롬프트' in prompt:
+        return _STRUCT
+    if '룰루 GPTs' in prompt:
+        return '✨ 룰루 GPTs 분석 템플릿 적용 결과\n\n1. 대본 기승전결 분석\n' + _STRUCT
+    if '"kr_category_large"' in prompt:
+        return json.dumps(_TAXONOMY, ensure_ascii=False)
+    return 'OK'
+
+
+# ---- Gemini / PostgREST stand-in ---------------------------------------------
+
+class Knobs:
+    # latency_ms is the full response time; streamed answers send their first
+    # chunk after ttft_share of it and spread the rest over stream_chunks
+    def __init__(self, latency_ms: float = 800, jitter_ms: float = 200, rate_429: float = 0.0,
+                 ttft_share: float = 0.3, stream_chunks: int = 6, sb_latency_ms: float = 20,
+                 transcript_latency_ms: float = 300, batch_delay_ms: float = 2000, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.ttft_share = ttft_share
+        self.stream_chunks = max(1, stream_chunks)
+        self.sb_latency_ms = sb_latency_ms
+        self.transcript_latency_ms = transcript_latency_ms
+        self.batch_delay_ms = batch_delay_ms
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def latency(self) -> float:
+        with self.lock:
+            return max(0.0, self.latency_ms + self.rnd.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def throttled(self) -> bool:
+        with self.lock:
+            return self.rnd.random() < self.rate_429
+
+    def as_dict(self) -> Dict[str, Any]:
+        return { k: v for k, v in vars(self).items() if k not in ('rnd', 'lock') }
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 2)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status: int, body: Any) -> None:
+        raw = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _body(self) -> Any:
+        n = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(n) if n else b''
+        try:
+            return json.loads(raw or b'null')
+        except Exception:
+            return None
+
+    # -- routing --
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.startswith('/rest/v1/'):
+            return self._rest_get(url)
+        if url.path.startswith('/v1beta/batches/'):
+            return self._json(200, self.server.stub.batch_status(url.path[len('/v1beta/'):]))
+        if url.path.startswith('/download/v1beta/'):
+            name = url.path[len('/download/v1beta/'):].split(':', 1)[0]
+            raw = self.server.stub.files.get(name, '').encode('utf-8')
+            self.send_response(200 if name in self.server.stub.files else 404)
+            self.send_header('Content-Type', 'application/jsonl; charset=utf-8')
+            self.send_header('Content-Length', str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+            return
+        self._json(404, { 'error': 'not found' })
+
+    def do_PATCH(self):
+        url = urlparse(self.path)
+        if url.path.startswith('/rest/v1/'):
+            return self._rest_patch(url)
+        self._json(404, { 'error': 'not found' })
+
+    def do_DELETE(self):
+        self.server.stub.count('cache_delete')
+        self._json(200, {})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        stub = self.server.stub
+        if url.path.startswith('/upload/'):
+            return self._upload(url)
+        if url.path.startswith('/rest/v1/'):
+            return self._rest_post(url)
+        body = self._body() or {}
+        if url.path.endswith(':batchGenerateContent'):
+            src = ((body.get('batch') or {}).get('input_config') or {}).get('file_name')
+            return self._json(200, stub.add_batch(src))
+        if url.path.endswith('/cachedContents'):
+            return self._cache_create(body)
+        m = re.search(r':(generateContent|streamGenerateContent)$', url.path)
+        if not m:
+            return self._json(404, { 'error': { 'code': 404, 'message': 'unknown method' } })
+        stream = m.group(1) == 'streamGenerateContent'
+        delay = stub.knobs.latency()
+        if stub.knobs.throttled():
+            stub.count('http_429')
+            time.sleep(min(delay, 0.05))
+            return self._json(429, { 'error': { 'code': 429, 'status': 'RESOURCE_EXHAUSTED' } })
+        cached = stub.cached_text(body.get('cachedContent'))
+        prompt = '\n\n'.join(
+            p.get('text', '') for c in body.get('contents') or [] for p in c.get('parts') or []
+        )
+        answer = canned(prompt + '\n\n' + cached)
+        usage = {
+            'promptTokenCount': _tokens(prompt) + _tokens(cached),
+            'candidatesTokenCount': _tokens(answer),
+            'cachedContentTokenCount': _tokens(cached) if cached else 0,
+        }
+        stub.count('stream' if stream else 'generate')
+        if cached:
+            stub.count('cache_hit')
+        if stream:
+            return self._sse(answer, usage, delay)
+        time.sleep(delay)
+        self._json(200, { 'candidates': [{ 'content': { 'parts': [{ 'text': answer }] } }], 'usageMetadata': usage })
+
+    def _sse(self, answer: str, usage: Dict[str, int], delay: float) -> None:
+        knobs = self.server.stub.knobs
+        n = knobs.stream_chunks
+        step = max(1, -(-len(answer) // n))
+        parts = [answer[i:i + step] for i in range(0, len(answer), step)] or ['']
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        time.sleep(delay * knobs.ttft_share)
+        gap = delay * (1 - knobs.ttft_share) / max(1, len(parts) - 1)
+        try:
+            for i, part in enumerate(parts):
+                if i:
+                    time.sleep(gap)
+                data = { 'candidates': [{ 'content': { 'parts': [{ 'text': part }] } }] }
+                if i == len(parts) - 1:
+                    data['usageMetadata'] = usage
+                self.wfile.write(('data: ' + json.dumps(data, ensure_ascii=False) + '\r\n\r\n').encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # client cancelled the stream (format violation)
+            self.server.stub.count('stream_cancelled')
+        self.close_connection = True
+
+    def _cache_create(self, body: Dict[str, Any]) -> None:
+        stub = self.server.stub
+        text = '\n\n'.join(p.get('text', '') for c in body.get('contents') or [] for p in c.get('parts') or [])
+        time.sleep(stub.knobs.latency() / 4)
+        name = stub.add_cache(text)
+        stub.count('cache_create')
+        self._json(200, { 'name': name, 'model': body.get('model') })
+
+    # -- Files API upload + Batch API --
+
+    def _upload(self, url):
+        stub = self.server.stub
+        n = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(n) if n else b''
+        if url.path == '/upload/v1beta/files':
+            # resumable start: hand out a session url
+            session = stub.new_file()
+            self.send_response(200)
+            self.send_header('X-Goog-Upload-URL', f'{stub.url}/upload/session/{session}')
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'{}')
+            return
+        name = 'files/' + url.path.rsplit('/', 1)[-1]
+        stub.files[name] = raw.decode('utf-8')
+        self._json(200, { 'file': { 'name': name } })
+
+    # -- PostgREST subset used by cron_analyze's async path --
+
+    def _rest_filters(self, url):
+        table = url.path.rsplit('/', 1)[-1]
+        q = self.server.stub.sb.table(table)
+        for k, vals in parse_qs(url.query).items():
+            v = vals[0]
+            if k in ('select', 'limit'):
+                continue
+            if v.startswith('eq.'):
+                q = q.eq(k, v[3:])
+        return q, parse_qs(url.query)
+
+    def _rest_get(self, url):
+        time.sleep(self.server.stub.knobs.sb_latency_ms / 1000)
+        q, params = self._rest_filters(url)
+        if 'limit' in params:
+            q = q.limit(int(params['limit'][0]))
+        self._json(200, q.select(params.get('select', ['*'])[0]).execute().data)
+
+    def _rest_post(self, url):
+        # insert, or upsert with Prefer: resolution=merge-duplicates
+        time.sleep(self.server.stub.knobs.sb_latency_ms / 1000)
+        q = self.server.stub.sb.table(url.path[len('/rest/v1/'):])
+        body = self._body() or []
+        if 'merge-duplicates' in (self.headers.get('Prefer') or ''):
+            q.upsert(body).execute()
+        else:
+            q.insert(body).execute()
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _rest_patch(self, url):
+        time.sleep(self.server.stub.knobs.sb_latency_ms / 1000)
+        q, _ = self._rest_filters(url)
+        q.update(self._body() or {}).execute()
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class GeminiStub:
+    def __init__(self, knobs: Optional[Knobs] = None, sb: 'FakeSupabase' = None, port: int = 0):
+        self.knobs = knobs or Knobs()
+        self.sb = sb or FakeSupabase()
+        self.counts: Dict[str, int] = {}
+        self.caches: Dict[str, str] = {}
+        self.files: Dict[str, str] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.file_seq = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def start(self) -> 'GeminiStub':
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.counts)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counts = {}
+
+    def add_cache(self, text: str) -> str:
+        with self.lock:
+            name = f'cachedContents/bench{len(self.caches) + 1}'
+            self.caches[name] = text
+            return name
+
+    def cached_text(self, name: Optional[str]) -> str:
+        with self.lock:
+            return self.caches.get(name or '', '')
+
+    def new_file(self) -> str:
+        with self.lock:
+            self.file_seq += 1
+            return f'upload{self.file_seq}'
+
+    def add_batch(self, src: str) -> Dict[str, Any]:
+        # finishes knobs.batch_delay_ms after submission; answers are computed on the first poll after that
+        with self.lock:
+            name = f'batches/bench{len(self.batches) + 1}'
+            self.batches[name] = { 'src': src, 'ready_at': time.time() + self.knobs.batch_delay_ms / 1000, 'out': None }
+        self.count('batch_submit')
+        return { 'name': name, 'metadata': { 'state': 'BATCH_STATE_PENDING' } }
+
+    def batch_status(self, name: str) -> Dict[str, Any]:
+        b = self.batches.get(name)
+        if b is None:
+            return { 'name': name, 'metadata': { 'state': 'BATCH_STATE_FAILED' } }
+        if time.time() < b['ready_at']:
+            return { 'name': name, 'metadata': { 'state': 'BATCH_STATE_RUNNING' } }
+        if b['out'] is None:
+            out = []
+            for raw in self.files.get(b['src'], '').splitlines():
+                if not raw.strip():
+                    continue
+                item = json.loads(raw)
+                prompt = '\n\n'.join(
+                    p.get('text', '') for c in item['request'].get('contents') or [] for p in c.get('parts') or []
+                )
+                answer = canned(prompt)
+                out.append(json.dumps({ 'key': item['key'], 'response': {
+                    'candidates': [{ 'content': { 'parts': [{ 'text': answer }] } }],
+                    'usageMetadata': { 'promptTokenCount': _tokens(prompt), 'candidatesTokenCount': _tokens(answer) },
+                } }, ensure_ascii=False))
+                self.count('batch_request')
+            b['out'] = f'files/{name.rsplit("/", 1)[-1]}-out'
+            self.files[b['out']] = '\n'.join(out) + '\n'
+        return {
+            'name': name, 'done': True,
+            'metadata': { 'state': 'BATCH_STATE_SUCCEEDED', 'output': { 'responsesFile': b['out'] } },
+            'response': { 'responsesFile': b['out'] },
+        }
+
+
+# ---- in-memory Supabase -------------------------------------------------------
+
+class _Result:
+    def __init__(self, data: List[Dict[str, Any]]):
+        self.data = data
+
+
+# primary key per table where it is not 'id' (upsert conflict target)
+_PRIMARY_KEYS = { 'video_analysis': 'video_id', 'video_rankings': ('category', 'metric', 'video_id'),
+                 'video_view_snapshots': ('video_id', 'ts'), 'video_keywords': ('term', 'video_id'),
+                 'video_embeddings': 'video_id', 'video_fingerprints': 'video_id' }
+
+
+class _Query:
+    def __init__(self, sb: 'FakeSupabase', table: str):
+        self.sb = sb
+        self.table = table
+        self.filters: List[Any] = []
+        self.cols: Optional[List[str]] = None
+        self.n: Optional[int] = None
+        self.order_by: Optional[Any] = None
+        self.op = 'select'
+        self.payload: Any = None
+
+    def select(self, cols: str = '*', **_):
+        self.cols = None if cols.strip() == '*' else [c.strip() for c in cols.split(',') if c.strip()]
+        return self
+
+    def _where(self, col, fn):
+        self.filters.append((col, fn))
+        return self
+
+    def eq(self, col, val):
+        return self._where(col, lambda v: str(v) == str(val))
+
+    def neq(self, col, val):
+        return self._where(col, lambda v: str(v) != str(val))
+
+    def in_(self, col, vals):
+        wanted = { str(v) for v in vals }
+        return self._where(col, lambda v: str(v) in wanted)
+
+    def lte(self, col, val):
+        if isinstance(val, (int, float)):
+            return self._where(col, lambda v: v is not None and float(v) <= val)
+        return self._where(col, lambda v: v is not None and str(v) <= str(val))
+
+    def ov(self, col, vals):
+        wanted = { str(v) for v in vals }
+        return self._where(col, lambda v: bool(v) and any(str(x) in wanted for x in v))
+
+    def is_(self, col, val):
+        return self._where(col, lambda v: v is None if str(val) == 'null' else str(v).lower() == str(val))
+
+    def gt(self, col, val):
+        # keyset pages compare ids with the column's own type
+        return self._where(col, lambda v: v is not None and type(val)(v) > val)
+
+    def gte(self, col, val):
+        return self._where(col, lambda v: v is not None and str(v) >= str(val))
+
+    def order(self, col, desc: bool = False):
+        self.order_by = (col, desc)
+        return self
+
+    def limit(self, n: int):
+        self.n = int(n)
+        return self
+
+    def update(self, patch: Dict[str, Any]):
+        self.op, self.payload = 'update', dict(patch)
+        return self
+
+    def insert(self, rows: Any):
+        self.op, self.payload = 'insert', rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows: Any, **_):
+        self.op, self.payload = 'upsert', rows if isinstance(rows, list) else [rows]
+        return self
+
+    def delete(self):
+        self.op = 'delete'
+        return self
+
+    def _match(self, row) -> bool:
+        return all(fn(row.get(col)) for col, fn in self.filters)
+
+    def execute(self) -> _Result:
+        if self.sb.latency_ms:
+            time.sleep(self.sb.latency_ms / 1000)
+        with self.sb.lock:
+            rows = self.sb.tables.setdefault(self.table, [])
+            self.sb.ops[self.op] = self.sb.ops.get(self.op, 0) + 1
+            if self.op in ('insert', 'upsert'):
+                out = []
+                pk = _PRIMARY_KEYS.get(self.table, 'id')
+                pk = pk if isinstance(pk, tuple) else (pk,)
+                for r in self.payload:
+                    same = lambda x: all(k in r and x.get(k) == r[k] for k in pk)  # noqa: E731
+                    cur = next((x for x in rows if same(x)), None) if self.op == 'upsert' else None
+                    if cur is not None:
+                        cur.update(r)
+                    else:
+                        rows.append(dict(r))
+                    out.append(dict(r))
+                return _Result(out)
+            hit = [r for r in rows if self._match(r)]
+            if self.op == 'update':
+                for r in hit:
+                    r.update(self.payload)
+                return _Result([dict(r) for r in hit])
+            if self.op == 'delete':
+                self.sb.tables[self.table] = [r for r in rows if not self._match(r)]
+                return _Result([dict(r) for r in hit])
+            if self.order_by:
+                col, desc = self.order_by
+                hit.sort(key=lambda r: (r.get(col) is None, r.get(col)), reverse=desc)
+            if self.n is not None:
+                hit = hit[:self.n]
+            if self.cols:
+                return _Result([{ c: r.get(c) for c in self.cols if c in r } for r in hit])
+            return _Result([dict(r) for r in hit])
+
+
+class FakeSupabase:
+    # just enough of supabase-py's query builder for cron_analyze / analyze_one
+    def __init__(self, tables: Optional[Dict[str, List[Dict[str, Any]]]] = None, latency_ms: float = 0):
+        self.tables = { k: [dict(r) for r in v] for k, v in (tables or {}).items() }
+        self.latency_ms = latency_ms
+        self.ops: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+
+# ---- YouTubeTranscriptApi ---------------------------------------------------------
+
+class _Snippet:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _Fetched(list):
+    language_code = 'ko'
+
+
+def transcript_api(knobs: Knobs, chars: int = 3000, punctuated: bool = True):
+    # class with the youtube_transcript_api surface the pipeline uses
+    class FakeTranscriptApi:
+        calls = 0
+
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def fetch(self, vid: str, languages: Optional[List[str]] = None):
+            FakeTranscriptApi.calls += 1
+            time.sleep(max(0.0, knobs.transcript_latency_ms) / 1000)
+            text = make_transcript(chars, seed=zlib.crc32(vid.encode('utf-8')), punctuated=punctuated)
+            return _Fetched(_Snippet(line) for line in text.split('\n'))
+
+    return FakeTranscriptApi
@@ -1,4 +1,5 @@
 import { supabase } from '../supabase-client.js';
+import { clearAnalysis, saveVideoPatch, videoStatus, withAnalysis, withAnalysisMany } from './video-analysis.js';
 
 // DOM refs
 const loginView = document.getElementById('login-view');
@@ -244,9 +245,7 @@ function getRowsForRender() {
   // 상태 필터 적용
   if (statusFilter) {
     rows = rows.filter(v => {
-      const hasTranscript = !!(v.transcript_text && String(v.transcript_text).trim().length > 0);
-      const isAnalyzed = (Array.isArray(v.dopamine_graph) && v.dopamine_graph.length > 0) || v.material || v.hooking || v.narrative_structure;
-      const noTranscript = v.transcript_unavailable === true;
+      const { hasTranscript, isAnalyzed, noTranscript } = videoStatus(v);
       
       switch(statusFilter) {
         case 'analyzed': return isAnalyzed;
@@ -365,6 +364,67 @@ async function fetchDatasetVersion() {
   return { total, newest, tag: `${total}:${newest}` };
 }
 
+// --------- Keyset pages (id 순, 필요한 컬럼만) ---------
+// 목록 화면은 대본/분석 본문을 받지 않는다. 상태는 DB 계산 필드(has_transcript, is_analyzed)로 받고,
+// 마이그레이션 전이면 원본 컬럼을 받아 페이지마다 줄여 둔다.
+const ADMIN_LIST_COLUMNS = ['id', 'thumbnail', 'title', 'channel', 'date', 'update_date', 'last_modified', 'has_transcript', 'is_analyzed'];
+const STATUS_SOURCE_COLUMNS = ['transcript_text', 'dopamine_graph', 'material', 'hooking', 'narrative_structure'];
+const LIST_PAGE_SIZE = 1000;
+
+function slimVideoRow(v) {
+  const { hasTranscript, isAnalyzed } = videoStatus(v);
+  const out = { ...v, has_transcript: hasTranscript, is_analyzed: isAnalyzed };
+  for (const c of STATUS_SOURCE_COLUMNS) delete out[c];
+  delete out.analysis_full;
+  return out;
+}
+
+async function adminListColumns() {
+  let canFlag = false; try { const probe = await supabase.from('videos').select('transcript_unavailable').limit(0); canFlag = !probe.error; } catch {}
+  return canFlag ? [...ADMIN_LIST_COLUMNS, 'transcript_unavailable'] : ADMIN_LIST_COLUMNS;
+}
+
+// columns 페이지를 차례로 onPage(rows)에 넘긴다. /api/videos_page(서버) 우선, 안 되면 Supabase 직접.
+// direct: 본문 컬럼이 필요한 작업(내보내기 등)은 바로 Supabase 키셋 페이지로
+async function forEachVideoPage(columns, onPage, { pageSize = LIST_PAGE_SIZE, direct = false } = {}) {
+  let cols = columns.slice();
+  let viaApi = !direct;
+  let slim = false;
+  let token = '';
+  try { const { data: { session } } = await supabase.auth.getSession(); token = session?.access_token || ''; } catch {}
+  let after = null;
+  while (true) {
+    let rows = null;
+    if (viaApi) {
+      try {
+        const qs = new URLSearchParams({ columns: cols.join(','), limit: String(pageSize) });
+        if (after != null) qs.set('after', String(after));
+        const res = await fetch(`/api/videos_page?${qs}`, { headers: token ? { Authorization: `Bearer ${token}` } : {} });
+        const json = await res.json();
+        if (!res.ok || !json.ok) throw new Error(json.error || `HTTP ${res.status}`);
+        rows = json.rows || [];
+      } catch { viaApi = false; }
+    }
+    if (!viaApi) {
+      let q = supabase.from('videos').select(cols.join(',')).order('id', { ascending: true }).limit(pageSize);
+      if (after != null) q = q.gt('id', after);
+      let { data, error } = await q;
+      if (error && !slim && cols.some(c => c === 'has_transcript' || c === 'is_analyzed')) {
+        // 계산 필드가 없는 DB: 원본 컬럼으로 다시 조회
+        slim = true;
+        cols = [...cols.filter(c => c !== 'has_transcript' && c !== 'is_analyzed'), ...STATUS_SOURCE_COLUMNS];
+        continue;
+      }
+      if (error) throw error;
+      rows = slim ? (data || []).map(slimVideoRow) : (data || []);
+    }
+    // 짧은 페이지로 끝내지 않는다 (서버 max-rows가 pageSize보다 작을 수 있음): 빈 페이지가 끝
+    if (!rows.length) return;
+    await onPage(rows);
+    after = rows[rows.length - 1].id;
+  }
+}
+
 // ---------- Auth (Supabase) ----------
 const loginDebug = document.getElementById('login-debug');
 
@@ -515,40 +575,13 @@ async function fetchAndDisplayData() {
       return;
     }
 
-    // 전체 카운트
-    let total = remoteVer.total || 0;
-
-    const BATCH = 1000;
-    const CONC = 4;
-    const ranges = [];
-    if (total > 0) {
-      for (let start = 0; start < total; start += BATCH) {
-        ranges.push([start, Math.min(start + BATCH - 1, total - 1)]);
-      }
-    } else {
-      // 총 개수를 못 가져오면 until-exhaust 페치
-      ranges.push([0, BATCH - 1]);
-    }
-
+    // 목록 컬럼만 id 키셋 페이지로 (응답 행 제한에 잘리지 않음)
     const results = [];
-    for (let i = 0; i < ranges.length; i += CONC) {
-      const slice = ranges.slice(i, i + CONC);
-      const chunk = await Promise.all(slice.map(async ([from, to]) => {
-        const { data, error } = await supabase
-          .from('videos')
-          .select('*')
-          .order('date', { ascending: false })
-          .range(from, to);
-        if (error) return [];
-        return Array.isArray(data) ? data : [];
-      }));
-      chunk.forEach(arr => results.push(...arr));
-      // until-exhaust: 총 개수 미확정이면서 마지막 청크가 꽉 찼으면 다음 범위를 추가
-      if (!total && slice.length && (chunk[chunk.length - 1]?.length === BATCH)) {
-        const lastEnd = ranges[ranges.length - 1][1];
-        ranges.push([lastEnd + 1, lastEnd + BATCH]);
-      }
-    }
+    const columns = await adminListColumns();
+    await forEachVideoPage(columns, (rows) => {
+      results.push(...rows);
+      dataTableContainer.innerHTML = `<p class="info-message">데이터 로딩... ${results.length}${remoteVer.total ? ` / ${remoteVer.total}` : ''}</p>`;
+    });
 
     // 중복 제거
     const map = new Map();
@@ -615,7 +648,7 @@ function renderTable(rows) {
           <td>${escapeHtml(v.channel || '')}</td>
           <td>${escapeHtml(v.date || '')}</td>
           <td>${escapeHtml(v.update_date || '')}</td>
-          <td>${(() => { const analyzed = (Array.isArray(v.dopamine_graph) && v.dopamine_graph.length > 0) || v.material || v.hooking || v.narrative_structure; const noT = v.transcript_unavailable === true; const hasT = !!(v.transcript_text && String(v.transcript_text).trim().length > 0); if (analyzed) return '<span class="group-tag" style="background:#10b981;">분석완료</span>'; if (noT) return '<span class="group-tag" style="background:#6b7280;">대본없음</span>'; if (hasT) return '<span class="group-tag" style="background:#3b82f6;">대본있음</span>'; return ''; })()}</td>
+          <td>${(() => { const { isAnalyzed: analyzed, noTranscript: noT, hasTranscript: hasT } = videoStatus(v); if (analyzed) return '<span class="group-tag" style="background:#10b981;">분석완료</span>'; if (noT) return '<span class="group-tag" style="background:#6b7280;">대본없음</span>'; if (hasT) return '<span class="group-tag" style="background:#3b82f6;">대본있음</span>'; return ''; })()}</td>
                     <td class="action-buttons">
             <button class="btn btn-edit" data-id="${v.id}">수정</button>
             <button class="btn btn-danger single-delete-btn" data-id="${v.id}">삭제</button>
@@ -689,8 +722,13 @@ function loadAdminViewState() {
 async function refreshRowsByIds(ids) {
   try {
     if (!Array.isArray(ids) || !ids.length) return;
-    const { data, error } = await supabase.from('videos').select('*').in('id', ids);
-    if (error) return;
+    let { data, error } = await supabase.from('videos').select((await adminListColumns()).join(',')).in('id', ids);
+    if (error) {
+      // 계산 필드가 없는 DB
+      ({ data, error } = await supabase.from('videos').select('*').in('id', ids));
+      if (error) return;
+      data = (data || []).map(slimVideoRow);
+    }
     const map = new Map(currentData.map(v => [v.id, v]));
     for (const r of (data || [])) { if (r && r.id) map.set(r.id, r); }
     currentData = Array.from(map.values());
@@ -769,7 +807,7 @@ async function openEditModal(id) {
     docIdToEdit = id;
   const { data, error } = await supabase.from('videos').select('*').eq('id', id).single();
   if (error || !data) return;
-  const obj = data;
+  const obj = await withAnalysis(supabase, data);
         editForm.innerHTML = '';
   Object.keys(obj).sort().forEach((key) => {
     const raw = obj[key];
@@ -797,7 +835,7 @@ saveEditBtn.addEventListener('click', async () => {
     try { updated[key] = (/^\s*\[|\{/.test(String(value))) ? JSON.parse(value) : value; }
     catch { updated[key] = value; }
   });
-  await supabase.from('videos').update(updated).eq('id', docIdToEdit);
+  await saveVideoPatch(supabase, docIdToEdit, updated);
     closeEditModal();
     fetchAndDisplayData();
 });
@@ -1103,9 +1141,12 @@ if (exportJsonBtn) {
   exportJsonBtn.addEventListener('click', async () => {
     try {
       exportStatus.style.display = 'block'; exportStatus.textContent = '데이터 내보내는 중...'; exportStatus.style.color = '';
-      const { data, error } = await supabase.from('videos').select('*');
-      if (error) throw error;
-      const rows = data || [];
+      // 전체 컬럼이 필요하지만 응답 행 제한에 잘리지 않도록 키셋 페이지로
+      const rows = [];
+      await forEachVideoPage(['*'], (page) => {
+        rows.push(...page);
+        exportStatus.textContent = `데이터 내보내는 중... ${rows.length}`;
+      }, { direct: true });
       const jsonText = JSON.stringify(rows, null, 2);
       // 1) 로컬 다운로드
       const url = URL.createObjectURL(new Blob([jsonText], { type: 'application/json' }));
@@ -1133,6 +1174,7 @@ if (exportJsonBtn) {
 // ---------- Schedules ----------
 async function createSchedule(scope, ids, runAt, forceType) {
   const type = forceType || (document.querySelector('input[name="schedule-type"]:checked')?.value) || 'analysis';
+  const dopamineMode = (document.querySelector('input[name="schedule-dopamine-mode"]:checked')?.value) || 'llm';
   const now = new Date();
   const nowIso = new Date(now.getTime()).toISOString();
   // datetime-local 값은 로컬 타임존 기준의 벽시각. 이를 실제 순간(UTC) ISO로 변환
@@ -1142,6 +1184,7 @@ async function createSchedule(scope, ids, runAt, forceType) {
     type,
         scope,
     remaining_ids: scope === 'selected' ? ids : [],
+    dopamine_mode: dopamineMode,
         status: 'pending',
     run_at: runAtIso,
     created_at: nowIso,
@@ -1445,6 +1488,42 @@ async function fetchWithTimeout(url, options = {}, timeoutMs = 180000) {
   }
 }
 
+// analyze_one?stream=1 의 NDJSON 응답을 읽는다. 진행 이벤트는 onEvent로,
+// 마지막 result 이벤트는 일반 JSON 응답과 같은 { ok, status, body } 형태로 돌려준다.
+async function readAnalyzeStream(res, onEvent) {
+  const type = res.headers.get('Content-Type') || '';
+  if (!res.body || !type.includes('ndjson')) {
+    let body = null;
+    try { body = await res.json(); } catch {}
+    return { ok: res.ok, status: res.status, body };
+  }
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = '';
+  let result = null;
+  const handle = (line) => {
+    if (!line.trim()) return;
+    let ev = null;
+    try { ev = JSON.parse(line); } catch { return; }
+    if (ev.event === 'result') { result = ev; return; }
+    try { onEvent && onEvent(ev); } catch {}
+  };
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buf += decoder.decode(value, { stream: true });
+    let nl;
+    while ((nl = buf.indexOf('\n')) >= 0) {
+      handle(buf.slice(0, nl));
+      buf = buf.slice(nl + 1);
+    }
+  }
+  handle(buf);
+  if (!result) return { ok: false, status: 502, body: { ok: false, error: 'stream ended without result' } };
+  const status = Number(result.status) || 500;
+  return { ok: status >= 200 && status < 300, status, body: result };
+}
+
 // --- 공용 처리기: 병렬 실행 + 키 로테이션 ---
 function getStoredKeysForRotation() {
   const keys = getStoredYoutubeApiKeys();
@@ -1608,8 +1687,9 @@ async function runAnalysisForIds(ids, opts = {}) {
     const CHUNK = 1000;
     for (let i = 0; i < ids.length; i += CHUNK) {
       const slice = ids.slice(i, i + CHUNK);
-      const { data: preRows } = await supabase.from('videos').select(FIELDS).in('id', slice);
-      (preRows || []).forEach(r => { if (r && r.id) preById.set(r.id, r); });
+      const { data: rows } = await supabase.from('videos').select(FIELDS).in('id', slice);
+      const preRows = await withAnalysisMany(supabase, rows || []);
+      preRows.forEach(r => { if (r && r.id) preById.set(r.id, r); });
     }
   } catch {}
   
@@ -1769,14 +1849,17 @@ async function runAnalysisForIds(ids, opts = {}) {
     
     while (retryCount <= maxRetries) {
       try {
-        const res = await fetchWithTimeout('/api/analyze_one', { 
+        // 누락 섹션 복구용 재분석: force로 서버가 증분(바뀐 문장만) 처리로 건너뛰지 않게 한다
+        const raw = await fetchWithTimeout('/api/analyze_one?stream=1', { 
           method: 'POST', 
           headers: { 'Content-Type': 'application/json' }, 
-          body: JSON.stringify({ id, retry: retryCount }) 
+          body: JSON.stringify({ id, retry: retryCount, force: true }) 
         }, 180000);
         
-        let j = null; 
-        try { j = await res.json(); } catch {}
+        const res = await readAnalyzeStream(raw, (ev) => {
+          if (ev.event === 'stage') appendAnalysisLog(`(${id}) 단계: ${ev.stage}`);
+        });
+        const j = res.body;
         
         if (res.ok) {
           // 성공
@@ -1793,7 +1876,8 @@ async function runAnalysisForIds(ids, opts = {}) {
           // 실제로 저장된 항목 재확인
           if (saved.length > 0) {
             try {
-              const { data: verify } = await supabase.from('videos').select('material, hooking, narrative_structure, material_core_materials, material_lang_patterns').eq('id', id).single();
+              const { data: row } = await supabase.from('videos').select('id, material, hooking, narrative_structure, material_core_materials, material_lang_patterns').eq('id', id).single();
+              const verify = await withAnalysis(supabase, row);
               const actualSaved = [];
               if (verify) {
                 if (verify.material) actualSaved.push('material');
@@ -2477,6 +2561,7 @@ resetTranscriptSelectedBtn?.addEventListener('click', async () => {
       const rows = slice.map(id => ({ id, ...patch }));
       const { error } = await supabase.from('videos').upsert(rows, { onConflict: 'id' });
       if (error) throw error;
+      await clearAnalysis(supabase, slice);
       cleared += slice.length;
       analysisBannerText && (analysisBannerText.textContent = `초기화 진행 ${cleared}/${ids.length}`);
     }
@@ -2513,6 +2598,7 @@ document.getElementById('reset-analysis-fields-btn')?.addEventListener('click',
       const rows = slice.map(id => ({ id, ...patch }));
       const { error } = await supabase.from('videos').upsert(rows, { onConflict: 'id' });
       if (error) throw error;
+      await clearAnalysis(supabase, slice);
       cleared += slice.length;
       analysisBannerText && (analysisBannerText.textContent = `분석 필드 초기화 ${cleared}/${ids.length}`);
     }
@@ -1,4 +1,5 @@
 import { supabase } from '../supabase-client.js';
+import { videoStatus } from './video-analysis.js';
 
 // 컨테이너 및 입력 요소
 const videoTableContainer = document.getElementById('video-table-container');
@@ -47,8 +48,39 @@ const DB_CONCURRENCY = 4;            // 병렬 요청 개수
 const FETCH_ALL_FROM_DB = true;      // DB에서 전량 로드 모드(페이지네이션은 클라이언트 분할)
 const LIVE_SYNC_INTERVAL_MS = 2000;  // 실시간 증분 동기화 주기 (2초)
 const SKIP_CACHE_ON_FIRST_LOAD = true; // 첫 진입 시 캐시 무시하고 항상 최신 로드
-// 스키마 변경/추가 컬럼 호환을 위해 우선 전체 컬럼을 선택
-const VIDEO_COLUMNS = '*';
+// 목록에 필요한 컬럼만 (대본/분석 본문 제외, 상태는 계산 필드 has_transcript/is_analyzed).
+// 스키마에 없는 컬럼이 있으면 호환을 위해 전체 컬럼으로
+const LIST_COLUMNS = 'id,thumbnail,title,channel,date,update_date,last_modified,views,views_numeric,views_prev_numeric,views_baseline_numeric,views_last_checked_at,subscribers,subscribers_numeric,youtube_url,group_name,template_type,source_type,kr_category_large,kr_category_medium,kr_category_small,material,hooking,narrative_structure,transcript_unavailable,has_transcript,is_analyzed';
+let VIDEO_COLUMNS = '*';
+let videoColumnsResolved = false;
+
+async function resolveVideoColumns() {
+    if (videoColumnsResolved) return;
+    videoColumnsResolved = true;
+    try {
+        const { error } = await supabase.from('videos').select(LIST_COLUMNS).limit(0);
+        if (!error) VIDEO_COLUMNS = LIST_COLUMNS;
+    } catch {}
+}
+
+// 정렬별 사전 계산 랭킹 (video_rankings, api/_ranking.py): 필터/검색 없이 성장률·증가량 순으로 볼 때는
+// 이 목록만 페이지 단위로 읽고, 전량 로드는 필터/검색/채널 보기가 필요해질 때 한다 (ensureDataForView)
+const RANKING_METRICS = { pct_desc: 'growth', abs_desc: 'delta' };
+
+async function fetchRankingPage(metric, offset) {
+    if (!metric) return [];
+    try {
+        const { data, error } = await supabase
+            .from('video_rankings')
+            .select(`score, videos(${VIDEO_COLUMNS})`)
+            .eq('category', '*')
+            .eq('metric', metric)
+            .order('score', { ascending: false })
+            .range(offset, offset + PAGE_BATCH - 1);
+        if (error || !Array.isArray(data)) return [];
+        return data.map(r => r.videos).filter(Boolean);
+    } catch { return []; }
+}
 
 // 상태
 let allVideos = [];
@@ -65,6 +97,8 @@ let liveSyncTimer = null;
 let lastVisible = null;
 let hasMore = true;
 let dateCursor = null; // static JSON 기반 커서
+let rankingView = null; // allVideos가 video_rankings 목록일 때 그 metric (null이면 전량)
+let fullListLoading = null;
 
 // 로컬 캐시
 const CACHE_TTL = 60 * 60 * 1000; // 1시간
@@ -286,7 +320,7 @@ async function pollLatestAndSync() {
         if (remoteTs > localTs) await syncIncrementalUpdates(localTs);
         // 2) 최신 N개 푸시 업데이트(상위 목록 즉시 반영)
         const TOP_N = 300;
-        const { data: top } = await supabase.from('videos').select('*').order('last_modified', { ascending: false }).limit(TOP_N);
+        const { data: top } = await supabase.from('videos').select(VIDEO_COLUMNS).order('last_modified', { ascending: false }).limit(TOP_N);
         if (Array.isArray(top) && top.length) {
             const map = new Map(allVideos.map(v => [v.id, v]));
             for (const r of top) map.set(r.id, r);
@@ -329,6 +363,7 @@ async function fetchVideos() {
         // 0) 서버 버전 태그 확인 → 로컬 버전과 다르면 무조건 전량 재로딩
         let remoteVer = null;
         try { remoteVer = await fetchDatasetVersion(); } catch {}
+        await resolveVideoColumns();
         const localVer = await idbGet(IDB_VER_KEY);
 
         const firstLoadDone = sessionStorage.getItem('firstLoadDone') === '1';
@@ -345,6 +380,20 @@ async function fetchVideos() {
             }
         }
 
+        rankingView = null;
+        if (FETCH_ALL_FROM_DB && !needsFullList()) {
+            // 랭킹 정렬만: 작은 테이블의 첫 페이지로 끝 (부분 목록이라 캐시/실시간 동기화는 전량 로드 때)
+            const page = await fetchRankingPage(RANKING_METRICS[sortMode], 0);
+            if (page.length) {
+                rankingView = RANKING_METRICS[sortMode];
+                allVideos = page;
+                hasMore = page.length === PAGE_BATCH;
+                precomputeNumericFields(allVideos);
+                filterAndRender();
+                loadedOk = true;
+                return;
+            }
+        }
         if (FETCH_ALL_FROM_DB) {
             allVideos = await fetchAllFromSupabase();
             hasMore = false;
@@ -445,19 +494,25 @@ function dedupeById(rows) {
 async function loadNextPage() {
     if (!hasMore) return;
     const offset = allVideos.length;
-    const { data, error } = await supabase
-        .from('videos')
-        .select(VIDEO_COLUMNS)
-        .order('date', { ascending: false })
-        .range(offset, offset + PAGE_BATCH - 1);
-    const newVideos = (!error && Array.isArray(data)) ? data : [];
+    let newVideos = [];
+    if (rankingView) {
+        newVideos = await fetchRankingPage(rankingView, offset);
+    } else {
+        const { data, error } = await supabase
+            .from('videos')
+            .select(VIDEO_COLUMNS)
+            .order('date', { ascending: false })
+            .range(offset, offset + PAGE_BATCH - 1);
+        newVideos = (!error && Array.isArray(data)) ? data : [];
+    }
     if (newVideos.length) {
         // 중복 합치기 방지: id 기준으로 병합
         const map = new Map(allVideos.map(v => [v.id, v]));
         newVideos.forEach(v => map.set(v.id, v));
         allVideos = Array.from(map.values());
         hasMore = newVideos.length === PAGE_BATCH;
-        await setCached(allVideos);
+        precomputeNumericFields(newVideos);
+        if (!rankingView) await setCached(allVideos);
         filterAndRender(true);
         updateLoadMoreVisibility();
     } else {
@@ -492,6 +547,55 @@ async function syncIncrementalUpdates(sinceTs) {
     } catch {}
 }
 
+// 랭킹 목록만으로 그릴 수 없는 화면: 다른 정렬, 검색, 필터, 채널 보기(채널 집계는 전량 기준)
+function needsFullList() {
+    if (!RANKING_METRICS[sortMode] || viewMode === 'channel') return true;
+    if ((searchInput?.value || '').trim() || updateDateFilter?.value) return true;
+    return !!subsFilter && (subsFilter.preset !== 'all' || subsFilter.min != null || subsFilter.max != null);
+}
+
+async function ensureFullList() {
+    if (!fullListLoading) {
+        fullListLoading = (async () => {
+            let ver = null;
+            try { ver = await fetchDatasetVersion(); } catch {}
+            const all = await fetchAllFromSupabase();
+            rankingView = null;
+            hasMore = false;
+            allVideos = all;
+            await setCached(allVideos);
+            if (ver?.tag) await idbSet(IDB_VER_KEY, ver.tag);
+            startLiveSync();
+        })().finally(() => { fullListLoading = null; });
+    }
+    await fullListLoading;
+}
+
+// 랭킹 목록을 보고 있을 때 정렬/필터가 바뀌면 필요한 데이터를 먼저 읽는다. 데이터가 바뀌면 true
+async function ensureDataForView() {
+    if (!rankingView) return false;
+    const metric = RANKING_METRICS[sortMode];
+    if (!needsFullList() && metric === rankingView) return false;
+    if (videoTableBody) videoTableBody.innerHTML = '<tr><td colspan="9" class="info-message">데이터를 불러오는 중...</td></tr>';
+    const page = needsFullList() ? [] : await fetchRankingPage(metric, 0);
+    if (page.length) {
+        rankingView = metric;
+        allVideos = page;
+        hasMore = page.length === PAGE_BATCH;
+        precomputeNumericFields(allVideos);
+    } else {
+        await ensureFullList();
+    }
+    return true;
+}
+
+async function refreshView(refilter, keepPage = false) {
+    if (await ensureDataForView()) refilter = true;
+    if (refilter) { filterAndRender(keepPage); return; }
+    renderCurrentView();
+    renderPagination();
+}
+
 function updateLoadMoreVisibility() {
     if (!loadMoreBtn) return;
     loadMoreBtn.style.display = hasMore ? 'inline-block' : 'none';
@@ -604,9 +708,7 @@ function renderVideoView() {
         const riseColor = pct >= 0 ? '#16a34a' : '#dc2626';
         const thumbnail = r.thumbnail ? `<img src="${r.thumbnail}" class="table-thumbnail" loading="lazy" onerror="this.outerHTML=\'<div class=\\'no-thumbnail-placeholder\\'>이미지 없음</div>\'">` : `<div class="no-thumbnail-placeholder">이미지 없음</div>`;
         const lastChecked = r.update_date ? new Date(r.update_date).toLocaleDateString('ko-KR') : (r.views_last_checked_at ? new Date(r.views_last_checked_at).toLocaleString() : '-');
-        const analyzed = (Array.isArray(r.dopamine_graph) && r.dopamine_graph.length > 0) || r.material || r.hooking || r.narrative_structure;
-        const noT = r.transcript_unavailable === true;
-        const hasT = !!(r.transcript_text && String(r.transcript_text).trim().length > 0);
+        const { isAnalyzed: analyzed, noTranscript: noT, hasTranscript: hasT } = videoStatus(r);
         const statusChip = analyzed ? '<span class="group-tag" style="background:#10b981;">분석완료</span>' : (noT ? '<span class="group-tag" style="background:#6b7280;">대본없음</span>' : (hasT ? '<span class="group-tag" style="background:#3b82f6;">대본있음</span>' : ''));
         return `
             <tr>
@@ -729,7 +831,9 @@ function getTotalPages() {
 function renderPagination() {
     if (!paginationContainer) return;
     const totalPages = getTotalPages();
-    if (totalPages <= 1) { paginationContainer.innerHTML = ''; return; }
+    // 랭킹 목록: 읽은 페이지 뒤에 더 있으면 '다음'으로 이어서 읽는다
+    const more = !!rankingView && hasMore;
+    if (totalPages <= 1 && !more) { paginationContainer.innerHTML = ''; return; }
     const makeBtn = (p) => `<button class="page-btn ${p===currentPage?'active':''}" data-page="${p}">${p}</button>`;
     const maxShow = 9; // 1 2 3 4 5 6 7 8 9
     let start = Math.max(1, currentPage - Math.floor(maxShow/2));
@@ -742,7 +846,7 @@ function renderPagination() {
     for (let p = start; p <= end; p++) parts.push(makeBtn(p));
     if (end < totalPages - 1) parts.push('<span style="color:var(--text-secondary);padding:4px 6px;">...</span>');
     if (end < totalPages) parts.push(makeBtn(totalPages));
-    if (currentPage < totalPages) parts.push(`<button class="page-btn" data-page="${currentPage+1}">다음</button>`);
+    if (currentPage < totalPages || more) parts.push(`<button class="page-btn" data-page="${currentPage+1}">다음</button>`);
     paginationContainer.innerHTML = parts.join('');
 }
 
@@ -751,12 +855,12 @@ function renderPagination() {
     if (el) {
         // 검색 인풋은 디바운스 적용
         if (el === searchInput) {
-            const debounced = debounce(() => filterAndRender(false), 250);
+            const debounced = debounce(() => refreshView(true), 250);
             el.addEventListener('input', debounced);
         } else {
-            el.addEventListener('input', filterAndRender);
+            el.addEventListener('input', () => refreshView(true));
         }
-        if (el.tagName === 'SELECT' || el.type === 'date') el.addEventListener('change', filterAndRender);
+        if (el.tagName === 'SELECT' || el.type === 'date') el.addEventListener('change', () => refreshView(true));
     }
 });
 
@@ -766,8 +870,7 @@ viewChips.forEach(btn => {
         setActiveChip(viewChips, btn);
         viewMode = btn.getAttribute('data-view') || 'video';
         currentPage = 1;
-        renderCurrentView();
-        renderPagination();
+        refreshView(false);
     });
 });
 
@@ -777,8 +880,7 @@ sortChips.forEach(btn => {
         setActiveChip(sortChips, btn);
         sortMode = btn.getAttribute('data-sort') || 'pct_desc';
         currentPage = 1;
-        renderCurrentView();
-        renderPagination();
+        refreshView(false);
     });
 });
 
@@ -792,8 +894,7 @@ if (sortFilter) {
         else if (v === 'subs_asc') sortMode = 'subs_asc';
         else sortMode = 'date_desc';
         currentPage = 1;
-        renderCurrentView();
-        renderPagination();
+        refreshView(false);
     });
 }
 
@@ -827,13 +928,14 @@ if (toggleStatsChip && statsGrid) {
 // 페이지 크기 UI 제거됨
 
 // 페이지네이션 클릭 핸들러
-document.addEventListener('click', (e) => {
+document.addEventListener('click', async (e) => {
     // 페이지네이션
     const btn = e.target.closest('.page-btn');
     if (btn) {
         const p = Number(btn.getAttribute('data-page'));
         if (!isFinite(p) || p < 1) return;
-        currentPage = p;
+        if (p > getTotalPages() && rankingView && hasMore) await loadNextPage();
+        currentPage = Math.min(p, getTotalPages());
         renderCurrentView();
         renderPagination();
         window.scrollTo({ top: 0, behavior: 'smooth' });
@@ -869,7 +971,7 @@ subsChips.forEach(btn => {
         subsFilter.min = null; subsFilter.max = null;
         currentPage = 1;
         // 현재 뷰 모드 유지한 채 재렌더
-        filterAndRender(true);
+        refreshView(true, true);
     });
 });
 if (subsApplyBtn) {
@@ -880,7 +982,7 @@ if (subsApplyBtn) {
         subsFilter.min = Number.isFinite(min) ? min : null;
         subsFilter.max = Number.isFinite(max) ? max : null;
         currentPage = 1;
-        filterAndRender(true);
+        refreshView(true, true);
     });
 }
 if (subsResetBtn) {
@@ -890,6 +992,6 @@ if (subsResetBtn) {
         if (subsMaxInput) subsMaxInput.value = '';
         subsChips.forEach(ch => ch.classList.remove('chip-active'));
         currentPage = 1;
-        filterAndRender(true);
+        refreshView(true, true);
     });
 }
@@ -1,4 +1,5 @@
 import { supabase } from '../supabase-client.js';
+import { withAnalysis } from './video-analysis.js';
 
 const detailsContent = document.getElementById('details-content');
 const dopamineGraphContainer = document.getElementById('dopamine-graph');
@@ -30,7 +31,8 @@ const fetchAndDisplayDetails = async () => {
             detailsContent.innerHTML = '<p class="error-message">해당 비디오를 찾을 수 없습니다.</p>';
             return;
         }
-        renderDetails(data);
+        // 분석 본문(대본 분석/도파민 그래프/소재 배열/키워드)은 video_analysis에
+        renderDetails(await withAnalysis(supabase, data));
     } catch (error) {
         console.error("Error fetching video details: ", error);
         detailsContent.innerHTML = '<p class="error-message">데이터를 불러오는 데 실패했습니다.</p>';
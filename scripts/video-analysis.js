@@ -0,0 +1,139 @@
+// 분석 본문(video_analysis)과 videos 요약을 다루는 공용 헬퍼 (api/_analysis_store.py와 같은 규칙)
+// videos: 목록/랭킹용 컬럼 + 요약(analysis_status, analysis_fingerprint, analysis_version, dopamine_peak)
+// video_analysis.data: 아래 ANALYSIS_FIELDS (schema_version으로 버전 관리)
+// schema 2: dopamine_graph는 'dopamine'에 압축 저장 (api/_graph_codec.py), 읽을 때 목록으로 풀어 준다
+
+export const ANALYSIS_TABLE = 'video_analysis';
+export const ANALYSIS_SCHEMA_VERSION = 2;
+export const PACKED_GRAPH = 'dopamine';
+export const ANALYSIS_FIELDS = [
+  'analysis_full', 'dopamine_graph', 'analysis_sentence_hashes',
+  'material_main_idea', 'material_core_materials', 'material_lang_patterns',
+  'material_emotion_points', 'material_info_delivery',
+  'keywords_ko', 'keywords_en', 'keywords_zh',
+];
+
+// 목록 상태: 계산 필드(has_transcript/is_analyzed) 또는 요약, 없으면 원본 컬럼으로
+export function videoStatus(v) {
+  const hasTranscript = typeof v.has_transcript === 'boolean' ? v.has_transcript : !!(v.transcript_text && String(v.transcript_text).trim().length > 0);
+  const isAnalyzed = typeof v.is_analyzed === 'boolean' ? v.is_analyzed
+    : (v.analysis_status === 'done' || !!((Array.isArray(v.dopamine_graph) && v.dopamine_graph.length > 0) || v.material || v.hooking || v.narrative_structure));
+  return { hasTranscript, isAnalyzed, noTranscript: v.transcript_unavailable === true };
+}
+
+// ---- packed dopamine_graph (api/_graph_codec.py와 같은 규칙) ----
+const LEVELS = '0123456789a';
+// api/_sentences.py _NOISE
+const NOISE = /\[[^\]\n]{0,40}\]|\((?:음악|박수|웃음|침묵|배경음|기침|music|applause|laughter)\)|<[^<>\n]{1,40}>|>>|\n[ \t]*\d+[ \t]*(?=\r?\n|$)/gi;
+
+function cleanSentence(raw) {
+  return ('\n' + (raw || '')).replace(NOISE, ' ').split(/\s+/).filter(Boolean).join(' ');
+}
+
+async function transcriptFingerprint(text) {
+  const norm = String(text || '').replace(/\s+/g, ' ').trim();
+  const buf = await crypto.subtle.digest('SHA-1', new TextEncoder().encode(norm));
+  return Array.from(new Uint8Array(buf), b => b.toString(16).padStart(2, '0')).join('').slice(0, 16);
+}
+
+export function isPackedGraph(v) {
+  return !!v && typeof v === 'object' && !Array.isArray(v) && typeof v.levels === 'string';
+}
+
+// packed -> [{ sentence, level, reason }]; 대본이 분석 후 수정됐으면 문장은 빈 값
+export async function decodeDopamine(transcript, packed) {
+  if (!isPackedGraph(packed)) return Array.isArray(packed) ? packed : [];
+  // offset은 코드 포인트 기준 (Python 문자열 인덱스)
+  const chars = Array.from(String(transcript || ''));
+  let valid = true;
+  try { valid = packed.fp === await transcriptFingerprint(transcript); } catch {}
+  const spans = packed.spans || [];
+  const texts = packed.texts || {};
+  const reasons = packed.reasons || [];
+  const why = packed.why || [];
+  const reasonOf = new Map();
+  for (let k = 0; k + 1 < why.length; k += 2) if (why[k + 1] < reasons.length) reasonOf.set(why[k], reasons[why[k + 1]]);
+  const out = [];
+  let end = 0;
+  for (let i = 0; i < packed.levels.length; i++) {
+    const lv = LEVELS.indexOf(packed.levels[i]);
+    const e = { sentence: '', level: lv < 0 ? 0 : lv, reason: reasonOf.has(i) ? reasonOf.get(i) : (packed.rdef || '') };
+    if (String(i) in texts) e.sentence = texts[String(i)];
+    else if (2 * i + 1 < spans.length) {
+      const a = end + spans[2 * i];
+      const b = a + spans[2 * i + 1];
+      end = b;
+      if (valid) e.sentence = Array.from(cleanSentence(chars.slice(a, b).join(''))).slice(0, 200).join('');
+    }
+    out.push(e);
+  }
+  return out;
+}
+
+async function applyAnalysis(video, d) {
+  const out = { ...video };
+  for (const k of ANALYSIS_FIELDS) if (k in d) out[k] = d[k];
+  if (isPackedGraph(d[PACKED_GRAPH])) out.dopamine_graph = await decodeDopamine(out.transcript_text, d[PACKED_GRAPH]);
+  return out;
+}
+
+// videos 행 + video_analysis 행 (테이블이 없거나 행이 없으면 videos 그대로)
+export async function withAnalysis(supabase, video) {
+  if (!video || video.id == null) return video;
+  try {
+    const { data, error } = await supabase.from(ANALYSIS_TABLE).select('data, schema_version').eq('video_id', video.id).maybeSingle();
+    if (error || !data) return video;
+    return await applyAnalysis(video, data.data || {});
+  } catch { return video; }
+}
+
+// 여러 행을 한 번에 (in 조회)
+export async function withAnalysisMany(supabase, videos) {
+  const rows = Array.isArray(videos) ? videos : [];
+  if (!rows.length) return rows;
+  try {
+    const { data, error } = await supabase.from(ANALYSIS_TABLE).select('video_id, data').in('video_id', rows.map(v => v.id));
+    if (error || !Array.isArray(data)) return rows;
+    const byId = new Map(data.map(r => [String(r.video_id), r.data || {}]));
+    return await Promise.all(rows.map(v => {
+      const d = byId.get(String(v.id));
+      return d ? applyAnalysis(v, d) : v;
+    }));
+  } catch { return rows; }
+}
+
+// 분석 초기화: 본문 행 삭제 + 요약 상태 해제 (테이블/컬럼이 없으면 무시)
+export async function clearAnalysis(supabase, ids) {
+  if (!Array.isArray(ids) || !ids.length) return;
+  try { await supabase.from(ANALYSIS_TABLE).delete().in('video_id', ids); } catch {}
+  try { await supabase.from('videos').update({ analysis_status: null, dopamine_peak: null, analysis_fingerprint: null }).in('id', ids); } catch {}
+}
+
+// 수정 저장: 본문 필드는 video_analysis로, 나머지는 videos로
+export async function saveVideoPatch(supabase, id, patch) {
+  const side = {}; const rest = {};
+  for (const [k, v] of Object.entries(patch || {})) (ANALYSIS_FIELDS.includes(k) ? side : rest)[k] = v;
+  if (Object.keys(side).length) {
+    const { data: cur, error: readErr } = await supabase.from(ANALYSIS_TABLE).select('data').eq('video_id', id).maybeSingle();
+    if (readErr) {
+      // 마이그레이션 전: 예전처럼 videos 한 행에
+      return supabase.from('videos').update(patch).eq('id', id);
+    }
+    const data = { ...(cur?.data || {}), ...side };
+    if ('dopamine_graph' in side && isPackedGraph(data[PACKED_GRAPH])) {
+      // 수정 폼은 풀어 놓은 그래프를 그대로 돌려보낸다: 바뀌지 않았으면 압축본 유지
+      const { data: v } = await supabase.from('videos').select('transcript_text').eq('id', id).maybeSingle();
+      const transcript = v?.transcript_text || '';
+      const same = (!('transcript_text' in patch) || patch.transcript_text === transcript)
+        && JSON.stringify(await decodeDopamine(transcript, data[PACKED_GRAPH])) === JSON.stringify(side.dopamine_graph);
+      if (same) delete data.dopamine_graph;
+      // 직접 고친 그래프는 목록으로 저장 (압축은 서버 쪽: tools/compact_dopamine.py)
+      else delete data[PACKED_GRAPH];
+    }
+    const { error } = await supabase.from(ANALYSIS_TABLE).upsert({ video_id: id, schema_version: ANALYSIS_SCHEMA_VERSION, data, updated_at: new Date().toISOString() });
+    if (error) return { error };
+    for (const k of Object.keys(side)) rest[k] = null;
+  }
+  if (!Object.keys(rest).length) return { error: null };
+  return supabase.from('videos').update(rest).eq('id', id);
+}
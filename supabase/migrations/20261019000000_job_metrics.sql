@@ -0,0 +1,30 @@
+-- One row per schedule run of api/cron_analyze.py (see api/_metrics.py).
+create table if not exists public.job_metrics (
+  id bigserial primary key,
+  schedule_id text,
+  job_type text,
+  started_at timestamptz not null,
+  finished_at timestamptz not null,
+  duration_ms integer,
+  videos integer default 0,
+  video_errors integer default 0,
+  llm_calls integer default 0,
+  llm_errors integer default 0,
+  retries integer default 0,
+  rate_limited integer default 0,
+  prompt_tokens bigint default 0,
+  response_tokens bigint default 0,
+  cached_tokens bigint default 0,
+  cache_hits integer default 0,
+  est_cost_usd numeric(12, 6) default 0,
+  config jsonb default '{}'::jsonb,    -- batch sizes, concurrency, key count, flags
+  counters jsonb default '{}'::jsonb,
+  stages jsonb default '{}'::jsonb,    -- per stage: count/errors/avg/p50/p95/max + histogram buckets
+  keys jsonb default '{}'::jsonb,      -- per key index: http status counts (429s per key)
+  created_at timestamptz default now()
+);
+
+create index if not exists job_metrics_schedule_idx on public.job_metrics (schedule_id, started_at desc);
+create index if not exists job_metrics_started_idx on public.job_metrics (started_at desc);
+
+alter table public.job_metrics enable row level security;
@@ -0,0 +1,4 @@
+-- Sentence hashes of the transcript the current analysis was run on (api/_incremental.py).
+-- Re-analysis after a transcript edit diffs against this list to reuse dopamine_graph
+-- entries and skip document-level stages for small edits.
+alter table public.videos add column if not exists analysis_sentence_hashes jsonb;
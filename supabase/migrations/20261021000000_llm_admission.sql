@@ -0,0 +1,13 @@
+-- Shared admission state for the Gemini key pool (see api/_admission.py).
+-- One row ('global'): until when interactive analyze_one work is active and
+-- until when bulk cron work should pause after a 429. Epoch milliseconds.
+create table if not exists public.llm_admission (
+  id text primary key,
+  interactive_until bigint default 0,
+  cooldown_until bigint default 0,
+  updated_at timestamptz default now()
+);
+
+insert into public.llm_admission (id) values ('global') on conflict (id) do nothing;
+
+alter table public.llm_admission enable row level security;
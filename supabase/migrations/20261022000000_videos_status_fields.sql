@@ -0,0 +1,21 @@
+-- Computed status fields for the admin list (api/videos_page.py, scripts/admin.js).
+-- PostgREST exposes a function taking the row type as a selectable column, so
+-- select=id,title,has_transcript,is_analyzed answers from the database without
+-- sending transcript_text / dopamine_graph to the client.
+create or replace function public.has_transcript(v public.videos)
+returns boolean
+language sql stable
+as $$
+  select coalesce(length(btrim(v.transcript_text)), 0) > 0
+$$;
+
+create or replace function public.is_analyzed(v public.videos)
+returns boolean
+language sql stable
+as $$
+  select case when jsonb_typeof(to_jsonb(v.dopamine_graph)) = 'array'
+              then jsonb_array_length(to_jsonb(v.dopamine_graph)) > 0 else false end
+      or coalesce(v.material::text, '') <> ''
+      or coalesce(v.hooking::text, '') <> ''
+      or coalesce(v.narrative_structure::text, '') <> ''
+$$;
@@ -0,0 +1,87 @@
+-- Heavy analysis output lives in video_analysis, one row per video (see api/_analysis_store.py).
+-- videos keeps the listing/ranking fields plus a small summary:
+-- analysis_status, analysis_fingerprint, analysis_version, dopamine_peak, analysis_updated_at.
+-- data holds the moved fields by name (analysis_full, dopamine_graph, material_* arrays,
+-- keywords_*, analysis_sentence_hashes); schema_version says how to read it.
+do $$
+declare
+  id_type text;
+begin
+  select format_type(atttypid, atttypmod) into id_type
+  from pg_attribute where attrelid = 'public.videos'::regclass and attname = 'id';
+  execute format(
+    'create table if not exists public.video_analysis (
+       video_id %s primary key references public.videos(id) on delete cascade,
+       schema_version integer not null default 1,
+       data jsonb not null default ''{}''::jsonb,
+       updated_at timestamptz default now()
+     )', id_type);
+end $$;
+
+alter table public.video_analysis enable row level security;
+-- 상세 페이지는 anon 키로 읽는다 (videos와 같은 공개 범위)
+drop policy if exists video_analysis_read on public.video_analysis;
+create policy video_analysis_read on public.video_analysis for select using (true);
+drop policy if exists video_analysis_admin_write on public.video_analysis;
+create policy video_analysis_admin_write on public.video_analysis for all
+  to authenticated using (true) with check (true);
+
+alter table public.videos add column if not exists analysis_status text;
+alter table public.videos add column if not exists analysis_fingerprint text;
+alter table public.videos add column if not exists analysis_version integer;
+alter table public.videos add column if not exists dopamine_peak smallint;
+alter table public.videos add column if not exists analysis_updated_at timestamptz;
+
+-- backfill: move existing analyses out of videos
+insert into public.video_analysis (video_id, schema_version, data)
+select v.id, 1, jsonb_strip_nulls(jsonb_build_object(
+  'analysis_full', v.analysis_full,
+  'dopamine_graph', v.dopamine_graph,
+  'analysis_sentence_hashes', v.analysis_sentence_hashes,
+  'material_main_idea', v.material_main_idea,
+  'material_core_materials', v.material_core_materials,
+  'material_lang_patterns', v.material_lang_patterns,
+  'material_emotion_points', v.material_emotion_points,
+  'material_info_delivery', v.material_info_delivery,
+  'keywords_ko', v.keywords_ko,
+  'keywords_en', v.keywords_en,
+  'keywords_zh', v.keywords_zh
+))
+from public.videos v
+where v.analysis_full is not null or v.dopamine_graph is not null
+on conflict (video_id) do nothing;
+
+update public.videos v set
+  analysis_status = 'done',
+  analysis_version = 1,
+  dopamine_peak = (
+    select max((e->>'level')::numeric)::smallint
+    from jsonb_array_elements(case when jsonb_typeof(to_jsonb(v.dopamine_graph)) = 'array'
+                                   then to_jsonb(v.dopamine_graph) else '[]'::jsonb end) e
+    where (e->>'level') ~ '^[0-9.]+$'
+  ),
+  analysis_full = null,
+  dopamine_graph = null,
+  analysis_sentence_hashes = null,
+  material_main_idea = null,
+  material_core_materials = null,
+  material_lang_patterns = null,
+  material_emotion_points = null,
+  material_info_delivery = null,
+  keywords_ko = null,
+  keywords_en = null,
+  keywords_zh = null
+where exists (select 1 from public.video_analysis a where a.video_id = v.id);
+
+-- list status (20261022000000_videos_status_fields.sql) reads the summary now
+create or replace function public.is_analyzed(v public.videos)
+returns boolean
+language sql stable
+as $$
+  select coalesce(v.analysis_status, '') = 'done'
+      or case when jsonb_typeof(to_jsonb(v.dopamine_graph)) = 'array'
+              then jsonb_array_length(to_jsonb(v.dopamine_graph)) > 0 else false end
+      or coalesce(v.material::text, '') <> ''
+      or coalesce(v.hooking::text, '') <> ''
+      or coalesce(v.narrative_structure::text, '') <> ''
+$$;
@@ -0,0 +1,12 @@
+-- video_analysis schema 2: dopamine_graph is stored packed under data->'dopamine'
+-- (levels string, offsets into videos.transcript_text, deduplicated reasons;
+-- see api/_graph_codec.py). Rows written by the API are packed already; older
+-- rows keep data->'dopamine_graph' and are read as before until
+-- tools/compact_dopamine.py rewrites them (encoding needs the Python segmenter).
+alter table public.video_analysis alter column schema_version set default 2;
+
+-- rows still holding the list form (what the backfill pages through)
+create index if not exists video_analysis_unpacked_idx
+  on public.video_analysis (video_id)
+  where data ? 'dopamine_graph';
+
@@ -0,0 +1,43 @@
+-- Precomputed view-growth ranking (see api/_ranking.py).
+-- Ranking batches write the growth of each refreshed video onto videos and
+-- merge it into video_rankings, which holds the top K (+ slack) per
+-- (category, metric):
+--   category  '*' (all videos) or '<column>:<value>', e.g. 'kr_category_large:정치'
+--   metric    'growth' (delta / previous views), 'delta', 'per_day' (delta per day
+--             since the previous check)
+alter table public.videos add column if not exists views_delta bigint;
+alter table public.videos add column if not exists views_growth_rate double precision;
+alter table public.videos add column if not exists views_per_day double precision;
+
+do $$
+declare
+  id_type text;
+begin
+  select format_type(atttypid, atttypmod) into id_type
+  from pg_attribute where attrelid = 'public.videos'::regclass and attname = 'id';
+  execute format(
+    'create table if not exists public.video_rankings (
+       category text not null,
+       metric text not null,
+       video_id %s not null references public.videos(id) on delete cascade,
+       score double precision not null,
+       views bigint,
+       views_delta bigint,
+       growth_rate double precision,
+       per_day double precision,
+       updated_at timestamptz default now(),
+       primary key (category, metric, video_id)
+     )', id_type);
+end $$;
+
+-- ranking pages: one list, best first
+create index if not exists video_rankings_list_idx
+  on public.video_rankings (category, metric, score desc);
+-- a refreshed video is removed from every list before it is re-ranked
+create index if not exists video_rankings_video_idx
+  on public.video_rankings (video_id);
+
+alter table public.video_rankings enable row level security;
+drop policy if exists video_rankings_read on public.video_rankings;
+create policy video_rankings_read on public.video_rankings for select using (true);
+-- writes come from the cron function (service role)
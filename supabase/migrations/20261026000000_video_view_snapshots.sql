@@ -0,0 +1,111 @@
+-- View-count history (see api/_view_history.py).
+-- Every ranking batch appends one point per refreshed video, bucketed per hour
+-- (a second refresh within the hour overwrites the first). videos keeps only
+-- the last two values; this keeps the curve for rolling growth windows.
+--   grain  'h' hourly point, 'd' last point of a day, 'w' last point of a week
+-- rollup_view_snapshots() downsamples old points so the table stays bounded:
+-- per video roughly 24 * 7 hourly + 83 daily + one point per week after that.
+do $$
+declare
+  id_type text;
+begin
+  select format_type(atttypid, atttypmod) into id_type
+  from pg_attribute where attrelid = 'public.videos'::regclass and attname = 'id';
+  execute format(
+    'create table if not exists public.video_view_snapshots (
+       video_id %s not null references public.videos(id) on delete cascade,
+       ts timestamptz not null,
+       views bigint not null,
+       grain text not null default ''h'',
+       primary key (video_id, ts)
+     )', id_type);
+end $$;
+
+-- append-only, written in ts order: BRIN stays tiny and serves the time-range scans
+create index if not exists video_view_snapshots_ts_brin
+  on public.video_view_snapshots using brin (ts);
+
+alter table public.video_view_snapshots enable row level security;
+drop policy if exists video_view_snapshots_read on public.video_view_snapshots;
+create policy video_view_snapshots_read on public.video_view_snapshots for select using (true);
+-- writes come from the cron function (service role)
+
+-- hourly points older than p_hourly_days -> last point per day,
+-- daily points older than p_daily_days -> last point per week.
+-- Returns the number of points removed.
+create or replace function public.rollup_view_snapshots(p_hourly_days int default 7, p_daily_days int default 90)
+returns integer
+language plpgsql
+as $$
+declare
+  removed integer := 0;
+  n integer;
+begin
+  with ranked as (
+    select video_id, ts,
+           row_number() over (partition by video_id, date_trunc('day', ts) order by ts desc) as rn
+    from public.video_view_snapshots
+    where grain = 'h' and ts < now() - make_interval(days => p_hourly_days)
+  )
+  delete from public.video_view_snapshots s
+  using ranked r
+  where s.video_id = r.video_id and s.ts = r.ts and r.rn > 1;
+  get diagnostics n = row_count;
+  removed := removed + n;
+  update public.video_view_snapshots set grain = 'd'
+  where grain = 'h' and ts < now() - make_interval(days => p_hourly_days);
+
+  with ranked as (
+    select video_id, ts,
+           row_number() over (partition by video_id, date_trunc('week', ts) order by ts desc) as rn
+    from public.video_view_snapshots
+    where grain = 'd' and ts < now() - make_interval(days => p_daily_days)
+  )
+  delete from public.video_view_snapshots s
+  using ranked r
+  where s.video_id = r.video_id and s.ts = r.ts and r.rn > 1;
+  get diagnostics n = row_count;
+  removed := removed + n;
+  update public.video_view_snapshots set grain = 'w'
+  where grain = 'd' and ts < now() - make_interval(days => p_daily_days);
+
+  return removed;
+end $$;
+
+-- fastest growing videos over the last p_hours: latest point in the window
+-- against the last point at or before its start.
+-- p_metric: 'per_hour' (default), 'delta' or 'rate'
+create or replace function public.view_growth_window(p_hours int, p_limit int default 50, p_metric text default 'per_hour')
+returns table (
+  video_id text, views bigint, views_then bigint, delta bigint,
+  rate double precision, per_hour double precision, ts timestamptz, ts_then timestamptz
+)
+language sql stable
+as $$
+  with latest as (
+    select distinct on (s.video_id) s.video_id, s.views, s.ts
+    from public.video_view_snapshots s
+    where s.ts > now() - make_interval(hours => p_hours)
+    order by s.video_id, s.ts desc
+  ),
+  base as (
+    select distinct on (s.video_id) s.video_id, s.views, s.ts
+    from public.video_view_snapshots s
+    join latest l on l.video_id = s.video_id
+    where s.ts <= now() - make_interval(hours => p_hours)
+    order by s.video_id, s.ts desc
+  ),
+  g as (
+    select l.video_id::text as video_id, l.views, b.views as views_then,
+           l.views - b.views as delta,
+           case when b.views > 0 then (l.views - b.views)::double precision / b.views end as rate,
+           round(((l.views - b.views) / greatest(extract(epoch from l.ts - b.ts) / 3600, 1))::numeric, 2)::double precision as per_hour,
+           l.ts, b.ts as ts_then
+    from latest l join base b on b.video_id = l.video_id
+  )
+  select * from g
+  order by case p_metric when 'delta' then g.delta::double precision
+                         when 'rate' then coalesce(g.rate, 0)
+                         else g.per_hour end desc
+  limit greatest(p_limit, 1)
+$$;
@@ -0,0 +1,9 @@
+-- Velocity-based view refresh scheduling (see api/_refresh_schedule.py).
+-- views_next_check_at: epoch ms (same unit as views_last_checked_at) when the
+-- next ranking refresh is due. NULL = never scheduled, due first.
+-- scope=all ranking jobs read only due rows:
+--   where views_next_check_at is null  /  where views_next_check_at <= now order by views_next_check_at
+alter table public.videos add column if not exists views_next_check_at bigint;
+
+create index if not exists videos_views_next_check_idx
+  on public.videos (views_next_check_at);
@@ -0,0 +1,41 @@
+-- Keyword search index (see api/_search_index.py).
+-- One row per (term, video) from keywords_ko/en/zh and the category columns;
+-- terms are normalised in Python (NFKC, lower case, CJK bigrams). The primary
+-- key serves the lookups: each query term is one index range.
+do $$
+declare
+  id_type text;
+begin
+  select format_type(atttypid, atttypmod) into id_type
+  from pg_attribute where attrelid = 'public.videos'::regclass and attname = 'id';
+  execute format(
+    'create table if not exists public.video_keywords (
+       term text not null,
+       video_id %s not null references public.videos(id) on delete cascade,
+       weight real not null default 1,
+       primary key (term, video_id)
+     )', id_type);
+end $$;
+
+-- re-indexing a video deletes its rows first
+create index if not exists video_keywords_video_idx
+  on public.video_keywords (video_id);
+
+alter table public.video_keywords enable row level security;
+drop policy if exists video_keywords_read on public.video_keywords;
+create policy video_keywords_read on public.video_keywords for select using (true);
+-- writes come from the analysis functions (service role)
+
+-- ranked search: most query terms matched first, then summed weight
+create or replace function public.search_videos(p_terms text[], p_limit int default 20, p_offset int default 0)
+returns table (video_id text, score double precision, matched integer)
+language sql stable
+as $$
+  select k.video_id::text, sum(k.weight)::double precision as score, count(*)::integer as matched
+  from public.video_keywords k
+  where k.term = any(p_terms)
+  group by k.video_id
+  order by matched desc, score desc, k.video_id
+  limit least(greatest(p_limit, 1), 100)
+  offset greatest(p_offset, 0)
+$$;
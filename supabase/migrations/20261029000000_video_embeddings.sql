@@ -0,0 +1,77 @@
+-- Embeddings for similar-video lookup (see api/_embeddings.py).
+-- One vector per video; model says which embedding space it belongs to
+-- (Gemini model name, or 'local-hash-v1' for the offline fallback) and
+-- neighbours are only searched within the same model. source_fp is the hash
+-- of the embedded text, so unchanged videos are not re-embedded.
+-- Dimension 768 must match EMBEDDING_DIM.
+create extension if not exists vector;
+
+do $$
+declare
+  id_type text;
+begin
+  select format_type(atttypid, atttypmod) into id_type
+  from pg_attribute where attrelid = 'public.videos'::regclass and attname = 'id';
+  execute format(
+    'create table if not exists public.video_embeddings (
+       video_id %s primary key references public.videos(id) on delete cascade,
+       model text not null,
+       embedding vector(768) not null,
+       source_fp text,
+       updated_at timestamptz default now()
+     )', id_type);
+end $$;
+
+-- approximate nearest neighbours by cosine distance
+create index if not exists video_embeddings_hnsw_idx
+  on public.video_embeddings using hnsw (embedding vector_cosine_ops);
+
+alter table public.video_embeddings enable row level security;
+drop policy if exists video_embeddings_read on public.video_embeddings;
+create policy video_embeddings_read on public.video_embeddings for select using (true);
+-- writes come from the analysis functions (service role)
+
+-- nearest videos to a stored video (itself excluded). The vector is read
+-- first so the ORDER BY compares against a constant and can use the HNSW
+-- index; the id is cast to the videos.id type so the lookup uses the key.
+do $$
+declare
+  id_type text;
+begin
+  select format_type(atttypid, atttypmod) into id_type
+  from pg_attribute where attrelid = 'public.videos'::regclass and attname = 'id';
+  execute format($f$
+    create or replace function public.match_videos(p_video_id text, p_k int default 10)
+    returns table (video_id text, similarity double precision)
+    language plpgsql stable
+    as $body$
+    declare
+      v vector(768);
+      m text;
+    begin
+      select s.embedding, s.model into v, m
+      from public.video_embeddings s where s.video_id = p_video_id::%1$s;
+      if v is null then
+        return;
+      end if;
+      return query
+        select e.video_id::text, 1 - (e.embedding <=> v)
+        from public.video_embeddings e
+        where e.model = m and e.video_id <> p_video_id::%1$s
+        order by e.embedding <=> v
+        limit least(greatest(p_k, 1), 100);
+    end $body$;
+  $f$, id_type);
+end $$;
+
+-- nearest videos to a query vector of the given model
+create or replace function public.match_embedding(p_embedding vector(768), p_model text, p_k int default 10)
+returns table (video_id text, similarity double precision)
+language sql stable
+as $$
+  select e.video_id::text, 1 - (e.embedding <=> p_embedding) as similarity
+  from public.video_embeddings e
+  where e.model = p_model
+  order by e.embedding <=> p_embedding
+  limit least(greatest(p_k, 1), 100)
+$$;
@@ -0,0 +1,24 @@
+-- Near-duplicate transcript detection (see api/_dedup.py).
+-- One MinHash signature per analysed transcript plus its LSH band keys;
+-- a new transcript is looked up by band overlap (bands && array[...]) and
+-- the few candidates are compared by signature in Python.
+do $$
+declare
+  id_type text;
+begin
+  select format_type(atttypid, atttypmod) into id_type
+  from pg_attribute where attrelid = 'public.videos'::regclass and attname = 'id';
+  execute format(
+    'create table if not exists public.video_fingerprints (
+       video_id %s primary key references public.videos(id) on delete cascade,
+       signature bigint[] not null,
+       bands text[] not null,
+       updated_at timestamptz default now()
+     )', id_type);
+end $$;
+
+create index if not exists video_fingerprints_bands_idx
+  on public.video_fingerprints using gin (bands);
+
+alter table public.video_fingerprints enable row level security;
+-- read and written only by the analysis functions (service role): no policies
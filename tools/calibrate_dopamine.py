@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+import _analysis_store as analysis_store  # noqa: E402
+import _core as core  # noqa: E402
+import _pagination as pagination  # noqa: E402
+from _dopamine import calibration_report, llm_pairs, load_lexicon, suggest_lexicon  # noqa: E402
+
+# Compare the local dopamine scorer with LLM scores already stored in
+# video_analysis (or videos.dopamine_graph before that table), optionally writing a suggested lexicon file.
+#
+#   python tools/calibrate_dopamine.py --limit 2000
+#   python tools/calibrate_dopamine.py --suggest api/dopamine_lexicon.json
+
+
+def _fetch_pairs(sb, limit: int, page: int = 200):
+    if analysis_store.available(sb):
+        pairs, seen = [], 0
+        for rows in pagination.iter_pages(sb, analysis_store.TABLE, ['schema_version', 'data'], page, key='video_id'):
+            # packed graphs read their sentences back from transcript_text
+            res = sb.table('videos').select('id,transcript_text').in_('id', [r['video_id'] for r in rows]).execute()
+            docs = { str(v.get('id')): v for v in (getattr(res, 'data', []) or []) }
+            for row in rows:
+                graph = analysis_store.merge(docs.get(str(row['video_id'])) or {}, row).get('dopamine_graph')
+                if graph:
+                    pairs.extend(llm_pairs(graph))
+                    seen += 1
+                    if seen >= limit:
+                        return pairs
+        return pairs
+    pairs = []
+    start = 0
+    while start < limit:
+        end = min(limit, start + page) - 1
+        res = sb.table('videos').select('id,dopamine_graph').not_.is_('dopamine_graph', 'null').order('id').range(start, end).execute()
+        rows = getattr(res, 'data', []) or []
+        for row in rows:
+            pairs.extend(llm_pairs(row.get('dopamine_graph')))
+        if len(rows) < (end - start + 1):
+            break
+        start = end + 1
+    return pairs
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='Calibrate the local dopamine scorer against stored LLM scores')
+    ap.add_argument('--limit', type=int, default=1000, help='max videos to read')
+    ap.add_argument('--input', help='read rows from a JSON/JSONL export instead of Supabase')
+    ap.add_argument('--lexicon', help='lexicon file to evaluate (default: DOPAMINE_LEXICON_PATH / api/dopamine_lexicon.json)')
+    ap.add_argument('--suggest', help='write suggested lexicon weights to this path')
+    ap.add_argument('--min-count', type=int, default=20)
+    args = ap.parse_args(argv)
+
+    if args.input:
+        with open(args.input, encoding='utf-8') as fh:
+            raw = fh.read().strip()
+        rows = json.loads(raw) if raw.startswith('[') else [json.loads(l) for l in raw.splitlines() if l.strip()]
+        pairs = [p for row in rows[:args.limit] for p in llm_pairs(row.get('dopamine_graph'))]
+    else:
+        pairs = _fetch_pairs(core.load_sb(), args.limit)
+
+    report = {
+        'baseline': calibration_report(pairs, (None, {})),
+        'with_lexicon': calibration_report(pairs, load_lexicon(args.lexicon)),
+    }
+    if args.suggest:
+        weights = suggest_lexicon(pairs, min_count=args.min_count)
+        with open(args.suggest, 'w', encoding='utf-8') as fh:
+            json.dump(weights, fh, ensure_ascii=False, indent=2)
+        report['suggested_terms'] = len(weights)
+        report['with_suggested'] = calibration_report(pairs, load_lexicon(args.suggest))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+import _analysis_store as analysis_store  # noqa: E402
+import _core as core  # noqa: E402
+import _graph_codec as graph_codec  # noqa: E402
+import _pagination as pagination  # noqa: E402
+
+# Rewrite video_analysis rows that still hold dopamine_graph as a list
+# (schema 1, or a graph edited in the admin modal) into the packed form.
+# Encoding needs the sentence segmenter (api/_sentences.py), so this runs here
+# rather than in the SQL migration.
+#
+#   python tools/compact_dopamine.py --dry-run
+#   python tools/compact_dopamine.py --limit 5000
+
+
+def _size(value) -> int:
+    return len(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def compact(sb, limit: int, page: int = 200, dry_run: bool = False):
+    report = { 'rows': 0, 'packed': 0, 'bytes_before': 0, 'bytes_after': 0 }
+    # only rows still holding the list (partial index video_analysis_unpacked_idx)
+    unpacked = lambda q: q.not_.is_('data->dopamine_graph', 'null')  # noqa: E731
+    for rows in pagination.iter_pages(sb, analysis_store.TABLE, ['schema_version', 'data'], page, unpacked, key='video_id'):
+        todo = [r for r in rows if isinstance((r.get('data') or {}).get('dopamine_graph'), list)]
+        report['rows'] += len(rows)
+        if todo:
+            res = sb.table('videos').select('id,transcript_text').in_('id', [r['video_id'] for r in todo]).execute()
+            transcripts = { str(v.get('id')): v.get('transcript_text') or '' for v in (getattr(res, 'data', []) or []) }
+        for row in todo:
+            data = dict(row['data'])
+            graph = data.pop('dopamine_graph')
+            data[analysis_store.PACKED] = graph_codec.encode(transcripts.get(str(row['video_id']), ''), graph)
+            report['packed'] += 1
+            report['bytes_before'] += _size(graph)
+            report['bytes_after'] += _size(data[analysis_store.PACKED])
+            if not dry_run:
+                sb.table(analysis_store.TABLE).upsert({
+                    'video_id': row['video_id'], 'schema_version': analysis_store.SCHEMA_VERSION, 'data': data,
+                }).execute()
+            if report['packed'] >= limit:
+                return report
+    return report
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='Pack stored dopamine_graph lists into the compact form')
+    ap.add_argument('--limit', type=int, default=100000, help='max rows to rewrite')
+    ap.add_argument('--page', type=int, default=200)
+    ap.add_argument('--dry-run', action='store_true', help='only report the size change')
+    args = ap.parse_args(argv)
+
+    sb = core.load_sb()
+    if not analysis_store.available(sb):
+        print('video_analysis table not available; apply the migrations first', file=sys.stderr)
+        return 1
+    print(json.dumps(compact(sb, args.limit, args.page, args.dry_run), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+import _core as core  # noqa: E402
+import _embeddings as embeddings  # noqa: E402
+import _pagination as pagination  # noqa: E402
+
+# Embed every analysed video (after the migration, or after switching
+# EMBEDDING_MODEL / EMBEDDING_PROVIDER). Videos whose embedded text is
+# unchanged are skipped, so re-running only pays for what is missing.
+#
+#   python tools/embed_videos.py --batch 50
+#   EMBEDDING_PROVIDER=local python tools/embed_videos.py --limit 1000
+
+
+def embed_all(sb, limit: int, batch: int = 50):
+    report = { 'videos': 0, 'embedded': 0, 'unchanged': 0 }
+    analysed = lambda q: q.eq('analysis_status', 'done')  # noqa: E731
+    for rows in pagination.iter_pages(sb, 'videos', ['id'], batch, analysed):
+        stats = embeddings.embed_videos(sb, [r['id'] for r in rows])
+        for k in report:
+            report[k] += stats.get(k, 0)
+        if report['embedded'] >= limit:
+            break
+    return report
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='Compute missing or stale video embeddings')
+    ap.add_argument('--limit', type=int, default=1000000, help='stop after this many new embeddings')
+    ap.add_argument('--batch', type=int, default=50, help='videos per embedding call')
+    args = ap.parse_args(argv)
+
+    sb = core.load_sb()
+    if not embeddings.available(sb):
+        print('video_embeddings table not available; apply the migrations first', file=sys.stderr)
+        return 1
+    print(json.dumps({ 'model': embeddings.model(), **embed_all(sb, args.limit, args.batch) }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,58 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+import _analysis_store as analysis_store  # noqa: E402
+import _core as core  # noqa: E402
+import _pagination as pagination  # noqa: E402
+import _search_index as search_index  # noqa: E402
+
+# (Re)build video_keywords for every video: after the migration, and for rows
+# whose keywords were written outside the Python analysis path (admin modal).
+# Category columns come from videos, keywords from video_analysis (or videos
+# in the old layout); one keyset page at a time.
+#
+#   python tools/reindex_search.py --dry-run
+#   python tools/reindex_search.py --limit 5000
+
+
+def reindex(sb, limit: int, page: int = 200, dry_run: bool = False):
+    report = { 'videos': 0, 'indexed': 0, 'terms': 0 }
+    side = analysis_store.available(sb)
+    cols = [f for f in search_index.FIELDS if not (side and f in analysis_store.FIELDS)]
+    for rows in pagination.iter_pages(sb, 'videos', cols, page):
+        docs = analysis_store.load_many(sb, rows) if side else rows
+        for doc in docs:
+            report['videos'] += 1
+            entries = search_index.rows(doc['id'], doc)
+            if not entries:
+                continue
+            report['indexed'] += 1
+            report['terms'] += len(entries)
+            if not dry_run:
+                search_index.index(sb, doc['id'], doc)
+            if report['indexed'] >= limit:
+                return report
+    return report
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='Rebuild the keyword search index (video_keywords)')
+    ap.add_argument('--limit', type=int, default=1000000, help='max videos to index')
+    ap.add_argument('--page', type=int, default=200)
+    ap.add_argument('--dry-run', action='store_true', help='only count terms')
+    args = ap.parse_args(argv)
+
+    sb = core.load_sb()
+    if not search_index.available(sb):
+        print('video_keywords table not available; apply the migrations first', file=sys.stderr)
+        return 1
+    print(json.dumps(reindex(sb, args.limit, args.page, args.dry_run), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())